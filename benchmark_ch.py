@@ -0,0 +1,167 @@
+import argparse
+import time
+import logging
+import numpy as np
+
+import chainer
+from chainer import cuda
+
+from common.logger_utils import initialize_logging
+from chainer_.ideep_utils import is_ideep_available, enable_ideep, check_ideep_coverage
+from chainer_.static_graph_model import StaticGraphModel
+from chainer_.model_utils import get_model
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark inference of models with and without iDeep or a static '
+                                                 'graph (Chainer)',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        '--models',
+        type=str,
+        default='resnet18,resnet50,preresnet18,resnext50_32x4d,seresnet50,densenet121,condensenet74_c4_g4,dpn68,'
+                'darknet_ref,squeezenet_v1_1,sqnxt23_w1,shufflenet_g3_w1,shufflenetv2_w1,menet108_8x1_g3,mobilenet_w1,'
+                'mobilenetv2_w1,nasnet_a_mobile',
+        help='comma-separated list of models. see vision_model for options.')
+    parser.add_argument(
+        '--batch-sizes',
+        type=str,
+        default='1,2,4,8,16,32',
+        help='comma-separated list of batch sizes.')
+    parser.add_argument(
+        '--static-graph',
+        action='store_true',
+        help='compare the static graph (chainer.static_graph) with the define-by-run execution instead of iDeep with '
+             'NumPy. default is false.')
+    parser.add_argument(
+        '--num-gpus',
+        type=int,
+        default=0,
+        help='number of gpus to use (for the static graph comparison).')
+    parser.add_argument(
+        '--input-size',
+        type=int,
+        default=224,
+        help='size of the input image.')
+    parser.add_argument(
+        '--num-repeats',
+        type=int,
+        default=10,
+        help='number of forward passes for each measurement.')
+
+    parser.add_argument(
+        '--save-dir',
+        type=str,
+        default='',
+        help='directory of saved log-files')
+    parser.add_argument(
+        '--logging-file-name',
+        type=str,
+        default='benchmark.log',
+        help='filename of log')
+    parser.add_argument(
+        '--log-packages',
+        type=str,
+        default='chainer, ideep4py',
+        help='list of python packages for logging')
+    parser.add_argument(
+        '--log-pip-packages',
+        type=str,
+        default='chainer, ideep4py',
+        help='list of pip packages for logging')
+    args = parser.parse_args()
+    return args
+
+
+def measure_forward(net,
+                    x,
+                    num_repeats):
+    with chainer.using_config('train', False), chainer.no_backprop_mode():
+        # Warm-up (MKL-DNN primitives are created and the static graph is traced at the first call):
+        y = cuda.to_cpu(net(x).array).copy()
+        tic = time.time()
+        for _ in range(num_repeats):
+            net(x)
+        if net.xp is not np:
+            cuda.Stream.null.synchronize()
+    return (time.time() - tic) / num_repeats, y
+
+
+def benchmark_ideep(args,
+                    batch_sizes):
+    if not is_ideep_available():
+        logging.warning('iDeep is not available, only the NumPy path is measured')
+
+    table = ['model | batch | numpy, ms | ideep, ms | speedup | fallbacks']
+    for model_name in args.models.split(','):
+        net = get_model(model_name, pretrained=False)
+        numpy_times = []
+        with chainer.using_config('use_ideep', 'never'):
+            for batch_size in batch_sizes:
+                x = np.random.uniform(-1.0, 1.0, (batch_size, 3, args.input_size, args.input_size)).astype(np.float32)
+                numpy_times.append(measure_forward(net, x, args.num_repeats)[0])
+
+        if enable_ideep(net):
+            fallbacks = check_ideep_coverage(net, in_size=(args.input_size, args.input_size))
+            fallbacks_str = ', '.join(['{} x{}'.format(name, calls) for name, calls in fallbacks]) if fallbacks else '-'
+            for batch_size, numpy_time in zip(batch_sizes, numpy_times):
+                x = np.random.uniform(-1.0, 1.0, (batch_size, 3, args.input_size, args.input_size)).astype(np.float32)
+                ideep_time, _ = measure_forward(net, x, args.num_repeats)
+                table.append('{} | {} | {:.1f} | {:.1f} | x{:.2f} | {}'.format(
+                    model_name, batch_size, numpy_time * 1000.0, ideep_time * 1000.0, numpy_time / ideep_time,
+                    fallbacks_str))
+                logging.info(table[-1])
+        else:
+            for batch_size, numpy_time in zip(batch_sizes, numpy_times):
+                table.append('{} | {} | {:.1f} | - | - | -'.format(model_name, batch_size, numpy_time * 1000.0))
+                logging.info(table[-1])
+
+    logging.info('CPU inference:\n{}'.format('\n'.join(table)))
+
+
+def benchmark_static_graph(args,
+                           batch_sizes):
+    table = ['model | batch | define-by-run, ms | static graph, ms | speedup']
+    for model_name in args.models.split(','):
+        net = get_model(model_name, pretrained=False)
+        static_net = StaticGraphModel(net)
+        if args.num_gpus > 0:
+            static_net.to_gpu()
+        for batch_size in batch_sizes:
+            x = net.xp.asarray(
+                np.random.uniform(-1.0, 1.0, (batch_size, 3, args.input_size, args.input_size)).astype(np.float32))
+            dynamic_time, dynamic_y = measure_forward(net, x, args.num_repeats)
+            static_time, static_y = measure_forward(static_net, x, args.num_repeats)
+            max_diff = float(np.abs(dynamic_y - static_y).max())
+            if max_diff > 1e-3:
+                raise ValueError('The static graph of {} differs from the define-by-run one: {}'.format(
+                    model_name, max_diff))
+            table.append('{} | {} | {:.2f} | {:.2f} | x{:.2f}'.format(
+                model_name, batch_size, dynamic_time * 1000.0, static_time * 1000.0, dynamic_time / static_time))
+            logging.info(table[-1])
+
+    logging.info('Inference latency:\n{}'.format('\n'.join(table)))
+
+
+def main():
+    args = parse_args()
+
+    initialize_logging(
+        logging_dir_path=args.save_dir,
+        logging_file_name=args.logging_file_name,
+        script_args=args,
+        log_packages=args.log_packages,
+        log_pip_packages=args.log_pip_packages)
+
+    if args.num_gpus > 0:
+        cuda.get_device(0).use()
+
+    batch_sizes = [int(x) for x in args.batch_sizes.split(',')]
+    if args.static_graph:
+        benchmark_static_graph(args, batch_sizes)
+    else:
+        benchmark_ideep(args, batch_sizes)
+
+
+if __name__ == '__main__':
+    main()
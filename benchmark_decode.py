@@ -0,0 +1,310 @@
+import argparse
+import time
+import logging
+import random
+import numpy as np
+from PIL import Image
+
+from common.logger_utils import initialize_logging
+from common.dataset_index import get_dataset_index
+from common.image_decode import DraftResizeDecoder, DraftRandomResizedCropDecoder, get_random_resized_crop_params
+from common.image_backends import get_image_backend
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark image decoding for preprocessing pipelines',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        '--data-dir',
+        type=str,
+        default='../imgclsmob_data/imagenet',
+        help='training and validation pictures to use.')
+    parser.add_argument(
+        '--subset',
+        type=str,
+        default='val',
+        help='dataset subset (train or val).')
+    parser.add_argument(
+        '--num-images',
+        type=int,
+        default=1000,
+        help='number of images to decode.')
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=1,
+        help='random seed for image sampling and crops.')
+    parser.add_argument(
+        '--image-backends',
+        type=str,
+        default='pil,opencv,tvio',
+        help='comma-separated list of image backends to benchmark (empty for none).')
+    parser.add_argument(
+        '--parity-refs',
+        type=str,
+        default='torchvision,gluon,chainercv',
+        help='comma-separated list of framework pipelines (torchvision, gluon, chainercv) to check image backends '
+             'against (the frameworks, which are not installed, are skipped).')
+    parser.add_argument(
+        '--parity-tol',
+        type=float,
+        default=2.0,
+        help='maximal allowed mean absolute difference (in uint8 levels) between a backend and the torchvision '
+             'pipeline (the differences from the other pipelines are only reported).')
+
+    parser.add_argument(
+        '--save-dir',
+        type=str,
+        default='',
+        help='directory of saved log-files')
+    parser.add_argument(
+        '--logging-file-name',
+        type=str,
+        default='benchmark.log',
+        help='filename of log')
+    parser.add_argument(
+        '--log-packages',
+        type=str,
+        default='PIL',
+        help='list of python packages for logging')
+    parser.add_argument(
+        '--log-pip-packages',
+        type=str,
+        default='pillow',
+        help='list of pip packages for logging')
+    args = parser.parse_args()
+    return args
+
+
+def resize_center_crop(img,
+                       resize=256,
+                       crop_size=224):
+    w, h = img.size
+    if w < h:
+        ow, oh = resize, int(resize * h / w)
+    else:
+        ow, oh = int(resize * w / h), resize
+    img = img.resize((ow, oh), Image.BILINEAR)
+    left = int(round((ow - crop_size) / 2.0))
+    top = int(round((oh - crop_size) / 2.0))
+    return img.crop((left, top, left + crop_size, top + crop_size))
+
+
+def val_full(path):
+    return resize_center_crop(Image.open(path).convert('RGB'))
+
+
+def train_full(path):
+    img = Image.open(path).convert('RGB')
+    left, top, w, h = get_random_resized_crop_params(img.size[0], img.size[1])
+    return img.resize((224, 224), Image.BILINEAR, box=(left, top, left + w, top + h))
+
+
+def measure(decode_fn,
+            paths,
+            seed):
+    random.seed(seed)
+    tic = time.time()
+    for path in paths:
+        decode_fn(path)
+    return len(paths) / (time.time() - tic)
+
+
+def calc_mean_diff(fn1,
+                   fn2,
+                   paths,
+                   seed):
+    diffs = []
+    for i, path in enumerate(paths):
+        random.seed(seed + i)
+        img1 = np.asarray(fn1(path), dtype=np.float32)
+        random.seed(seed + i)
+        img2 = np.asarray(fn2(path), dtype=np.float32)
+        diffs.append(np.abs(img1 - img2).mean())
+    return float(np.mean(diffs))
+
+
+def get_torchvision_reference():
+    """
+    Get the val pipeline of the PyTorch scripts (`get_val_transform`) and the crop/flip part of the train one
+    (the torchvision functions, which `RandomResizedCrop` and `RandomHorizontalFlip` call, for the crop and flip drawn
+    in the same way as by the image backends).
+    """
+    import torchvision.transforms.functional as F
+    from torchvision.datasets.folder import pil_loader
+    from pytorch.utils import get_val_transform
+    val_transform = get_val_transform(uint8_transport=True)
+
+    def val_fn(path):
+        return val_transform(pil_loader(path))
+
+    def train_fn(path):
+        img = pil_loader(path)
+        left, top, w, h = get_random_resized_crop_params(img.size[0], img.size[1])
+        img = F.resized_crop(img, top, left, h, w, [224, 224])
+        if random.random() < 0.5:
+            img = F.hflip(img)
+        return np.asarray(img)
+
+    return val_fn, train_fn
+
+
+def get_gluon_reference():
+    """
+    Get the val pipeline of the Gluon scripts (`transforms.Resize` with kept ratio and `transforms.CenterCrop`) and
+    the crop/flip part of the train one (the mx.image functions, which `RandomResizedCrop` and `RandomFlipLeftRight`
+    call, for the crop and flip drawn in the same way as by the image backends).
+    """
+    import mxnet as mx
+    from mxnet.gluon.data.vision import transforms
+    val_transform = transforms.Compose([
+        transforms.Resize(256, keep_ratio=True),
+        transforms.CenterCrop(224),
+    ])
+
+    def val_fn(path):
+        return val_transform(mx.image.imread(path)).asnumpy()
+
+    def train_fn(path):
+        img = mx.image.imread(path)
+        left, top, w, h = get_random_resized_crop_params(img.shape[1], img.shape[0])
+        img = mx.image.fixed_crop(img, left, top, w, h, size=(224, 224), interp=1)
+        if random.random() < 0.5:
+            img = mx.nd.flip(img, axis=1)
+        return img.asnumpy()
+
+    return val_fn, train_fn
+
+
+def get_chainercv_reference():
+    """
+    Get the pipeline of the Chainer scripts (chainercv `scale` and `center_crop`, as in `PreprocessedDataset`). It is
+    used for both subsets, so there is no train pipeline.
+    """
+    from chainercv.utils import read_image
+    from chainercv.transforms import scale, center_crop
+
+    def val_fn(path):
+        img = read_image(path, color=True)
+        img = center_crop(scale(img=img, size=256), (224, 224))
+        return img.transpose((1, 2, 0))
+
+    return val_fn, None
+
+
+_references = {
+    'torchvision': get_torchvision_reference,
+    'gluon': get_gluon_reference,
+    'chainercv': get_chainercv_reference,
+}
+
+
+def calc_jitter_diff(backend,
+                     paths,
+                     factors=(0.6, 1.4)):
+    # Color adjustments of a backend against the torchvision functions, which `ColorJitter` calls:
+    import torchvision.transforms.functional as F
+    from torchvision.datasets.folder import pil_loader
+    adjust_fns = [
+        (backend.adjust_brightness, F.adjust_brightness),
+        (backend.adjust_contrast, F.adjust_contrast),
+        (backend.adjust_saturation, F.adjust_saturation),
+    ]
+    diffs = []
+    for path in paths:
+        img = backend.decode(path)
+        ref_img = pil_loader(path)
+        for backend_fn, ref_fn in adjust_fns:
+            for factor in factors:
+                img1 = np.asarray(backend.to_array(backend_fn(img, factor)), dtype=np.float32)
+                img2 = np.asarray(ref_fn(ref_img, factor), dtype=np.float32)
+                diffs.append(np.abs(img1 - img2).mean())
+    return float(np.mean(diffs))
+
+
+def benchmark_image_backends(backend_names,
+                             reference_names,
+                             paths,
+                             seed,
+                             parity_tol,
+                             num_jitter_images=100):
+    # Backends are checked against the framework pipelines: the val one as is, the train one without the color jitter
+    # (for the same random crop and flip), the color adjustments separately (on a part of images, they are done on
+    # the full resolution). Backends reproduce the torchvision pipelines, so only these differences should be within
+    # the tolerance, the differences from the Gluon/Chainer resizing are reported:
+    references = []
+    for reference_name in reference_names:
+        if reference_name not in _references:
+            raise ValueError('Unsupported reference pipeline: {}'.format(reference_name))
+        try:
+            references.append((reference_name,) + _references[reference_name]())
+        except ImportError as e:
+            logging.warning('The {} pipeline is skipped: {}'.format(reference_name, e))
+
+    for backend_name in backend_names:
+        backend = get_image_backend(backend_name)
+        val_speed = measure(backend.val_transform, paths, seed)
+        train_speed = measure(backend.train_transform, paths, seed)
+        logging.info('{} backend: val {:.1f} img/sec, train {:.1f} img/sec'.format(
+            backend_name, val_speed, train_speed))
+
+        crop_backend = get_image_backend(backend_name, jitter_param=0.0)
+        for reference_name, ref_val_fn, ref_train_fn in references:
+            diffs = [('val', calc_mean_diff(backend.val_transform, ref_val_fn, paths, seed))]
+            if ref_train_fn is not None:
+                diffs.append(('train crop', calc_mean_diff(crop_backend.train_transform, ref_train_fn, paths, seed)))
+            if reference_name == 'torchvision':
+                diffs.append(('color jitter', calc_jitter_diff(backend, paths[:num_jitter_images])))
+            logging.info('{} backend vs {}: {}'.format(
+                backend_name, reference_name, ', '.join(['{} diff {:.3f}'.format(n, d) for n, d in diffs])))
+            for diff_name, diff in diffs:
+                if diff <= parity_tol:
+                    continue
+                if reference_name == 'torchvision':
+                    raise ValueError('The {} backend differs from the torchvision {} pipeline: {:.3f} > {:.3f}'.format(
+                        backend_name, diff_name, diff, parity_tol))
+                logging.warning('The {} backend differs from the {} {} pipeline ({:.3f} > {:.3f}), the accuracy with '
+                                'it is not comparable to the default one'.format(
+                                    backend_name, reference_name, diff_name, diff, parity_tol))
+
+
+def main():
+    args = parse_args()
+
+    initialize_logging(
+        logging_dir_path=args.save_dir,
+        logging_file_name=args.logging_file_name,
+        script_args=args,
+        log_packages=args.log_packages,
+        log_pip_packages=args.log_pip_packages)
+
+    dataset_index = get_dataset_index('{}/{}'.format(args.data_dir, args.subset))
+    rs = np.random.RandomState(args.seed)
+    inds = rs.choice(len(dataset_index), min(args.num_images, len(dataset_index)), replace=False)
+    paths = [dataset_index.get_path(i) for i in inds]
+
+    val_decoder = DraftResizeDecoder(256)
+    train_decoder = DraftRandomResizedCropDecoder(224)
+    pipelines = [
+        ('val (resize+center crop)', val_full, (lambda path: resize_center_crop(val_decoder(path)))),
+        ('train (random resized crop)', train_full, train_decoder),
+    ]
+    for name, full_fn, draft_fn in pipelines:
+        # Warm up the file cache:
+        measure(full_fn, paths, args.seed)
+        full_speed = measure(full_fn, paths, args.seed)
+        draft_speed = measure(draft_fn, paths, args.seed)
+        logging.info('{}: full decode {:.1f} img/sec, draft decode {:.1f} img/sec, speedup x{:.2f}'.format(
+            name, full_speed, draft_speed, draft_speed / full_speed))
+
+    if args.image_backends:
+        benchmark_image_backends(
+            backend_names=args.image_backends.split(','),
+            reference_names=(args.parity_refs.split(',') if args.parity_refs else []),
+            paths=paths,
+            seed=args.seed,
+            parity_tol=args.parity_tol)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+import argparse
+import time
+import logging
+import resource
+import multiprocessing
+import torch
+
+from common.logger_utils import initialize_logging
+from pytorch.model_utils import get_model
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Compare peak memory and throughput of the memory-efficient mode of '
+                                                 'models (PyTorch)',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        '--models',
+        type=str,
+        default='densenet121,densenet161,densenet201',
+        help='comma-separated list of models with the `memory_efficient` parameter.')
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=16,
+        help='batch size.')
+    parser.add_argument(
+        '--input-size',
+        type=int,
+        default=224,
+        help='size of the input image.')
+    parser.add_argument(
+        '--num-repeats',
+        type=int,
+        default=3,
+        help='number of measured passes.')
+    parser.add_argument(
+        '--inference',
+        action='store_true',
+        help='measure inference (without autograd) instead of training steps. default is false.')
+    parser.add_argument(
+        '--num-gpus',
+        type=int,
+        default=0,
+        help='number of gpus to use.')
+
+    parser.add_argument(
+        '--save-dir',
+        type=str,
+        default='',
+        help='directory of saved log-files')
+    parser.add_argument(
+        '--logging-file-name',
+        type=str,
+        default='benchmark.log',
+        help='filename of log')
+    parser.add_argument(
+        '--log-packages',
+        type=str,
+        default='torch, torchvision',
+        help='list of python packages for logging')
+    parser.add_argument(
+        '--log-pip-packages',
+        type=str,
+        default='',
+        help='list of pip packages for logging')
+    args = parser.parse_args()
+    return args
+
+
+def get_peak_host_memory():
+    # Linux reports ru_maxrss in kilobytes:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def measure(model_name,
+            memory_efficient,
+            batch_size,
+            input_size,
+            num_repeats,
+            inference,
+            use_cuda,
+            result_queue):
+    net = get_model(model_name, pretrained=False, memory_efficient=memory_efficient)
+    x = torch.randn(batch_size, 3, input_size, input_size)
+    if use_cuda:
+        net = net.cuda()
+        x = x.cuda()
+    if inference:
+        net.eval()
+    else:
+        net.train()
+
+    def step():
+        if inference:
+            with torch.no_grad():
+                net(x)
+        else:
+            net.zero_grad()
+            net(x).sum().backward()
+        if use_cuda:
+            torch.cuda.synchronize()
+
+    if use_cuda:
+        torch.cuda.reset_max_memory_allocated()
+        base_memory = torch.cuda.memory_allocated()
+    else:
+        base_memory = get_peak_host_memory()
+    step()
+    tic = time.time()
+    for _ in range(num_repeats):
+        step()
+    step_time = (time.time() - tic) / num_repeats
+    if use_cuda:
+        peak_memory = torch.cuda.max_memory_allocated()
+    else:
+        peak_memory = get_peak_host_memory()
+    result_queue.put((step_time, peak_memory - base_memory))
+
+
+def main():
+    args = parse_args()
+
+    initialize_logging(
+        logging_dir_path=args.save_dir,
+        logging_file_name=args.logging_file_name,
+        script_args=args,
+        log_packages=args.log_packages,
+        log_pip_packages=args.log_pip_packages)
+
+    use_cuda = (args.num_gpus > 0)
+    # Each measurement runs in a fresh process, so that the peak memory is not shared between the modes (Python 2 has
+    # only forked processes, the memory before the measurement is subtracted anyway):
+    if hasattr(multiprocessing, 'get_context'):
+        mp_context = multiprocessing.get_context('spawn')
+    else:
+        mp_context = multiprocessing
+    table = ['model | original, MB | memory-efficient, MB | original, ms | memory-efficient, ms']
+    for model_name in args.models.split(','):
+        results = []
+        for memory_efficient in (False, True):
+            result_queue = mp_context.Queue()
+            process = mp_context.Process(
+                target=measure,
+                args=(model_name, memory_efficient, args.batch_size, args.input_size, args.num_repeats,
+                      args.inference, use_cuda, result_queue))
+            process.start()
+            results.append(result_queue.get())
+            process.join()
+        table.append('{} | {:.0f} | {:.0f} | {:.1f} | {:.1f}'.format(
+            model_name, results[0][1] / 2 ** 20, results[1][1] / 2 ** 20, results[0][0] * 1000.0,
+            results[1][0] * 1000.0))
+        logging.info(table[-1])
+
+    logging.info('{} (batch {}), peak memory increase and time per pass:\n{}'.format(
+        'Inference' if args.inference else 'Training', args.batch_size, '\n'.join(table)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+import argparse
+import copy
+import time
+import logging
+import torch
+
+from common.logger_utils import initialize_logging
+from pytorch.model_fusion import fuse_for_inference
+from pytorch.models.condensenet import CondenseLinear
+from pytorch.model_utils import get_model
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Check and benchmark inference-time fusion of models (PyTorch)',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        '--models',
+        type=str,
+        default='resnet18,resnet50,preresnet10,preresnet18,preresnet50,resnext50_32x4d,seresnet50,senet52,'
+                'densenet121,condensenet74_c4_g4,condensenet74_c8_g8,dpn68,dpn68b,darknet_tiny,squeezenet_v1_1,'
+                'sqnxt23_w1,shufflenet_g3_w1,shufflenetv2_w1,oth_shufflenetv2_wd2,menet108_8x1_g3,mobilenet_w1,'
+                'fdmobilenet_w1,mobilenetv2_w1,nasnet_a_mobile',
+        help='comma-separated list of models. see vision_model for options.')
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=16,
+        help='batch size.')
+    parser.add_argument(
+        '--input-size',
+        type=int,
+        default=224,
+        help='size of the input image.')
+    parser.add_argument(
+        '--num-repeats',
+        type=int,
+        default=5,
+        help='number of forward passes for each measurement.')
+    parser.add_argument(
+        '--tol',
+        type=float,
+        default=1e-6,
+        help='maximal relative difference of the outputs of the original and fused models (in float64).')
+    parser.add_argument(
+        '--num-gpus',
+        type=int,
+        default=0,
+        help='number of gpus to use.')
+
+    parser.add_argument(
+        '--save-dir',
+        type=str,
+        default='',
+        help='directory of saved log-files')
+    parser.add_argument(
+        '--logging-file-name',
+        type=str,
+        default='benchmark.log',
+        help='filename of log')
+    parser.add_argument(
+        '--log-packages',
+        type=str,
+        default='torch, torchvision',
+        help='list of python packages for logging')
+    parser.add_argument(
+        '--log-pip-packages',
+        type=str,
+        default='',
+        help='list of pip packages for logging')
+    args = parser.parse_args()
+    return args
+
+
+def randomize_folded_layers(net):
+    # Non-trivial statistics and indices, so that the folding is really checked:
+    with torch.no_grad():
+        for module in net.modules():
+            if isinstance(module, torch.nn.BatchNorm2d):
+                module.running_mean.uniform_(-0.1, 0.1)
+                module.running_var.uniform_(0.5, 1.5)
+                if module.affine:
+                    module.weight.uniform_(0.5, 1.5)
+                    module.bias.uniform_(-0.1, 0.1)
+            elif isinstance(module, CondenseLinear):
+                module.index.random_(0, module.in_features)
+
+
+def measure_forward(net,
+                    x,
+                    num_repeats,
+                    use_cuda):
+    with torch.no_grad():
+        net(x)
+        if use_cuda:
+            torch.cuda.synchronize()
+        tic = time.time()
+        for _ in range(num_repeats):
+            net(x)
+        if use_cuda:
+            torch.cuda.synchronize()
+    return (time.time() - tic) / num_repeats
+
+
+def main():
+    args = parse_args()
+
+    initialize_logging(
+        logging_dir_path=args.save_dir,
+        logging_file_name=args.logging_file_name,
+        script_args=args,
+        log_packages=args.log_packages,
+        log_pip_packages=args.log_pip_packages)
+
+    use_cuda = (args.num_gpus > 0)
+    table = ['model | folded BN | left BN | original, ms | fused, ms | speedup | max diff']
+    for model_name in args.models.split(','):
+        net = get_model(model_name, pretrained=False)
+        randomize_folded_layers(net)
+        net.eval()
+        if use_cuda:
+            net = net.cuda()
+        x = torch.randn(args.batch_size, 3, args.input_size, args.input_size)
+        if use_cuda:
+            x = x.cuda()
+
+        # The equivalence is checked in float64 (the float32 rounding is amplified by the random weights):
+        net64 = copy.deepcopy(net).double()
+        with torch.no_grad():
+            orig_y = net64(x.double())
+            fuse_for_inference(net64)
+            fused_y = net64(x.double())
+        max_diff = ((orig_y - fused_y).abs().max() / orig_y.abs().max().clamp(min=1e-6)).item()
+
+        orig_time = measure_forward(net, x, args.num_repeats, use_cuda)
+        num_folded, num_remaining = fuse_for_inference(net)
+        fused_time = measure_forward(net, x, args.num_repeats, use_cuda)
+
+        if max_diff > args.tol:
+            raise ValueError('The fused model {} differs from the original one: {}'.format(model_name, max_diff))
+        table.append('{} | {} | {} | {:.1f} | {:.1f} | x{:.2f} | {:.1e}'.format(
+            model_name, num_folded, num_remaining, orig_time * 1000.0, fused_time * 1000.0, orig_time / fused_time,
+            max_diff))
+        logging.info(table[-1])
+
+    logging.info('Inference (batch {}):\n{}'.format(args.batch_size, '\n'.join(table)))
+
+
+if __name__ == '__main__':
+    main()
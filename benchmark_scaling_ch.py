@@ -0,0 +1,121 @@
+import argparse
+import os
+import re
+import sys
+import logging
+import subprocess
+
+from common.logger_utils import initialize_logging
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Measure scaling of ChainerMN data-parallel training (Chainer)',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        '--model',
+        type=str,
+        required=True,
+        help='type of model to use. see vision_model for options.')
+    parser.add_argument(
+        '--num-processes',
+        type=str,
+        default='1,2,4,8',
+        help='comma-separated list of numbers of worker processes.')
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=32,
+        help='batch size per process.')
+    parser.add_argument(
+        '--synthetic-batches',
+        type=int,
+        default=50,
+        help='number of synthetic batches per process.')
+    parser.add_argument(
+        '--num-data-workers',
+        dest='num_workers',
+        default=0,
+        type=int,
+        help='number of preprocessing workers per process (for real data).')
+    parser.add_argument(
+        '--data-dir',
+        type=str,
+        default='',
+        help='training pictures to use (synthetic data if empty).')
+    parser.add_argument(
+        '--mpiexec',
+        type=str,
+        default='mpiexec',
+        help='MPI launcher command.')
+
+    parser.add_argument(
+        '--save-dir',
+        type=str,
+        default='chainer_scaling',
+        help='directory of saved log-files')
+    parser.add_argument(
+        '--logging-file-name',
+        type=str,
+        default='scaling.log',
+        help='filename of log')
+    parser.add_argument(
+        '--log-packages',
+        type=str,
+        default='chainer, chainermn',
+        help='list of python packages for logging')
+    parser.add_argument(
+        '--log-pip-packages',
+        type=str,
+        default='chainer, chainermn, mpi4py',
+        help='list of pip packages for logging')
+    args = parser.parse_args()
+    return args
+
+
+def run_training(args,
+                 num_processes):
+    run_dir_path = os.path.join(args.save_dir, 'np{}'.format(num_processes))
+    command = args.mpiexec.split() + [
+        '-n', str(num_processes),
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'train_ch.py'),
+        '--chainermn',
+        '--model', args.model,
+        '--batch-size', str(args.batch_size),
+        '--num-epochs', '1',
+        '--num-data-workers', str(args.num_workers),
+        '--save-dir', run_dir_path]
+    if args.data_dir:
+        command += ['--data-dir', args.data_dir]
+    else:
+        command += ['--synthetic-data', '--synthetic-batches', str(args.synthetic_batches)]
+    logging.info('Run: {}'.format(' '.join(command)))
+    subprocess.check_call(command)
+
+    with open(os.path.join(run_dir_path, 'train.log'), 'r') as f:
+        speeds = re.findall(r'Training throughput: ([0-9.]+) samples/sec', f.read())
+    return float(speeds[-1])
+
+
+def main():
+    args = parse_args()
+
+    initialize_logging(
+        logging_dir_path=args.save_dir,
+        logging_file_name=args.logging_file_name,
+        script_args=args,
+        log_packages=args.log_packages,
+        log_pip_packages=args.log_pip_packages)
+
+    results = [(n, run_training(args, n)) for n in [int(x) for x in args.num_processes.split(',')]]
+
+    base_num_processes, base_speed = results[0]
+    table = ['processes | samples/sec | speedup | efficiency']
+    for num_processes, speed in results:
+        speedup = speed / base_speed
+        efficiency = speedup * base_num_processes / num_processes
+        table.append('{:9d} | {:11.2f} | {:7.2f} | {:9.1f}%'.format(num_processes, speed, speedup, efficiency * 100.0))
+    logging.info('Scaling of {} (batch {} per process):\n{}'.format(args.model, args.batch_size, '\n'.join(table)))
+
+
+if __name__ == '__main__':
+    main()
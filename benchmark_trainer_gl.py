@@ -0,0 +1,156 @@
+import argparse
+import time
+import logging
+import os
+
+import mxnet as mx
+from mxnet import gluon
+
+from common.logger_utils import initialize_logging
+from gluon.lr_scheduler import LRScheduler
+from gluon.utils import prepare_mx_context, prepare_model
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark optimizer steps with and without aggregated updates (Gluon)',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        '--model',
+        type=str,
+        default='senet154',
+        help='type of model to use. see vision_model for options.')
+    parser.add_argument(
+        '--optimizer-name',
+        type=str,
+        default='sgd',
+        help='optimizer name')
+    parser.add_argument(
+        '--aggregate-nums',
+        type=str,
+        default='1,4,16,60',
+        help='comma-separated list of numbers of parameter arrays for one fused update (the first one is the baseline, '
+             '1 for separate updates).')
+    parser.add_argument(
+        '--dtype',
+        type=str,
+        default='float32',
+        help='data type for training. default is float32')
+    parser.add_argument(
+        '--num-gpus',
+        type=int,
+        default=0,
+        help='number of gpus to use.')
+    parser.add_argument(
+        '--num-steps',
+        type=int,
+        default=20,
+        help='number of measured optimizer steps.')
+
+    parser.add_argument(
+        '--save-dir',
+        type=str,
+        default='',
+        help='directory of saved log-files')
+    parser.add_argument(
+        '--logging-file-name',
+        type=str,
+        default='benchmark.log',
+        help='filename of log')
+    parser.add_argument(
+        '--log-packages',
+        type=str,
+        default='mxnet',
+        help='list of python packages for logging')
+    parser.add_argument(
+        '--log-pip-packages',
+        type=str,
+        default='mxnet-cu92',
+        help='list of pip packages for logging')
+    args = parser.parse_args()
+    return args
+
+
+def measure_steps(net,
+                  optimizer_name,
+                  aggregate_num,
+                  dtype,
+                  num_steps):
+    lr_scheduler = LRScheduler(
+        mode='cosine',
+        base_lr=0.1,
+        n_iters=num_steps + 1,
+        n_epochs=1)
+    optimizer_params = {'learning_rate': 0.1,
+                        'wd': 0.0001,
+                        'momentum': 0.9,
+                        'lr_scheduler': lr_scheduler}
+    if dtype != 'float32':
+        optimizer_params['multi_precision'] = True
+    # SGD of MXNet 1.x reads the aggregation size from the environment variable in the constructor (the default is 4,
+    # so the baseline is pinned explicitly):
+    os.environ['MXNET_OPTIMIZER_AGGREGATION_SIZE'] = str(aggregate_num)
+    trainer = gluon.Trainer(
+        params=net.collect_params(),
+        optimizer=optimizer_name,
+        optimizer_params=optimizer_params,
+        update_on_kvstore=False)
+
+    # The first step creates the optimizer states:
+    lr_scheduler.update(0, 0)
+    trainer.step(1)
+    mx.nd.waitall()
+    tic = time.time()
+    for i in range(num_steps):
+        lr_scheduler.update(i + 1, 0)
+        trainer.step(1)
+    mx.nd.waitall()
+    return (time.time() - tic) / num_steps
+
+
+def main():
+    args = parse_args()
+
+    initialize_logging(
+        logging_dir_path=args.save_dir,
+        logging_file_name=args.logging_file_name,
+        script_args=args,
+        log_packages=args.log_packages,
+        log_pip_packages=args.log_pip_packages)
+
+    ctx, _ = prepare_mx_context(
+        num_gpus=args.num_gpus,
+        batch_size=1)
+
+    net = prepare_model(
+        model_name=args.model,
+        classes=1000,
+        use_pretrained=False,
+        pretrained_model_file_path='',
+        dtype=args.dtype,
+        tune_layers='',
+        ctx=ctx)
+
+    # Materialize the deferred parameters and fill the gradients:
+    net(mx.nd.zeros((1, 3, 224, 224), ctx=ctx[0], dtype=args.dtype))
+    params = [param for param in net.collect_params().values() if param.grad_req != 'null']
+    for param in params:
+        for grad in param.list_grad():
+            grad[:] = mx.nd.random.normal(scale=0.01, shape=grad.shape, ctx=grad.context).astype(grad.dtype)
+    logging.info('Model {}: {} parameter arrays'.format(args.model, len(params)))
+
+    base_time = None
+    for aggregate_num in [int(x) for x in args.aggregate_nums.split(',')]:
+        step_time = measure_steps(
+            net=net,
+            optimizer_name=args.optimizer_name,
+            aggregate_num=aggregate_num,
+            dtype=args.dtype,
+            num_steps=args.num_steps)
+        if base_time is None:
+            base_time = step_time
+        logging.info('aggregate_num={}: {:.2f} ms/step, speedup x{:.2f}'.format(
+            aggregate_num, step_time * 1000.0, base_time / step_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+    iDeep (MKL-DNN) CPU path for Chainer models.
+"""
+
+__all__ = ['is_ideep_available', 'enable_ideep', 'IDeepCoverageHook', 'check_ideep_coverage']
+
+import logging
+from collections import OrderedDict
+import numpy as np
+
+import chainer
+from chainer.backends import intel64
+
+
+# Functions with an iDeep implementation (4D float32 inputs for the convolution/pooling/normalization ones). All
+# other functions (sigmoid, leaky_relu, clip, pad, reshape, swapaxes, split_axis, etc.) run on NumPy and convert the
+# MKL-DNN arrays back:
+IDEEP_FUNCTIONS = (
+    'Convolution2DFunction',
+    'LinearFunction',
+    'BatchNormalization',
+    'FixedBatchNormalization',
+    'ReLU',
+    'MaxPooling2D',
+    'AveragePooling2D',
+    'LocalResponseNormalization',
+    'Concat',
+    'Dropout',
+)
+
+
+def is_ideep_available():
+    return intel64.is_ideep_available()
+
+
+def enable_ideep(net):
+    """
+    Switch a CPU model to the iDeep path: the parameters are converted to MKL-DNN arrays and the global
+    `use_ideep` configuration is set to 'auto'.
+
+    Parameters:
+    ----------
+    net : Link
+        Model on CPU.
+
+    Returns
+    -------
+    bool
+        Whether iDeep is enabled.
+    """
+    if not intel64.is_ideep_available():
+        logging.warning('iDeep is not available (install ideep4py), the plain NumPy path is used')
+        return False
+    net.to_intel64()
+    chainer.global_config.use_ideep = 'auto'
+    return True
+
+
+class IDeepCoverageHook(chainer.FunctionHook):
+    """
+    Function hook, which counts the called functions and whether each call can take the iDeep path.
+    """
+    name = 'IDeepCoverageHook'
+
+    def __init__(self):
+        self.counts = OrderedDict()
+
+    def forward_preprocess(self, function, in_data):
+        function_name = type(function).__name__
+        fast = (function_name in IDEEP_FUNCTIONS) and all(
+            (x.dtype == np.float32) and (x.ndim in (2, 4)) for x in in_data if x is not None)
+        if function_name == 'Convolution2DFunction':
+            # Grouped and dilated convolutions (CondenseNet, MobileNet, ShuffleNet, MENet, ResNeXt) fall back:
+            fast = fast and (function.groups == 1) and (function.dy == 1) and (function.dx == 1)
+        key = function_name if fast or function_name not in IDEEP_FUNCTIONS else function_name + ' (fallback)'
+        calls, _ = self.counts.get(key, (0, fast))
+        self.counts[key] = (calls + 1, fast)
+
+    def get_fallbacks(self):
+        return [(name, calls) for name, (calls, fast) in self.counts.items() if not fast]
+
+
+def check_ideep_coverage(net,
+                         in_size=(224, 224),
+                         in_channels=3):
+    """
+    Run a forward pass of a CPU model on a dummy batch and log the functions without an iDeep implementation.
+
+    Parameters:
+    ----------
+    net : Link
+        Model on CPU.
+    in_size : tuple of 2 int, default (224, 224)
+        Spatial size of the input image.
+    in_channels : int, default 3
+        Number of input channels.
+
+    Returns
+    -------
+    list of tuple of (str, int)
+        Name and number of calls for each function without the iDeep path.
+    """
+    x = np.zeros((1, in_channels) + tuple(in_size), np.float32)
+    hook = IDeepCoverageHook()
+    with chainer.using_config('train', False), chainer.no_backprop_mode(), hook:
+        net(x)
+    fallbacks = hook.get_fallbacks()
+    total_calls = sum(calls for calls, _ in hook.counts.values())
+    fallback_calls = sum(calls for _, calls in fallbacks)
+    logging.info('iDeep coverage: {}/{} function calls ({})'.format(
+        total_calls - fallback_calls, total_calls,
+        ', '.join(['{} x{}'.format(name, calls) for name, calls in fallbacks]) if fallbacks else 'no fallbacks'))
+    return fallbacks
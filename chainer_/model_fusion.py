@@ -0,0 +1,78 @@
+"""
+    Inference-time fusion of model layers (folding of channel gathers into weights).
+"""
+
+__all__ = ['fold_condense_linear', 'fuse_for_inference']
+
+import logging
+import numpy as np
+import chainer.links as L
+from chainer.backends import cuda
+
+from .models.common import SimpleSequential
+from .models.condensenet import CondenseLinear
+
+
+def fold_condense_linear(block):
+    """
+    Fold the channel index of a CondenseNet linear block into the weights of a plain linear layer over all input units
+    (the gathered units, including the repeated ones, are accumulated into the weight columns).
+
+    Parameters:
+    ----------
+    block : CondenseLinear
+        CondenseNet linear block.
+
+    Returns
+    -------
+    L.Linear
+        Equivalent linear layer without the gather.
+    """
+    dense = block.dense
+    index = cuda.to_cpu(block.index).astype(np.int64)
+    weight = cuda.to_cpu(dense.W.array)
+    folded_weight = np.zeros((weight.shape[0], block.in_units), dtype=weight.dtype)
+    np.add.at(folded_weight.T, index, weight.T)
+
+    folded = L.Linear(
+        in_size=block.in_units,
+        out_size=weight.shape[0],
+        nobias=(dense.b is None),
+        initialW=folded_weight,
+        initial_bias=(cuda.to_cpu(dense.b.array) if dense.b is not None else None))
+    if block.xp is not np:
+        with cuda.get_device_from_array(dense.W.array):
+            folded.to_gpu()
+    return folded
+
+
+def fuse_for_inference(net):
+    """
+    Fold the channel index of the CondenseNet classifier into the linear weights.
+
+    Parameters:
+    ----------
+    net : Chain
+        Model.
+
+    Returns
+    -------
+    int
+        Number of the folded gathers.
+    """
+    num_folded = 0
+    for link in list(net.links()):
+        if not isinstance(link, SimpleSequential):
+            continue
+        for name in list(link.layer_names):
+            child = getattr(link, name)
+            if not isinstance(child, CondenseLinear):
+                continue
+            layer_names = list(link.layer_names)
+            delattr(link, name)
+            with link.init_scope():
+                setattr(link, name, fold_condense_linear(child))
+            link.layer_names = layer_names
+            num_folded += 1
+    logging.info('Gather folding: {} layers folded'.format(num_folded))
+    return num_folded
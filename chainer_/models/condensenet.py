@@ -297,6 +297,7 @@ class CondenseLinear(Chain):
                  in_units,
                  drop_rate=0.5):
         super(CondenseLinear, self).__init__()
+        self.in_units = in_units
         drop_in_units = int(in_units * drop_rate)
         with self.init_scope():
             self.dense = L.Linear(
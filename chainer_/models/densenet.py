@@ -6,6 +6,7 @@
 __all__ = ['DenseNet', 'densenet121', 'densenet161', 'densenet169', 'densenet201']
 
 import os
+import chainer
 import chainer.functions as F
 import chainer.links as L
 from chainer import Chain
@@ -118,6 +119,7 @@ class DenseUnit(Chain):
         bn_size = 4
         inc_channels = out_channels - in_channels
         mid_channels = inc_channels * bn_size
+        self.inc_channels = inc_channels
 
         with self.init_scope():
             self.conv1 = dense_conv1x1(
@@ -140,6 +142,42 @@ class DenseUnit(Chain):
         x = F.concat((identity, x), axis=1)
         return x
 
+    def forward_buffer(self, x, features):
+        """
+        Memory-efficient forward pass, which returns only the new channels.
+
+        Parameters:
+        ----------
+        x : array
+            View of the stage feature buffer with all the input channels.
+        features : list of chainer.Variable
+            Stage input and outputs of the previous units (the same channels, used to recompute the bottleneck with
+            backprop). Can be empty if the backprop is disabled.
+        """
+        if chainer.config.enable_backprop and features:
+            x = F.forget(self._bottleneck(x), *features)
+        else:
+            x = self.conv1(x)
+        x = self.conv2(x)
+        if self.use_dropout:
+            x = self.dropout(x)
+        return x
+
+    def _bottleneck(self, buffer):
+        def bottleneck(*features):
+            if not chainer.config.enable_backprop:
+                # Forward pass of F.forget, the concatenation is already in the buffer:
+                return self.conv1(buffer)
+            # Recomputation during backward, the running statistics are not updated for the second time:
+            bn = self.conv1.bn
+            decay = bn.decay
+            bn.decay = 1.0
+            try:
+                return self.conv1(F.concat(features, axis=1))
+            finally:
+                bn.decay = decay
+        return bottleneck
+
 
 class TransitionBlock(Chain):
     """
@@ -235,6 +273,51 @@ class PostActivation(Chain):
         return x
 
 
+class DenseStage(SimpleSequential):
+    """
+    DenseNet stage (an optional transition block followed by the units). In the memory-efficient mode the units write
+    their new channels into one preallocated feature buffer of the stage instead of concatenating all the features in
+    each unit, and the bottleneck BN-ReLU-conv1x1 blocks are recomputed during backward (F.forget) instead of being
+    stored.
+
+    Parameters:
+    ----------
+    memory_efficient : bool, default False
+        Whether to use the memory-efficient mode.
+    """
+    def __init__(self,
+                 memory_efficient=False):
+        super(DenseStage, self).__init__()
+        self.memory_efficient = memory_efficient
+
+    def __call__(self, x):
+        if not self.memory_efficient:
+            return super(DenseStage, self).__call__(x)
+        units = []
+        for name in self.layer_names:
+            if isinstance(self[name], DenseUnit):
+                units.append(self[name])
+            else:
+                x = self[name](x)
+
+        x = chainer.as_variable(x)
+        in_channels = x.shape[1]
+        out_channels = in_channels + sum([unit.inc_channels for unit in units])
+        buffer = self.xp.empty((x.shape[0], out_channels) + x.shape[2:], dtype=x.dtype)
+        buffer[:, :in_channels] = x.array
+        features = [x] if chainer.config.enable_backprop else []
+        for unit in units:
+            y = unit.forward_buffer(buffer[:, :in_channels], features)
+            buffer[:, in_channels:(in_channels + unit.inc_channels)] = y.array
+            in_channels += unit.inc_channels
+            if features:
+                features.append(y)
+        if features:
+            # The buffer is not a part of the computational graph:
+            return F.concat(features, axis=1)
+        return chainer.Variable(buffer)
+
+
 class DenseNet(Chain):
     """
     DenseNet model from 'Densely Connected Convolutional Networks,' https://arxiv.org/abs/1608.06993.
@@ -247,6 +330,8 @@ class DenseNet(Chain):
         Number of output channels for the initial unit.
     dropout_rate : float, default 0.0
         Parameter of Dropout layer. Faction of the input units to drop.
+    memory_efficient : bool, default False
+        Whether to use the memory-efficient stages (shared feature buffers and recomputed bottlenecks).
     in_channels : int, default 3
         Number of input channels.
     classes : int, default 1000
@@ -256,6 +341,7 @@ class DenseNet(Chain):
                  channels,
                  init_block_channels,
                  dropout_rate=0.0,
+                 memory_efficient=False,
                  in_channels=3,
                  classes=1000):
         super(DenseNet, self).__init__()
@@ -268,7 +354,7 @@ class DenseNet(Chain):
                     out_channels=init_block_channels))
                 in_channels = init_block_channels
                 for i, channels_per_stage in enumerate(channels):
-                    stage = SimpleSequential()
+                    stage = DenseStage(memory_efficient=memory_efficient)
                     with stage.init_scope():
                         if i != 0:
                             setattr(stage, "trans{}".format(i + 1), TransitionBlock(
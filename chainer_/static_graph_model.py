@@ -0,0 +1,25 @@
+from chainer import Chain
+from chainer import static_graph
+
+
+class StaticGraphModel(Chain):
+    """
+    Static-graph wrapper for a classification model. The define-by-run code of the model (including the Python loops
+    of `SimpleSequential`/`DualPathSequential`) is executed only at the first call for each input shape, the recorded
+    schedule is replayed for the next calls. The model should be called with a fixed batch shape (each new shape, e.g.
+    the last incomplete batch, is traced once more).
+
+    Parameters:
+    ----------
+    base_model : Chain
+        Classification model.
+    """
+    def __init__(self,
+                 base_model):
+        super(StaticGraphModel, self).__init__()
+        with self.init_scope():
+            self.model = base_model
+
+    @static_graph
+    def __call__(self, x):
+        return self.model(x)
@@ -5,7 +5,15 @@ from chainer.utils import type_check
 
 
 class TopKAccuracy(Function):
+    """
+    Top-k accuracy. The k largest scores are selected with a partial sort (argpartition), which is O(C) per sample
+    instead of O(C log C) for the full sort, and only these k scores are sorted.
 
+    Parameters:
+    ----------
+    k : int or tuple of int, default 1
+        Value(s) of k. For a tuple all accuracies are computed in one pass (with a separate output for each value).
+    """
     def __init__(self, k=1):
         self.k = k
 
@@ -30,10 +38,90 @@ class TopKAccuracy(Function):
     def forward(self, inputs):
         xp = cuda.get_array_module(*inputs)
         y, t = inputs
+        k_list = self.k if isinstance(self.k, (tuple, list)) else (self.k,)
+        hit_pos = top_k_hit_positions(xp, y, t, max(k_list))
+        return tuple(xp.asarray((hit_pos < k).mean(dtype=xp.float32)) for k in k_list)
 
-        argsorted_pred = xp.argsort(y)[:, -self.k:]
-        return xp.asarray(xp.any(argsorted_pred.T == t, axis=0).mean(dtype=xp.float32)),
+
+def top_k_hit_positions(xp, y, t, max_k):
+    """
+    Position of the ground truth label among the `max_k` best scores for each sample (`max_k` if it is not there).
+
+    Parameters:
+    ----------
+    xp : module
+        Array module (numpy or cupy).
+    y : array
+        Predicted scores with the shape (N, C).
+    t : array
+        Ground truth labels with the shape (N,).
+    max_k : int
+        Maximal value of k.
+
+    Returns
+    -------
+    array
+        Positions with the shape (N,).
+    """
+    y = y.reshape((y.shape[0], -1))
+    max_k = min(max_k, y.shape[1])
+
+    if max_k < y.shape[1]:
+        top_inds = xp.argpartition(y, y.shape[1] - max_k, axis=1)[:, -max_k:]
+    else:
+        top_inds = xp.tile(xp.arange(y.shape[1]), (y.shape[0], 1))
+    rows = xp.arange(y.shape[0])[:, None]
+    # Order only the selected scores (the best one first):
+    order = xp.argsort(-y[rows, top_inds], axis=1)
+    hits = (top_inds[rows, order] == t.reshape((-1, 1)))
+    # Position of the first hit in the ordered top (max_k if there is no hit):
+    return xp.where(hits.any(axis=1), hits.argmax(axis=1), max_k)
+
+
+def top_k_hits(y, t, k=1):
+    """
+    Number of the samples with the ground truth label among the k best scores (exact counts for accumulation over
+    batches).
+
+    Parameters:
+    ----------
+    y : Variable or array
+        Predicted scores with the shape (N, C).
+    t : Variable or array
+        Ground truth labels with the shape (N,).
+    k : int or tuple of int, default 1
+        Value(s) of k.
+
+    Returns
+    -------
+    int or tuple of int
+        Number of hits for each value of k.
+    """
+    y = y.array if hasattr(y, 'array') else y
+    t = t.array if hasattr(t, 'array') else t
+    xp = cuda.get_array_module(y)
+    k_list = k if isinstance(k, (tuple, list)) else (k,)
+    hit_pos = top_k_hit_positions(xp, y, xp.asarray(t), max(k_list))
+    hits = tuple(int((hit_pos < ki).sum()) for ki in k_list)
+    return hits if isinstance(k, (tuple, list)) else hits[0]
 
 
 def top_k_accuracy(y, t, k=1):
+    """
+    Top-k accuracy.
+
+    Parameters:
+    ----------
+    y : Variable or array
+        Predicted scores with the shape (N, C).
+    t : Variable or array
+        Ground truth labels with the shape (N,).
+    k : int or tuple of int, default 1
+        Value(s) of k.
+
+    Returns
+    -------
+    Variable or tuple of Variable
+        Accuracy for each value of k.
+    """
     return TopKAccuracy(k=k)(y, t)
@@ -1,33 +1,131 @@
+import io
 import logging
 import os
 import numpy as np
+from PIL import Image
 
 from chainer import iterators
-from chainer.dataset import DatasetMixin
+from chainer.dataset import DatasetMixin, Iterator, to_device
 from chainer.serializers import load_npz
 
-from chainercv.datasets import directory_parsing_label_names
-from chainercv.datasets import DirectoryParsingLabelDataset
+from chainercv.utils import read_image
 
 from chainercv.transforms import scale
 from chainercv.transforms import center_crop
 
+from common.data_benchmark import TimedDataset
+from common.dataset_index import get_dataset_index
+from common.image_backends import ImageBackendDecoder, get_image_backend
+from common.image_decode import DraftResizeDecoder
+from common.recordio import IndexedRecordReader, unpack_img_record
+from common.val_cache import ValCache
 from .model_utils import get_model
 
 
+class IndexedImageFolderDataset(DatasetMixin):
+
+    def __init__(self,
+                 root,
+                 color=True,
+                 decoder=None):
+        self.index = get_dataset_index(root)
+        self.classes = list(self.index.classes)
+        self.color = color
+        self.decoder = decoder
+
+    def __len__(self):
+        return len(self.index)
+
+    def get_example(self, i):
+        if self.decoder is not None:
+            img = np.asarray(self.decoder(self.index.get_path(i)), dtype=np.float32).transpose((2, 0, 1))
+        else:
+            img = read_image(self.index.get_path(i), color=self.color)
+        label = np.int32(self.index.get_class_id(i))
+        return img, label
+
+
+class ImageRecordDataset(DatasetMixin):
+
+    def __init__(self,
+                 rec_path,
+                 idx_path):
+        self.reader = IndexedRecordReader(
+            rec_path=rec_path,
+            idx_path=idx_path)
+
+    def __len__(self):
+        return len(self.reader)
+
+    def get_example(self, i):
+        label, img = unpack_img_record(self.reader.read_idx(i))
+        img = Image.open(io.BytesIO(img)).convert('RGB')
+        img = np.asarray(img, dtype=np.float32).transpose((2, 0, 1))
+        if isinstance(label, np.ndarray):
+            label = label[0]
+        return img, np.int32(label)
+
+
+def get_val_decoder(scale_size=256,
+                    crop_size=224,
+                    jpeg_draft=False,
+                    image_backend=''):
+    if image_backend:
+        if jpeg_draft:
+            raise ValueError('JPEG draft decoding is not supported with an image backend')
+        return ImageBackendDecoder(
+            backend=get_image_backend(image_backend, crop_size=crop_size, resize=scale_size),
+            train=False)
+    # With the draft decoding images are decoded with the reduced resolution, but not less than scale_size:
+    return DraftResizeDecoder(scale_size) if jpeg_draft else None
+
+
 class PreprocessedDataset(DatasetMixin):
+    """
+    Dataset with the scaling and the center cropping (and the normalization) done in `get_example`, i.e. in the
+    iterator workers.
 
+    Parameters:
+    ----------
+    root : str or DatasetMixin
+        Dataset directory path or a dataset of raw images.
+    scale_size : int, default 256
+        Size of the shorter image side after scaling.
+    crop_size : int or tuple of 2 int, default 224
+        Size of the center crop.
+    mean : tuple of 3 float
+        Mean values for normalization.
+    std : tuple of 3 float
+        Standard deviation values for normalization.
+    jpeg_draft : bool, default False
+        Whether to decode JPEG images with the reduced resolution.
+    image_backend : str, default ''
+        Image backend for decoding, scaling and cropping (framework transforms by default).
+    normalize : bool, default True
+        Whether to normalize images (otherwise images are returned in the range [0, 255] to be normalized batch-wise).
+    """
     def __init__(self,
                  root,
                  scale_size=256,
                  crop_size=224,
                  mean=(0.485, 0.456, 0.406),
-                 std=(0.229, 0.224, 0.225)):
-        self.base = DirectoryParsingLabelDataset(root)
+                 std=(0.229, 0.224, 0.225),
+                 jpeg_draft=False,
+                 image_backend='',
+                 normalize=True):
+        if isinstance(root, DatasetMixin):
+            self.base = root
+        else:
+            self.base = IndexedImageFolderDataset(
+                root=root,
+                decoder=get_val_decoder(scale_size, crop_size, jpeg_draft, image_backend))
+        # The image backend decoder does the scaling and the cropping itself:
+        self.resized = bool(image_backend) and (not isinstance(root, DatasetMixin))
         self.scale_size = scale_size
         if isinstance(crop_size, int):
             crop_size = (crop_size, crop_size)
         self.crop_size = crop_size
+        self.normalize = normalize
         self.mean = np.array(mean, np.float32)[:, np.newaxis, np.newaxis]
         self.std = np.array(std, np.float32)[:, np.newaxis, np.newaxis]
 
@@ -35,11 +133,13 @@ class PreprocessedDataset(DatasetMixin):
         return len(self.base)
 
     def _preprocess(self, img):
-        img = scale(img=img, size=self.scale_size)
-        img = center_crop(img, self.crop_size)
-        img /= 255.0
-        img -= self.mean
-        img /= self.std
+        if not self.resized:
+            img = scale(img=img, size=self.scale_size)
+            img = center_crop(img, self.crop_size)
+        if self.normalize:
+            img /= 255.0
+            img -= self.mean
+            img /= self.std
         return img
 
     def get_example(self, i):
@@ -51,11 +151,23 @@ class PreprocessedDataset(DatasetMixin):
 def get_val_data_iterator(data_dir,
                           batch_size,
                           num_workers,
-                          num_classes):
+                          num_classes,
+                          jpeg_draft=False,
+                          image_backend='',
+                          worker_timer=None):
     val_dir_path = os.path.join(data_dir, 'val')
-    val_dataset = DirectoryParsingLabelDataset(val_dir_path)
+    # Images are scaled and cropped in the iterator workers, the normalization is done batch-wise by the predictor:
+    val_dataset = PreprocessedDataset(
+        root=val_dir_path,
+        jpeg_draft=jpeg_draft,
+        image_backend=image_backend,
+        normalize=False)
     val_dataset_len = len(val_dataset)
-    assert(len(directory_parsing_label_names(val_dir_path)) == num_classes)
+    assert len(val_dataset.base.classes) == num_classes
+    if worker_timer is not None:
+        val_dataset = TimedDataset(
+            dataset=val_dataset,
+            worker_timer=worker_timer)
     val_iterator = iterators.MultiprocessIterator(
         dataset=val_dataset,
         batch_size=batch_size,
@@ -66,18 +178,130 @@ def get_val_data_iterator(data_dir,
     return val_iterator, val_dataset_len
 
 
+class ValCacheIterator(Iterator):
+    """
+    Iterator over the memory-mapped cache of pre-decoded validation images. It yields whole batches, sliced straight
+    from the mapped shards, as a tuple of uint8 images (NCHW) and int32 labels.
+
+    Parameters:
+    ----------
+    val_cache : ValCache
+        Validation cache.
+    batch_size : int
+        Batch size.
+    """
+    def __init__(self,
+                 val_cache,
+                 batch_size):
+        self.val_cache = val_cache
+        self.batch_size = batch_size
+        self.reset()
+
+    def __len__(self):
+        return (len(self.val_cache) + self.batch_size - 1) // self.batch_size
+
+    def __next__(self):
+        if self.epoch > 0:
+            raise StopIteration
+        self._previous_epoch_detail = self.epoch_detail
+        start = self.current_position
+        stop = min(len(self.val_cache), start + self.batch_size)
+        images, labels = self.val_cache.get_batch(start, stop)
+        if stop >= len(self.val_cache):
+            self.current_position = 0
+            self.epoch += 1
+            self.is_new_epoch = True
+        else:
+            self.current_position = stop
+            self.is_new_epoch = False
+        return images, labels.astype(np.int32)
+
+    next = __next__
+
+    @property
+    def epoch_detail(self):
+        return self.epoch + float(self.current_position) / len(self.val_cache)
+
+    @property
+    def previous_epoch_detail(self):
+        if self._previous_epoch_detail < 0:
+            return None
+        return self._previous_epoch_detail
+
+    def reset(self):
+        self.current_position = 0
+        self.epoch = 0
+        self.is_new_epoch = False
+        self._previous_epoch_detail = -1.0
+
+    def serialize(self, serializer):
+        self.current_position = serializer('current_position', self.current_position)
+        self.epoch = serializer('epoch', self.epoch)
+        self.is_new_epoch = serializer('is_new_epoch', self.is_new_epoch)
+        self._previous_epoch_detail = serializer('previous_epoch_detail', self._previous_epoch_detail)
+
+
+def get_val_cache_iterator(data_dir,
+                           cache_dir,
+                           batch_size,
+                           num_workers):
+    val_cache = ValCache(
+        data_dir=data_dir,
+        cache_dir=cache_dir,
+        resize=256,
+        crop_size=224,
+        pipeline='chainercv',
+        num_workers=num_workers)
+    val_iterator = ValCacheIterator(
+        val_cache=val_cache,
+        batch_size=batch_size)
+    return val_iterator, len(val_cache)
+
+
+def scatter_datasets(train_dataset,
+                     val_dataset,
+                     comm):
+    # Each ChainerMN process gets its own shard of the training/validation data:
+    import chainermn
+    train_dataset = chainermn.scatter_dataset(train_dataset, comm, shuffle=True)
+    val_dataset = chainermn.scatter_dataset(val_dataset, comm)
+    return train_dataset, val_dataset
+
+
 def get_data_iterators(data_dir,
                        batch_size,
                        num_workers,
-                       num_classes):
+                       num_classes,
+                       jpeg_draft=False,
+                       image_backend='',
+                       train_worker_timer=None,
+                       val_worker_timer=None,
+                       comm=None):
 
     train_dir_path = os.path.join(data_dir, 'train')
-    train_dataset = PreprocessedDataset(root=train_dir_path)
-    assert(len(directory_parsing_label_names(train_dir_path)) == num_classes)
+    train_dataset = PreprocessedDataset(
+        root=train_dir_path,
+        jpeg_draft=jpeg_draft,
+        image_backend=image_backend)
+    assert len(train_dataset.base.classes) == num_classes
 
     val_dir_path = os.path.join(data_dir, 'val')
-    val_dataset = PreprocessedDataset(root=val_dir_path)
-    assert (len(directory_parsing_label_names(val_dir_path)) == num_classes)
+    val_dataset = PreprocessedDataset(
+        root=val_dir_path,
+        jpeg_draft=jpeg_draft,
+        image_backend=image_backend)
+    assert (len(val_dataset.base.classes) == num_classes)
+
+    if comm is not None:
+        train_dataset, val_dataset = scatter_datasets(train_dataset, val_dataset, comm)
+    if train_worker_timer is not None:
+        train_dataset = TimedDataset(
+            dataset=train_dataset,
+            worker_timer=train_worker_timer)
+    if val_worker_timer is not None:
+        val_dataset = TimedDataset(
+            dataset=val_dataset,
+            worker_timer=val_worker_timer)
 
     train_iterator = iterators.MultiprocessIterator(
         dataset=train_dataset,
@@ -96,6 +320,176 @@ def get_data_iterators(data_dir,
     return train_iterator, val_iterator
 
 
+def get_val_data_rec_iterator(rec_val,
+                              rec_val_idx,
+                              batch_size,
+                              num_workers,
+                              worker_timer=None):
+    val_dataset = PreprocessedDataset(
+        root=ImageRecordDataset(
+            rec_path=rec_val,
+            idx_path=rec_val_idx),
+        normalize=False)
+    val_dataset_len = len(val_dataset)
+    if worker_timer is not None:
+        val_dataset = TimedDataset(
+            dataset=val_dataset,
+            worker_timer=worker_timer)
+    val_iterator = iterators.MultiprocessIterator(
+        dataset=val_dataset,
+        batch_size=batch_size,
+        repeat=False,
+        shuffle=False,
+        n_processes=num_workers,
+        shared_mem=300000000)
+    return val_iterator, val_dataset_len
+
+
+def get_data_rec_iterators(rec_train,
+                           rec_train_idx,
+                           rec_val,
+                           rec_val_idx,
+                           batch_size,
+                           num_workers,
+                           train_worker_timer=None,
+                           val_worker_timer=None,
+                           comm=None):
+
+    train_dataset = PreprocessedDataset(root=ImageRecordDataset(
+        rec_path=rec_train,
+        idx_path=rec_train_idx))
+    val_dataset = PreprocessedDataset(root=ImageRecordDataset(
+        rec_path=rec_val,
+        idx_path=rec_val_idx))
+
+    if comm is not None:
+        train_dataset, val_dataset = scatter_datasets(train_dataset, val_dataset, comm)
+    if train_worker_timer is not None:
+        train_dataset = TimedDataset(
+            dataset=train_dataset,
+            worker_timer=train_worker_timer)
+    if val_worker_timer is not None:
+        val_dataset = TimedDataset(
+            dataset=val_dataset,
+            worker_timer=val_worker_timer)
+
+    train_iterator = iterators.MultiprocessIterator(
+        dataset=train_dataset,
+        batch_size=batch_size,
+        repeat=False,
+        shuffle=True,
+        n_processes=num_workers)
+
+    val_iterator = iterators.MultiprocessIterator(
+        dataset=val_dataset,
+        batch_size=batch_size,
+        repeat=False,
+        shuffle=False,
+        n_processes=num_workers)
+
+    return train_iterator, val_iterator
+
+
+class SyntheticDataIterator(Iterator):
+    """
+    Iterator, which yields the same preallocated random batch (for measuring the model throughput without the data
+    pipeline). The batch is already concatenated and placed on the device, so it should be used with
+    `synthetic_converter` and nothing is allocated or copied per batch.
+
+    Parameters:
+    ----------
+    batch_size : int
+        Batch size.
+    num_batches : int
+        Number of batches per epoch.
+    num_classes : int, default 1000
+        Number of classes.
+    in_shape : tuple of 3 int, default (3, 224, 224)
+        Shape of an input image.
+    repeat : bool, default True
+        Whether to repeat epochs.
+    device : int, default -1
+        Device ID (negative value for CPU).
+    """
+    def __init__(self,
+                 batch_size,
+                 num_batches,
+                 num_classes=1000,
+                 in_shape=(3, 224, 224),
+                 repeat=True,
+                 device=-1):
+        self.batch_size = batch_size
+        self.num_batches = num_batches
+        self.repeat = repeat
+        self.data = to_device(
+            device,
+            np.random.normal(size=((batch_size,) + tuple(in_shape))).astype(np.float32))
+        self.labels = to_device(
+            device,
+            np.random.randint(0, num_classes, size=batch_size).astype(np.int32))
+        self.reset()
+
+    def __next__(self):
+        if (not self.repeat) and (self.epoch > 0):
+            raise StopIteration
+        self._previous_epoch_detail = self.epoch_detail
+        self.current_position += 1
+        if self.current_position >= self.num_batches:
+            self.current_position = 0
+            self.epoch += 1
+            self.is_new_epoch = True
+        else:
+            self.is_new_epoch = False
+        return self.data, self.labels
+
+    next = __next__
+
+    @property
+    def epoch_detail(self):
+        return self.epoch + float(self.current_position) / self.num_batches
+
+    @property
+    def previous_epoch_detail(self):
+        if self._previous_epoch_detail < 0:
+            return None
+        return self._previous_epoch_detail
+
+    def reset(self):
+        self.current_position = 0
+        self.epoch = 0
+        self.is_new_epoch = False
+        self._previous_epoch_detail = -1.0
+
+    def serialize(self, serializer):
+        self.current_position = serializer('current_position', self.current_position)
+        self.epoch = serializer('epoch', self.epoch)
+        self.is_new_epoch = serializer('is_new_epoch', self.is_new_epoch)
+        self._previous_epoch_detail = serializer('previous_epoch_detail', self._previous_epoch_detail)
+
+
+def synthetic_converter(batch, device=None):
+    return batch
+
+
+def get_synthetic_data_iterators(batch_size,
+                                 num_batches,
+                                 num_classes=1000,
+                                 device=-1):
+    train_iterator = SyntheticDataIterator(
+        batch_size=batch_size,
+        num_batches=num_batches,
+        num_classes=num_classes,
+        repeat=True,
+        device=device)
+    val_iterator = SyntheticDataIterator(
+        batch_size=batch_size,
+        num_batches=num_batches,
+        num_classes=num_classes,
+        repeat=False,
+        device=device)
+    return train_iterator, val_iterator
+
+
 def prepare_model(model_name,
                   classes,
                   use_pretrained,
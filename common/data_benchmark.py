@@ -0,0 +1,172 @@
+"""
+    Loader-only benchmark (input pipeline throughput, data worker utilization and batch latency percentiles).
+"""
+
+__all__ = ['WorkerTimer', 'TimedDataset', 'benchmark_data']
+
+import os
+import time
+import logging
+import multiprocessing
+import numpy as np
+
+
+class WorkerTimer(object):
+    """
+    Accumulator of the time spent by data workers (processes) on sample preparation. The counters are kept in shared
+    memory, so they are visible from the main process for any worker pool created after the timer (PyTorch/Gluon
+    `DataLoader`, Chainer `MultiprocessIterator`).
+
+    Parameters:
+    ----------
+    max_workers : int, default 256
+        Maximal number of worker processes.
+    """
+    def __init__(self,
+                 max_workers=256):
+        self.max_workers = max_workers
+        self.lock = multiprocessing.Lock()
+        self.pids = multiprocessing.Array('l', max_workers, lock=False)
+        self.busy_times = multiprocessing.Array('d', max_workers, lock=False)
+        self.sample_counts = multiprocessing.Array('l', max_workers, lock=False)
+        self.slots = {}
+
+    def get_slot(self):
+        pid = os.getpid()
+        slot = self.slots.get(pid)
+        if slot is None:
+            with self.lock:
+                for i in range(self.max_workers):
+                    if self.pids[i] in (0, pid):
+                        self.pids[i] = pid
+                        slot = i
+                        break
+            self.slots[pid] = slot
+        return slot
+
+    def record(self, elapsed):
+        # Each slot is updated only by its own process:
+        slot = self.get_slot()
+        if slot is not None:
+            self.busy_times[slot] += elapsed
+            self.sample_counts[slot] += 1
+
+    def reset(self):
+        with self.lock:
+            for i in range(self.max_workers):
+                self.busy_times[i] = 0.0
+                self.sample_counts[i] = 0
+
+    def get_stats(self):
+        """
+        Get statistics for the workers, which have processed at least one sample.
+
+        Returns
+        -------
+        list of tuple of (int, float, int)
+            Process ID, busy time (in seconds) and sample count for each worker.
+        """
+        return [(self.pids[i], self.busy_times[i], self.sample_counts[i]) for i in range(self.max_workers)
+                if self.sample_counts[i] > 0]
+
+
+class TimedDataset(object):
+    """
+    Dataset wrapper, which measures the time of each sample preparation in the worker.
+
+    Parameters:
+    ----------
+    dataset : object
+        Dataset with random access.
+    worker_timer : WorkerTimer
+        Worker timer.
+    """
+    def __init__(self,
+                 dataset,
+                 worker_timer):
+        self.dataset = dataset
+        self.worker_timer = worker_timer
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, index):
+        tic = time.time()
+        sample = self.dataset[index]
+        self.worker_timer.record(time.time() - tic)
+        return sample
+
+
+def benchmark_data(data,
+                   batch_size,
+                   num_batches,
+                   num_workers,
+                   worker_timer=None,
+                   name='data'):
+    """
+    Drain batches from a data loader/iterator without a model and log the throughput, the batch latency percentiles
+    and the worker utilization (the share of the wall time spent on sample preparation).
+
+    Parameters:
+    ----------
+    data : iterable
+        Data loader or iterator.
+    batch_size : int
+        Batch size.
+    num_batches : int
+        Maximal number of batches to drain.
+    num_workers : int
+        Number of data workers (for the mean utilization).
+    worker_timer : WorkerTimer or None
+        Timer of the dataset workers (it stays empty for untimed pipelines, e.g. native record iterators).
+    name : str, default 'data'
+        Name of the data for logging.
+
+    Returns
+    -------
+    float
+        Throughput in samples/sec (without the first batch).
+    """
+    if hasattr(data, 'reset'):
+        data.reset()
+    if worker_timer is not None:
+        worker_timer.reset()
+
+    latencies = []
+    tic = time.time()
+    btic = tic
+    for i, _ in enumerate(data):
+        toc = time.time()
+        latencies.append(toc - btic)
+        btic = toc
+        if i + 1 >= num_batches:
+            break
+    total_time = time.time() - tic
+    if len(latencies) == 0:
+        logging.info('{}: no batches'.format(name))
+        return 0.0
+
+    # The first batch includes the worker startup and the pipeline filling:
+    first_latency = latencies[0]
+    steady_latencies = np.array(latencies[1:] if len(latencies) > 1 else latencies)
+    speed = batch_size * len(steady_latencies) / max(steady_latencies.sum(), 1e-9)
+    p50, p90, p99 = np.percentile(steady_latencies, [50, 90, 99]) * 1000.0
+    logging.info('{}: {} batches, {:.2f} samples/sec, first batch {:.3f} sec, batch latency p50={:.1f} ms, '
+                 'p90={:.1f} ms, p99={:.1f} ms, max={:.1f} ms'.format(
+                     name, len(latencies), speed, first_latency, p50, p90, p99, steady_latencies.max() * 1000.0))
+
+    stats = worker_timer.get_stats() if worker_timer is not None else []
+    if stats:
+        utilizations = [busy_time / total_time for _, busy_time, _ in stats]
+        mean_utilization = sum(utilizations) / max(num_workers, len(stats))
+        logging.info('{}: worker utilization mean={:.1f}% ({})'.format(
+            name, mean_utilization * 100.0,
+            ', '.join(['pid {}: {:.1f}% / {} samples'.format(pid, u * 100.0, count)
+                       for (pid, _, count), u in zip(stats, utilizations)])))
+        if mean_utilization > 0.9:
+            logging.info('{}: the data workers are saturated, the run is input-bound for models faster than '
+                         '{:.2f} samples/sec'.format(name, speed))
+    else:
+        logging.info('{}: worker utilization is not available for this pipeline'.format(name))
+
+    return speed
@@ -0,0 +1,174 @@
+"""
+    Persistent index of image files for datasets with the layout `root/class_x/xxx.jpg`.
+"""
+
+import os
+import logging
+import hashlib
+import numpy as np
+
+IMG_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.ppm', '.bmp', '.pgm', '.tif', '.tiff', '.webp')
+
+
+class DatasetIndex(object):
+    """
+    Index of image files of a dataset (relative paths, class ids and file sizes). The samples have the same order as
+    in torchvision ImageFolder.
+
+    Parameters:
+    ----------
+    root : str
+        Dataset directory path.
+    classes : np.array of str
+        Class names (sorted names of class directories).
+    paths : np.array of bytes
+        Relative image file paths.
+    class_ids : np.array of int32
+        Class ids.
+    sizes : np.array of int64
+        File sizes.
+    """
+    def __init__(self,
+                 root,
+                 classes,
+                 paths,
+                 class_ids,
+                 sizes):
+        self.root = root
+        self.classes = classes
+        self.paths = paths
+        self.class_ids = class_ids
+        self.sizes = sizes
+
+    def __len__(self):
+        return len(self.paths)
+
+    def get_path(self, i):
+        return os.path.join(self.root, self.paths[i].decode('utf-8'))
+
+    def get_class_id(self, i):
+        return int(self.class_ids[i])
+
+
+def get_dataset_index_file_path(root,
+                                cache_dir=None):
+    """
+    Get path of the index file for a dataset directory.
+
+    Parameters:
+    ----------
+    root : str
+        Dataset directory path.
+    cache_dir : str or None, default None
+        Directory for index files. Default is `~/.imgclsmob/index`.
+
+    Returns
+    -------
+    str
+        Index file path.
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join('~', '.imgclsmob', 'index')
+    root = os.path.abspath(os.path.expanduser(root))
+    root_hash = hashlib.sha1(root.encode('utf-8')).hexdigest()[:16]
+    file_name = '{}_{}.npz'.format(os.path.basename(root.rstrip(os.sep)) or 'root', root_hash)
+    return os.path.join(os.path.expanduser(cache_dir), file_name)
+
+
+def _get_dir_mtimes(root,
+                    dir_paths):
+    return np.array([os.stat(os.path.join(root, d)).st_mtime for d in dir_paths], dtype=np.float64)
+
+
+def build_dataset_index(root):
+    """
+    Walk a dataset directory and collect the index of image files.
+
+    Parameters:
+    ----------
+    root : str
+        Dataset directory path.
+
+    Returns
+    -------
+    tuple of (DatasetIndex, list of str)
+        Dataset index and relative paths of all visited directories.
+    """
+    classes = sorted([d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d))])
+    paths = []
+    class_ids = []
+    sizes = []
+    dir_paths = ['.']
+    for class_id, class_name in enumerate(classes):
+        class_dir_path = os.path.join(root, class_name)
+        for dir_path, dir_names, file_names in sorted(os.walk(class_dir_path, followlinks=True)):
+            dir_paths.append(os.path.relpath(dir_path, root))
+            for file_name in sorted(file_names):
+                if file_name.lower().endswith(IMG_EXTENSIONS):
+                    file_path = os.path.join(dir_path, file_name)
+                    paths.append(os.path.relpath(file_path, root).encode('utf-8'))
+                    class_ids.append(class_id)
+                    sizes.append(os.path.getsize(file_path))
+    dataset_index = DatasetIndex(
+        root=root,
+        classes=np.array(classes),
+        paths=np.array(paths, dtype=np.bytes_),
+        class_ids=np.array(class_ids, dtype=np.int32),
+        sizes=np.array(sizes, dtype=np.int64))
+    return dataset_index, dir_paths
+
+
+def get_dataset_index(root,
+                      cache_dir=None):
+    """
+    Load the index of image files for a dataset directory. The index is built on the first use and rebuilt if the
+    modification time of any dataset directory is changed.
+
+    Parameters:
+    ----------
+    root : str
+        Dataset directory path.
+    cache_dir : str or None, default None
+        Directory for index files. Default is `~/.imgclsmob/index`.
+
+    Returns
+    -------
+    DatasetIndex
+        Dataset index.
+    """
+    root = os.path.expanduser(root)
+    index_file_path = get_dataset_index_file_path(root, cache_dir)
+    if os.path.exists(index_file_path):
+        try:
+            with np.load(index_file_path) as f:
+                dir_paths = [d.decode('utf-8') for d in f['dir_paths']]
+                if np.array_equal(f['dir_mtimes'], _get_dir_mtimes(root, dir_paths)):
+                    return DatasetIndex(
+                        root=root,
+                        classes=f['classes'],
+                        paths=f['paths'],
+                        class_ids=f['class_ids'],
+                        sizes=f['sizes'])
+        except (IOError, OSError, KeyError, ValueError):
+            pass
+        logging.info('Dataset index is outdated: {}'.format(index_file_path))
+
+    logging.info('Building dataset index for {}'.format(root))
+    dataset_index, dir_paths = build_dataset_index(root)
+    index_dir_path = os.path.dirname(index_file_path)
+    try:
+        if not os.path.exists(index_dir_path):
+            os.makedirs(index_dir_path)
+        tmp_file_path = index_file_path + '.tmp.npz'
+        np.savez(
+            tmp_file_path,
+            classes=dataset_index.classes,
+            paths=dataset_index.paths,
+            class_ids=dataset_index.class_ids,
+            sizes=dataset_index.sizes,
+            dir_paths=np.array([d.encode('utf-8') for d in dir_paths], dtype=np.bytes_),
+            dir_mtimes=_get_dir_mtimes(root, dir_paths))
+        os.rename(tmp_file_path, index_file_path)
+    except (IOError, OSError):
+        logging.warning('Cannot save dataset index: {}'.format(index_file_path))
+    return dataset_index
@@ -0,0 +1,281 @@
+"""
+    Pluggable image decoding/augmentation backends (PIL, OpenCV, torchvision.io) for the standard ImageNet pipelines.
+"""
+
+__all__ = ['ImageBackend', 'PilImageBackend', 'OpenCVImageBackend', 'TorchvisionIOImageBackend', 'ImageBackendDecoder',
+           'get_image_backend']
+
+import random
+import numpy as np
+
+from .image_decode import get_random_resized_crop_params
+
+
+class ImageBackend(object):
+    """
+    Base class for image backends. It implements the train pipeline (RandomResizedCrop, horizontal flip, color jitter)
+    and the val pipeline (Resize + CenterCrop) of the training scripts over backend specific primitives. The random
+    parameters are sampled in the same way for all backends, and all pipelines return uint8 arrays with HWC layout.
+
+    Parameters:
+    ----------
+    crop_size : int, default 224
+        Output image size.
+    resize : int, default 256
+        Size of the shorter side before the center crop (val pipeline).
+    jitter_param : float, default 0.4
+        Brightness/contrast/saturation jitter value (train pipeline).
+    """
+    def __init__(self,
+                 crop_size=224,
+                 resize=256,
+                 jitter_param=0.4):
+        self.crop_size = crop_size
+        self.resize = resize
+        self.jitter_param = jitter_param
+
+    def decode(self, fp):
+        raise NotImplementedError()
+
+    def get_size(self, img):
+        raise NotImplementedError()
+
+    def crop(self, img, left, top, width, height):
+        raise NotImplementedError()
+
+    def resize_to(self, img, width, height):
+        raise NotImplementedError()
+
+    def flip_left_right(self, img):
+        raise NotImplementedError()
+
+    def adjust_brightness(self, img, factor):
+        raise NotImplementedError()
+
+    def adjust_contrast(self, img, factor):
+        raise NotImplementedError()
+
+    def adjust_saturation(self, img, factor):
+        raise NotImplementedError()
+
+    def to_array(self, img):
+        raise NotImplementedError()
+
+    def color_jitter(self, img):
+        adjust_funcs = [self.adjust_brightness, self.adjust_contrast, self.adjust_saturation]
+        factors = [random.uniform(max(0.0, 1.0 - self.jitter_param), 1.0 + self.jitter_param) for _ in adjust_funcs]
+        order = list(range(len(adjust_funcs)))
+        random.shuffle(order)
+        for i in order:
+            img = adjust_funcs[i](img, factors[i])
+        return img
+
+    def train_transform(self, fp):
+        img = self.decode(fp)
+        width, height = self.get_size(img)
+        left, top, w, h = get_random_resized_crop_params(width, height)
+        img = self.crop(img, left, top, w, h)
+        img = self.resize_to(img, self.crop_size, self.crop_size)
+        if random.random() < 0.5:
+            img = self.flip_left_right(img)
+        if self.jitter_param > 0.0:
+            img = self.color_jitter(img)
+        return self.to_array(img)
+
+    def val_transform(self, fp):
+        img = self.decode(fp)
+        width, height = self.get_size(img)
+        if width < height:
+            ow, oh = self.resize, int(self.resize * height / width)
+        else:
+            ow, oh = int(self.resize * width / height), self.resize
+        img = self.resize_to(img, ow, oh)
+        left = int(round((ow - self.crop_size) / 2.0))
+        top = int(round((oh - self.crop_size) / 2.0))
+        img = self.crop(img, left, top, self.crop_size, self.crop_size)
+        return self.to_array(img)
+
+
+class PilImageBackend(ImageBackend):
+    """
+    PIL backend (the same operations as torchvision transforms over PIL images).
+    """
+    def decode(self, fp):
+        from PIL import Image
+        return Image.open(fp).convert('RGB')
+
+    def get_size(self, img):
+        return img.size
+
+    def crop(self, img, left, top, width, height):
+        return img.crop((left, top, left + width, top + height))
+
+    def resize_to(self, img, width, height):
+        from PIL import Image
+        return img.resize((width, height), Image.BILINEAR)
+
+    def flip_left_right(self, img):
+        from PIL import Image
+        return img.transpose(Image.FLIP_LEFT_RIGHT)
+
+    def adjust_brightness(self, img, factor):
+        from PIL import ImageEnhance
+        return ImageEnhance.Brightness(img).enhance(factor)
+
+    def adjust_contrast(self, img, factor):
+        from PIL import ImageEnhance
+        return ImageEnhance.Contrast(img).enhance(factor)
+
+    def adjust_saturation(self, img, factor):
+        from PIL import ImageEnhance
+        return ImageEnhance.Color(img).enhance(factor)
+
+    def to_array(self, img):
+        # A writable copy (arrays over PIL images are read-only):
+        return np.array(img, dtype=np.uint8)
+
+
+class OpenCVImageBackend(ImageBackend):
+    """
+    OpenCV backend (images are RGB uint8 arrays, resized with the PIL bilinear filter, color adjustments are the same
+    blends as in PIL ImageEnhance).
+    """
+    def decode(self, fp):
+        import cv2
+        if hasattr(fp, 'read'):
+            img = cv2.imdecode(np.frombuffer(fp.read(), dtype=np.uint8), cv2.IMREAD_COLOR)
+        else:
+            img = cv2.imread(fp, cv2.IMREAD_COLOR)
+        if img is None:
+            raise IOError('Cannot decode image: {}'.format(fp))
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+    def get_size(self, img):
+        return img.shape[1], img.shape[0]
+
+    def crop(self, img, left, top, width, height):
+        return img[top:(top + height), left:(left + width)]
+
+    def resize_to(self, img, width, height):
+        from PIL import Image
+        # OpenCV has no antialiased bilinear resize (INTER_LINEAR aliases on downscaling, INTER_AREA is a box filter),
+        # so the array is resized with the PIL filter of the torchvision pipelines:
+        return np.array(Image.fromarray(np.ascontiguousarray(img)).resize((width, height), Image.BILINEAR))
+
+    def flip_left_right(self, img):
+        return img[:, ::-1]
+
+    @staticmethod
+    def _blend(img, degenerate, factor):
+        return np.clip(degenerate + factor * (img.astype(np.float32) - degenerate), 0, 255).astype(np.uint8)
+
+    @staticmethod
+    def _grayscale(img):
+        return (img[..., 0] * 0.299 + img[..., 1] * 0.587 + img[..., 2] * 0.114).astype(np.float32)
+
+    def adjust_brightness(self, img, factor):
+        return self._blend(img, np.float32(0.0), factor)
+
+    def adjust_contrast(self, img, factor):
+        mean = np.float32(int(self._grayscale(img).mean() + 0.5))
+        return self._blend(img, mean, factor)
+
+    def adjust_saturation(self, img, factor):
+        gray = np.round(self._grayscale(img))[..., np.newaxis]
+        return self._blend(img, gray, factor)
+
+    def to_array(self, img):
+        return np.ascontiguousarray(img)
+
+
+class TorchvisionIOImageBackend(ImageBackend):
+    """
+    torchvision.io backend (libjpeg-turbo decoding into uint8 tensors, torchvision tensor transforms).
+    """
+    def decode(self, fp):
+        import torch
+        from torchvision.io import decode_image, read_file, ImageReadMode
+        if hasattr(fp, 'read'):
+            data = torch.frombuffer(bytearray(fp.read()), dtype=torch.uint8)
+        else:
+            data = read_file(fp)
+        return decode_image(data, mode=ImageReadMode.RGB)
+
+    def get_size(self, img):
+        return img.shape[2], img.shape[1]
+
+    def crop(self, img, left, top, width, height):
+        return img[:, top:(top + height), left:(left + width)]
+
+    def resize_to(self, img, width, height):
+        import torchvision.transforms.functional as F
+        return F.resize(img, [height, width], antialias=True)
+
+    def flip_left_right(self, img):
+        return img.flip(-1)
+
+    def adjust_brightness(self, img, factor):
+        import torchvision.transforms.functional as F
+        return F.adjust_brightness(img, factor)
+
+    def adjust_contrast(self, img, factor):
+        import torchvision.transforms.functional as F
+        return F.adjust_contrast(img, factor)
+
+    def adjust_saturation(self, img, factor):
+        import torchvision.transforms.functional as F
+        return F.adjust_saturation(img, factor)
+
+    def to_array(self, img):
+        return img.permute(1, 2, 0).contiguous().numpy()
+
+
+class ImageBackendDecoder(object):
+    """
+    Picklable image loader (for data loader workers), which runs a pipeline of an image backend.
+
+    Parameters:
+    ----------
+    backend : ImageBackend
+        Image backend.
+    train : bool
+        Whether to use the train pipeline (otherwise the val one).
+    """
+    def __init__(self,
+                 backend,
+                 train):
+        self.backend = backend
+        self.train = train
+
+    def __call__(self, fp):
+        if self.train:
+            return self.backend.train_transform(fp)
+        else:
+            return self.backend.val_transform(fp)
+
+
+_backends = {
+    'pil': PilImageBackend,
+    'opencv': OpenCVImageBackend,
+    'tvio': TorchvisionIOImageBackend,
+}
+
+
+def get_image_backend(name, **kwargs):
+    """
+    Get image backend by name.
+
+    Parameters:
+    ----------
+    name : str
+        Backend name (pil, opencv or tvio).
+
+    Returns
+    -------
+    ImageBackend
+        Image backend.
+    """
+    name = name.lower()
+    if name not in _backends:
+        raise ValueError('Unsupported image backend: {}'.format(name))
+    return _backends[name](**kwargs)
@@ -0,0 +1,142 @@
+"""
+    Reduced-resolution JPEG decoding (PIL draft mode) for the resize-then-crop preprocessing.
+"""
+
+import math
+import random
+from PIL import Image
+
+
+def pil_open_draft(fp,
+                   min_width,
+                   min_height):
+    """
+    Open an image and decode it with the smallest JPEG DCT scale (1/1, 1/2, 1/4, 1/8) that still gives at least the
+    requested size. Non-JPEG images are decoded with the full resolution.
+
+    Parameters:
+    ----------
+    fp : str or file object
+        Image file path or file object.
+    min_width : int
+        Minimal width of the decoded image.
+    min_height : int
+        Minimal height of the decoded image.
+
+    Returns
+    -------
+    PIL.Image
+        Decoded RGB image.
+    """
+    img = Image.open(fp)
+    if img.format == 'JPEG':
+        img.draft('RGB', (int(min_width), int(min_height)))
+    return img.convert('RGB')
+
+
+def get_random_resized_crop_params(width,
+                                   height,
+                                   scale=(0.08, 1.0),
+                                   ratio=(3. / 4., 4. / 3.)):
+    """
+    Sample parameters of a random resized crop (the same algorithm as `RandomResizedCrop` in torchvision).
+
+    Parameters:
+    ----------
+    width : int
+        Image width.
+    height : int
+        Image height.
+    scale : tuple of 2 float, default (0.08, 1.0)
+        Range of the crop area with respect to the image area.
+    ratio : tuple of 2 float, default (3/4, 4/3)
+        Range of the crop aspect ratio.
+
+    Returns
+    -------
+    tuple of 4 int
+        Left, top, width and height of the crop.
+    """
+    area = width * height
+    log_ratio = (math.log(ratio[0]), math.log(ratio[1]))
+    for _ in range(10):
+        target_area = area * random.uniform(scale[0], scale[1])
+        aspect_ratio = math.exp(random.uniform(log_ratio[0], log_ratio[1]))
+        w = int(round(math.sqrt(target_area * aspect_ratio)))
+        h = int(round(math.sqrt(target_area / aspect_ratio)))
+        if 0 < w <= width and 0 < h <= height:
+            left = random.randint(0, width - w)
+            top = random.randint(0, height - h)
+            return left, top, w, h
+
+    # Fallback to central crop:
+    in_ratio = float(width) / float(height)
+    if in_ratio < min(ratio):
+        w = width
+        h = int(round(w / min(ratio)))
+    elif in_ratio > max(ratio):
+        h = height
+        w = int(round(h * max(ratio)))
+    else:
+        w = width
+        h = height
+    left = (width - w) // 2
+    top = (height - h) // 2
+    return left, top, w, h
+
+
+class DraftResizeDecoder(object):
+    """
+    Decoder for resize-then-center-crop pipelines. It decodes an image with the reduced resolution, but the shorter
+    side is not less than the target size (the image should be resized after that as usual).
+
+    Parameters:
+    ----------
+    size : int
+        Target size of the shorter image side.
+    """
+    def __init__(self,
+                 size):
+        self.size = size
+
+    def __call__(self, fp):
+        return pil_open_draft(fp, self.size, self.size)
+
+
+class DraftRandomResizedCropDecoder(object):
+    """
+    Decoder with the random resized crop (the same as `RandomResizedCrop` in torchvision). The crop is sampled from
+    the image header size before decoding, and the image is decoded with the smallest DCT scale for which the crop
+    region is not less than the output size.
+
+    Parameters:
+    ----------
+    size : int
+        Output size.
+    scale : tuple of 2 float, default (0.08, 1.0)
+        Range of the crop area with respect to the image area.
+    ratio : tuple of 2 float, default (3/4, 4/3)
+        Range of the crop aspect ratio.
+    """
+    def __init__(self,
+                 size,
+                 scale=(0.08, 1.0),
+                 ratio=(3. / 4., 4. / 3.)):
+        self.size = size
+        self.scale = scale
+        self.ratio = ratio
+
+    def __call__(self, fp):
+        img = Image.open(fp)
+        width, height = img.size
+        left, top, w, h = get_random_resized_crop_params(width, height, self.scale, self.ratio)
+        if img.format == 'JPEG':
+            reduction = 1
+            while (reduction < 8) and (w // (reduction * 2) >= self.size) and (h // (reduction * 2) >= self.size):
+                reduction *= 2
+            img.draft('RGB', (width // reduction, height // reduction))
+        img = img.convert('RGB')
+        sx = float(img.size[0]) / width
+        sy = float(img.size[1]) / height
+        box = (left * sx, top * sy, (left + w) * sx, (top + h) * sy)
+        return img.resize((self.size, self.size), Image.BILINEAR, box=box)
@@ -0,0 +1,117 @@
+"""
+    Framework-independent random-access reader for MXNet RecordIO files (.rec/.idx pairs).
+"""
+
+import os
+import struct
+import numpy as np
+
+_kMagic = 0xced7230a
+_IR_FORMAT = 'IfQQ'
+_IR_SIZE = struct.calcsize(_IR_FORMAT)
+
+
+def unpack_img_record(s):
+    """
+    Unpack a record packed by MXNet `recordio.pack_img` (im2rec) into a label and raw image bytes.
+
+    Parameters:
+    ----------
+    s : bytes
+        Record data.
+
+    Returns
+    -------
+    tuple of (float or np.array, bytes)
+        Label and encoded image.
+    """
+    flag, label, _, _ = struct.unpack(_IR_FORMAT, s[:_IR_SIZE])
+    s = s[_IR_SIZE:]
+    if flag > 0:
+        label = np.frombuffer(s[:(flag * 4)], dtype=np.float32)
+        s = s[(flag * 4):]
+    return label, s
+
+
+class IndexedRecordReader(object):
+    """
+    Indexed RecordIO reader with seek-by-index. The file is opened lazily, separately in each process, so that the
+    reader can be shared with data loader workers.
+
+    Parameters:
+    ----------
+    rec_path : str
+        Path to the .rec file.
+    idx_path : str
+        Path to the .idx file.
+    """
+    def __init__(self,
+                 rec_path,
+                 idx_path):
+        self.rec_path = os.path.expanduser(rec_path)
+        self.idx_path = os.path.expanduser(idx_path)
+        self.keys = []
+        self.offsets = []
+        with open(self.idx_path, 'r') as f:
+            for line in f:
+                line = line.strip().split('\t')
+                if len(line) < 2:
+                    continue
+                self.keys.append(int(line[0]))
+                self.offsets.append(int(line[1]))
+        self._file = None
+        self._pid = None
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_file'] = None
+        state['_pid'] = None
+        return state
+
+    def _get_file(self):
+        pid = os.getpid()
+        if (self._file is None) or (self._pid != pid):
+            self._file = open(self.rec_path, 'rb')
+            self._pid = pid
+        return self._file
+
+    def read_idx(self, i):
+        """
+        Read the i-th record (in order of the index file).
+
+        Parameters:
+        ----------
+        i : int
+            Record position.
+
+        Returns
+        -------
+        bytes
+            Record data.
+        """
+        f = self._get_file()
+        f.seek(self.offsets[i])
+        parts = []
+        while True:
+            magic, lrec = struct.unpack('II', f.read(8))
+            if magic != _kMagic:
+                raise IOError('Invalid RecordIO magic number in {}'.format(self.rec_path))
+            cflag = lrec >> 29
+            length = lrec & ((1 << 29) - 1)
+            parts.append(f.read(length))
+            pad = (4 - length % 4) % 4
+            if pad:
+                f.seek(pad, 1)
+            if cflag in (0, 3):
+                break
+            # A record with the magic number inside is split into parts, the magic number is restored on reading:
+            parts.append(struct.pack('I', _kMagic))
+        return b''.join(parts)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,308 @@
+"""
+    Memory-mapped cache of pre-decoded (resized and center-cropped) validation images.
+"""
+
+import os
+import hashlib
+import logging
+import math
+import numpy as np
+from multiprocessing import Pool
+from PIL import Image
+
+from .dataset_index import get_dataset_index
+
+
+def get_val_cache_dir_path(cache_dir,
+                           data_dir,
+                           resize,
+                           crop_size,
+                           pipeline):
+    """
+    Get directory path of the validation cache for the specific dataset, preprocessing pipeline and settings.
+
+    Parameters:
+    ----------
+    cache_dir : str
+        Root directory for caches.
+    data_dir : str
+        Dataset directory path (with `val` subdirectory).
+    resize : int
+        Size of the shorter image side after resizing.
+    crop_size : int
+        Size of the center crop.
+    pipeline : str
+        Name of the preprocessing pipeline (see `VAL_CACHE_PIPELINES`).
+
+    Returns
+    -------
+    str
+        Cache directory path.
+    """
+    # Different datasets in the same root directory are told apart by a hash of the resolved dataset path:
+    data_dir_hash = hashlib.md5(os.path.realpath(os.path.expanduser(data_dir)).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(os.path.expanduser(cache_dir), 'val_{}_r{}_c{}_{}'.format(
+        pipeline, resize, crop_size, data_dir_hash))
+
+
+def load_center_crop_torchvision(path,
+                                 resize,
+                                 crop_size):
+    """
+    Decode an image, resize its shorter side and crop the center with the torchvision functions (as the validation
+    transform of `eval_pt` does).
+
+    Parameters:
+    ----------
+    path : str
+        Image file path.
+    resize : int
+        Size of the shorter image side after resizing.
+    crop_size : int
+        Size of the center crop.
+
+    Returns
+    -------
+    np.array
+        Image as uint8 array with CHW layout.
+    """
+    import torchvision.transforms.functional as TF
+    with open(path, 'rb') as f:
+        img = Image.open(f)
+        img = img.convert('RGB')
+    img = TF.center_crop(TF.resize(img, resize), crop_size)
+    return np.asarray(img, dtype=np.uint8).transpose((2, 0, 1))
+
+
+def load_center_crop_mxnet(path,
+                           resize,
+                           crop_size):
+    """
+    Decode an image, resize its shorter side and crop the center with the mx.image functions (as the Gluon
+    `transforms.Resize(keep_ratio=True)` and `transforms.CenterCrop` of `eval_gl` do).
+
+    Parameters:
+    ----------
+    path : str
+        Image file path.
+    resize : int
+        Size of the shorter image side after resizing.
+    crop_size : int
+        Size of the center crop.
+
+    Returns
+    -------
+    np.array
+        Image as uint8 array with CHW layout.
+    """
+    import mxnet as mx
+    img = mx.image.imread(path)
+    h, w = img.shape[:2]
+    if h > w:
+        ow, oh = resize, int(h * resize / w)
+    else:
+        ow, oh = int(w * resize / h), resize
+    img = mx.image.imresize(img, ow, oh, interp=1)
+    img, _ = mx.image.center_crop(img, (crop_size, crop_size), interp=1)
+    return img.asnumpy().astype(np.uint8).transpose((2, 0, 1))
+
+
+def load_center_crop_chainercv(path,
+                               resize,
+                               crop_size):
+    """
+    Decode an image, scale its shorter side and crop the center with the chainercv functions (as the validation
+    dataset of `eval_ch` does). The scaled image is float, so it is rounded to uint8 (the values differ from the
+    uncached pipeline by at most half a level).
+
+    Parameters:
+    ----------
+    path : str
+        Image file path.
+    resize : int
+        Size of the shorter image side after scaling.
+    crop_size : int
+        Size of the center crop.
+
+    Returns
+    -------
+    np.array
+        Image as uint8 array with CHW layout.
+    """
+    from chainercv.utils import read_image
+    from chainercv.transforms import scale, center_crop
+    img = read_image(path, color=True)
+    img = scale(img=img, size=resize)
+    img = center_crop(img, (crop_size, crop_size))
+    return np.clip(np.round(img), 0, 255).astype(np.uint8)
+
+
+# Each framework resizes with its own library and interpolation, so the cache is built with the pipeline of the
+# evaluation script to keep the accuracy the same as without the cache:
+VAL_CACHE_PIPELINES = {
+    'torchvision': load_center_crop_torchvision,
+    'mxnet': load_center_crop_mxnet,
+    'chainercv': load_center_crop_chainercv,
+}
+
+
+def _load_center_crop_task(args):
+    pipeline, path, resize, crop_size = args
+    return VAL_CACHE_PIPELINES[pipeline](path, resize, crop_size)
+
+
+def build_val_cache(data_dir,
+                    cache_dir,
+                    resize=256,
+                    crop_size=224,
+                    pipeline='torchvision',
+                    shard_size=10000,
+                    num_workers=4):
+    """
+    Decode all validation images once and write them into memory-mapped .npy shards.
+
+    Parameters:
+    ----------
+    data_dir : str
+        Dataset directory path (with `val` subdirectory).
+    cache_dir : str
+        Root directory for caches.
+    resize : int, default 256
+        Size of the shorter image side after resizing.
+    crop_size : int, default 224
+        Size of the center crop.
+    pipeline : str, default 'torchvision'
+        Name of the preprocessing pipeline (see `VAL_CACHE_PIPELINES`).
+    shard_size : int, default 10000
+        Number of images in one shard.
+    num_workers : int, default 4
+        Number of decoding processes.
+
+    Returns
+    -------
+    str
+        Cache directory path.
+    """
+    if pipeline not in VAL_CACHE_PIPELINES:
+        raise ValueError('Unknown validation cache pipeline: {}'.format(pipeline))
+    cache_dir_path = get_val_cache_dir_path(cache_dir, data_dir, resize, crop_size, pipeline)
+    if not os.path.exists(cache_dir_path):
+        os.makedirs(cache_dir_path)
+    dataset_index = get_dataset_index(os.path.join(data_dir, 'val'))
+    samples = [(dataset_index.get_path(i), dataset_index.get_class_id(i)) for i in range(len(dataset_index))]
+    num_samples = len(samples)
+    num_shards = int(math.ceil(float(num_samples) / shard_size))
+    logging.info('Building validation cache: {} ({} images, {} shards)'.format(
+        cache_dir_path, num_samples, num_shards))
+
+    pool = Pool(processes=max(1, num_workers))
+    try:
+        for shard_ind in range(num_shards):
+            shard_samples = samples[(shard_ind * shard_size):((shard_ind + 1) * shard_size)]
+            shard_file_path = os.path.join(cache_dir_path, 'images_{:04d}.npy'.format(shard_ind))
+            images = np.lib.format.open_memmap(
+                filename=shard_file_path + '.tmp',
+                mode='w+',
+                dtype=np.uint8,
+                shape=(len(shard_samples), 3, crop_size, crop_size))
+            tasks = [(pipeline, path, resize, crop_size) for path, _ in shard_samples]
+            for i, img in enumerate(pool.imap(_load_center_crop_task, tasks, chunksize=64)):
+                images[i] = img
+            images.flush()
+            del images
+            os.rename(shard_file_path + '.tmp', shard_file_path)
+    finally:
+        pool.close()
+        pool.join()
+
+    # Labels are written last and mark the cache as complete:
+    labels = np.array([class_id for _, class_id in samples], dtype=np.int64)
+    np.save(os.path.join(cache_dir_path, 'labels.npy'), labels)
+    return cache_dir_path
+
+
+class ValCache(object):
+    """
+    Pre-decoded validation images, stored in memory-mapped shards. Batches are sliced straight from the mapped files.
+
+    Parameters:
+    ----------
+    data_dir : str
+        Dataset directory path (with `val` subdirectory).
+    cache_dir : str
+        Root directory for caches.
+    resize : int, default 256
+        Size of the shorter image side after resizing.
+    crop_size : int, default 224
+        Size of the center crop.
+    pipeline : str, default 'torchvision'
+        Name of the preprocessing pipeline, which the cache is built with (see `VAL_CACHE_PIPELINES`).
+    num_workers : int, default 4
+        Number of decoding processes for building the cache.
+    """
+    def __init__(self,
+                 data_dir,
+                 cache_dir,
+                 resize=256,
+                 crop_size=224,
+                 pipeline='torchvision',
+                 num_workers=4):
+        cache_dir_path = get_val_cache_dir_path(cache_dir, data_dir, resize, crop_size, pipeline)
+        labels_file_path = os.path.join(cache_dir_path, 'labels.npy')
+        if not os.path.exists(labels_file_path):
+            build_val_cache(
+                data_dir=data_dir,
+                cache_dir=cache_dir,
+                resize=resize,
+                crop_size=crop_size,
+                pipeline=pipeline,
+                num_workers=num_workers)
+        self.labels = np.load(labels_file_path)
+        shard_file_names = sorted([f for f in os.listdir(cache_dir_path) if f.startswith('images_')])
+        shard_file_names = [f for f in shard_file_names if f.endswith('.npy')]
+        self.shards = [np.load(os.path.join(cache_dir_path, f), mmap_mode='r') for f in shard_file_names]
+        self.shard_offsets = np.cumsum([0] + [len(s) for s in self.shards])
+        assert (self.shard_offsets[-1] == len(self.labels))
+
+    def __len__(self):
+        return len(self.labels)
+
+    def get_batch(self, start, stop):
+        """
+        Get a batch of images (uint8, NCHW) and labels.
+
+        Parameters:
+        ----------
+        start : int
+            Index of the first sample.
+        stop : int
+            Index after the last sample.
+
+        Returns
+        -------
+        tuple of two np.array
+            Images and labels.
+        """
+        parts = []
+        shard_ind = int(np.searchsorted(self.shard_offsets, start, side='right')) - 1
+        pos = start
+        while pos < stop:
+            shard_start = self.shard_offsets[shard_ind]
+            shard_stop = min(stop, self.shard_offsets[shard_ind + 1])
+            parts.append(self.shards[shard_ind][(pos - shard_start):(shard_stop - shard_start)])
+            pos = shard_stop
+            shard_ind += 1
+        images = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        return images, self.labels[start:stop]
+
+    def iter_batches(self, batch_size):
+        """
+        Iterate over the whole cache with batches.
+
+        Parameters:
+        ----------
+        batch_size : int
+            Batch size.
+        """
+        for start in range(0, len(self), batch_size):
+            yield self.get_batch(start, min(len(self), start + batch_size))
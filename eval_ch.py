@@ -4,15 +4,15 @@ import logging
 import numpy as np
 
 from chainer import cuda, global_config
-import chainer.functions as F
-
-from chainercv.utils import apply_to_iterator
-from chainercv.utils import ProgressHook
 
 from common.logger_utils import initialize_logging
+from common.data_benchmark import WorkerTimer, benchmark_data
 from chainer_.imagenet_predictor import ImagenetPredictor
-from chainer_.top_k_accuracy import top_k_accuracy
-from chainer_.utils import get_val_data_iterator, prepare_model
+from chainer_.model_fusion import fuse_for_inference
+from chainer_.static_graph_model import StaticGraphModel
+from chainer_.ideep_utils import enable_ideep, check_ideep_coverage
+from chainer_.top_k_accuracy import top_k_hits
+from chainer_.utils import get_val_data_iterator, get_val_data_rec_iterator, get_val_cache_iterator, prepare_model
 
 
 def parse_args():
@@ -23,6 +23,53 @@ def parse_args():
         type=str,
         default='../imgclsmob_data/imagenet',
         help='training and validation pictures to use.')
+    parser.add_argument(
+        '--rec-train',
+        type=str,
+        default='../imgclsmob_data/imagenet/rec/train.rec',
+        help='the training data')
+    parser.add_argument(
+        '--rec-train-idx',
+        type=str,
+        default='../imgclsmob_data/imagenet/rec/train.idx',
+        help='the index of training data')
+    parser.add_argument(
+        '--rec-val',
+        type=str,
+        default='../imgclsmob_data/imagenet/rec/val.rec',
+        help='the validation data')
+    parser.add_argument(
+        '--rec-val-idx',
+        type=str,
+        default='../imgclsmob_data/imagenet/rec/val.idx',
+        help='the index of validation data')
+    parser.add_argument(
+        '--use-rec',
+        action='store_true',
+        help='use image record files for data input. default is false.')
+    parser.add_argument(
+        '--jpeg-draft',
+        action='store_true',
+        help='decode JPEG images with the reduced resolution (PIL draft mode) before resizing/cropping.')
+    parser.add_argument(
+        '--image-backend',
+        type=str,
+        default='',
+        help='image decoding/augmentation backend (pil, opencv or tvio). Backends reproduce the torchvision '
+             'pipelines, which resize differently from chainercv, so the accuracy is not comparable to the default '
+             'one. default is the framework transforms.')
+    parser.add_argument(
+        '--val-cache',
+        type=str,
+        default='',
+        help='root directory of the pre-decoded validation caches (a cache is built on the first use for the '
+             'dataset, with the chainercv resizing and center cropping). default is disabled.')
+    parser.add_argument(
+        '--benchmark-data',
+        type=int,
+        default=0,
+        help='number of batches to drain from the data loaders without the model (to measure the input pipeline '
+             'throughput). default is 0 to disable.')
 
     parser.add_argument(
         '--model',
@@ -44,6 +91,19 @@ def parse_args():
         type=int,
         default=0,
         help='number of gpus to use.')
+    parser.add_argument(
+        '--fuse-layers',
+        action='store_true',
+        help='fold the CondenseNet classifier gather into the linear weights. default is false.')
+    parser.add_argument(
+        '--use-ideep',
+        action='store_true',
+        help='use iDeep (MKL-DNN) functions and parameters for CPU computations. default is false.')
+    parser.add_argument(
+        '--static-graph',
+        action='store_true',
+        help='trace the model once for the batch shape and replay the static graph (chainer.static_graph). default '
+             'is false.')
     parser.add_argument(
         '-j',
         '--num-data-workers',
@@ -57,6 +117,11 @@ def parse_args():
         type=int,
         default=32,
         help='training batch size per device (CPU/GPU).')
+    parser.add_argument(
+        '--log-interval',
+        type=int,
+        default=50,
+        help='number of batches to wait before logging.')
 
     parser.add_argument(
         '--save-dir',
@@ -87,6 +152,7 @@ def test(net,
          val_iterator,
          val_dataset_len,
          num_gpus,
+         log_interval=50,
          calc_weight_count=False,
          extended_log=False):
     tic = time.time()
@@ -100,27 +166,36 @@ def test(net,
         weight_count = net.count_params()
         logging.info('Model: {} trainable parameters'.format(weight_count))
 
-    in_values, out_values, rest_values = apply_to_iterator(
-        predictor.predict,
-        val_iterator,
-        hook=ProgressHook(val_dataset_len))
-    del in_values
-
-    pred_probs, = out_values
-    gt_labels, = rest_values
+    # Top-k hits are accumulated batch by batch, so the memory does not depend on the dataset size:
+    top1_hits = 0
+    top5_hits = 0
+    num_samples = 0
+    btic = time.time()
+    bsamples = 0
+    for i, batch in enumerate(val_iterator):
+        if isinstance(batch, tuple):
+            # The validation cache iterator yields whole batches of images and labels:
+            imgs, t = batch
+        else:
+            imgs = [img for img, _ in batch]
+            t = np.array([label for _, label in batch], np.int32)
+        x = predictor.preprocess(imgs)
+        y = predictor.predict(x)
+        batch_top1_hits, batch_top5_hits = top_k_hits(y=y, t=t, k=(1, 5))
+        top1_hits += batch_top1_hits
+        top5_hits += batch_top5_hits
+        num_samples += len(t)
 
-    y = np.array(list(pred_probs))
-    t = np.array(list(gt_labels))
+        if log_interval and not (i + 1) % log_interval:
+            speed = (num_samples - bsamples) / (time.time() - btic)
+            btic = time.time()
+            bsamples = num_samples
+            logging.info('Test: [{}/{}]\tSpeed: {:.2f} samples/sec\terr-top1={:.4f}\terr-top5={:.4f}'.format(
+                num_samples, val_dataset_len, speed, 1.0 - float(top1_hits) / num_samples,
+                1.0 - float(top5_hits) / num_samples))
 
-    top1_acc = F.accuracy(
-        y=y,
-        t=t).data
-    top5_acc = top_k_accuracy(
-        y=y,
-        t=t,
-        k=5).data
-    err_top1_val = 1.0 - top1_acc
-    err_top5_val = 1.0 - top5_acc
+    err_top1_val = 1.0 - float(top1_hits) / num_samples
+    err_top5_val = 1.0 - float(top5_hits) / num_samples
 
     if extended_log:
         logging.info('Test: err-top1={top1:.4f} ({top1})\terr-top5={top5:.4f} ({top5})'.format(
@@ -149,18 +224,53 @@ def main():
         cuda.get_device(0).use()
 
     num_classes = 1000
+    val_worker_timer = WorkerTimer() if args.benchmark_data > 0 else None
+    if args.val_cache:
+        val_iterator, val_dataset_len = get_val_cache_iterator(
+            data_dir=args.data_dir,
+            cache_dir=args.val_cache,
+            batch_size=args.batch_size,
+            num_workers=args.num_workers)
+    elif args.use_rec:
+        val_iterator, val_dataset_len = get_val_data_rec_iterator(
+            rec_val=args.rec_val,
+            rec_val_idx=args.rec_val_idx,
+            batch_size=args.batch_size,
+            num_workers=args.num_workers,
+            worker_timer=val_worker_timer)
+    else:
+        val_iterator, val_dataset_len = get_val_data_iterator(
+            data_dir=args.data_dir,
+            batch_size=args.batch_size,
+            num_workers=args.num_workers,
+            num_classes=num_classes,
+            jpeg_draft=args.jpeg_draft,
+            image_backend=args.image_backend,
+            worker_timer=val_worker_timer)
+
+    if args.benchmark_data > 0:
+        benchmark_data(
+            data=val_iterator,
+            batch_size=args.batch_size,
+            num_batches=args.benchmark_data,
+            num_workers=args.num_workers,
+            worker_timer=val_worker_timer,
+            name='Val data')
+        val_iterator.finalize()
+        return
+
     net = prepare_model(
         model_name=args.model,
         classes=num_classes,
         use_pretrained=args.use_pretrained,
         pretrained_model_file_path=args.resume.strip(),
         num_gpus=num_gpus)
-
-    val_iterator, val_dataset_len = get_val_data_iterator(
-        data_dir=args.data_dir,
-        batch_size=args.batch_size,
-        num_workers=args.num_workers,
-        num_classes=num_classes)
+    if args.fuse_layers:
+        fuse_for_inference(net)
+    if args.use_ideep and (num_gpus == 0) and enable_ideep(net):
+        check_ideep_coverage(net)
+    if args.static_graph:
+        net = StaticGraphModel(net)
 
     assert (args.use_pretrained or args.resume.strip())
     test(
@@ -168,6 +278,7 @@ def main():
         val_iterator=val_iterator,
         val_dataset_len=val_dataset_len,
         num_gpus=num_gpus,
+        log_interval=args.log_interval,
         calc_weight_count=True,
         extended_log=True)
 
@@ -2,11 +2,12 @@ import argparse
 import time
 import logging
 
-import mxnet as mx
-
 from common.logger_utils import initialize_logging
-from gluon.utils import prepare_mx_context, prepare_model, get_data_rec, get_data_loader, calc_net_weight_count,\
-    validate
+from common.data_benchmark import WorkerTimer, benchmark_data
+from gluon.metrics import DeviceTopKAccuracy
+from gluon.model_fusion import fuse_for_inference
+from gluon.utils import prepare_mx_context, prepare_model, get_data_rec, get_data_loader, get_val_cache_loader,\
+    get_synthetic_data, calc_net_weight_count, validate
 
 
 def parse_args():
@@ -41,6 +42,39 @@ def parse_args():
         '--use-rec',
         action='store_true',
         help='use image record iter for data input. default is false.')
+    parser.add_argument(
+        '--jpeg-draft',
+        action='store_true',
+        help='decode JPEG images with the reduced resolution (PIL draft mode) before resizing/cropping.')
+    parser.add_argument(
+        '--image-backend',
+        type=str,
+        default='',
+        help='image decoding/augmentation backend (pil, opencv or tvio). Backends reproduce the torchvision '
+             'pipelines, which resize differently from mx.image, so the accuracy is not comparable to the default '
+             'one. default is the framework transforms.')
+    parser.add_argument(
+        '--val-cache',
+        type=str,
+        default='',
+        help='root directory of the pre-decoded validation caches (a cache is built on the first use for the '
+             'dataset, with the mx.image resizing and center cropping). default is disabled.')
+    parser.add_argument(
+        '--synthetic-data',
+        action='store_true',
+        help='use preallocated random batches instead of the dataset (to measure the pure model throughput). '
+             'default is false.')
+    parser.add_argument(
+        '--synthetic-batches',
+        type=int,
+        default=100,
+        help='number of synthetic batches per epoch.')
+    parser.add_argument(
+        '--benchmark-data',
+        type=int,
+        default=0,
+        help='number of batches to drain from the data loaders without the model (to measure the input pipeline '
+             'throughput). default is 0 to disable.')
 
     parser.add_argument(
         '--model',
@@ -61,6 +95,11 @@ def parse_args():
         type=str,
         default='',
         help='resume from previously saved parameters if not None')
+    parser.add_argument(
+        '--fuse-layers',
+        action='store_true',
+        help='fold the CondenseNet classifier gather into the dense weights and the channel shuffles after '
+             'non-grouped convolutions into the convolution weights. default is false.')
 
     parser.add_argument(
         '--num-gpus',
@@ -114,8 +153,8 @@ def test(net,
          ctx,
          calc_weight_count=False,
          extended_log=False):
-    acc_top1 = mx.metric.Accuracy()
-    acc_top5 = mx.metric.TopKAccuracy(5)
+    acc_top1 = DeviceTopKAccuracy(top_k=1)
+    acc_top5 = DeviceTopKAccuracy(top_k=5)
 
     tic = time.time()
     err_top1_val, err_top5_val = validate(
@@ -155,16 +194,23 @@ def main():
         batch_size=args.batch_size)
 
     num_classes = 1000
-    net = prepare_model(
-        model_name=args.model,
-        classes=num_classes,
-        use_pretrained=args.use_pretrained,
-        pretrained_model_file_path=args.resume.strip(),
-        dtype=args.dtype,
-        tune_layers="",
-        ctx=ctx)
-
-    if args.use_rec:
+    val_worker_timer = WorkerTimer() if args.benchmark_data > 0 else None
+    use_rec = args.use_rec
+    if args.synthetic_data:
+        use_rec = False
+        _, val_data, batch_fn = get_synthetic_data(
+            batch_size=batch_size,
+            num_batches=args.synthetic_batches,
+            ctx=ctx,
+            num_classes=num_classes)
+    elif args.val_cache:
+        use_rec = False
+        val_data, batch_fn = get_val_cache_loader(
+            data_dir=args.data_dir,
+            cache_dir=args.val_cache,
+            batch_size=batch_size,
+            num_workers=args.num_workers)
+    elif args.use_rec:
         train_data, val_data, batch_fn = get_data_rec(
             rec_train=args.rec_train,
             rec_train_idx=args.rec_train_idx,
@@ -176,14 +222,38 @@ def main():
         train_data, val_data, batch_fn = get_data_loader(
             data_dir=args.data_dir,
             batch_size=batch_size,
-            num_workers=args.num_workers)
+            num_workers=args.num_workers,
+            jpeg_draft=args.jpeg_draft,
+            image_backend=args.image_backend,
+            val_worker_timer=val_worker_timer)
+
+    if args.benchmark_data > 0:
+        benchmark_data(
+            data=val_data,
+            batch_size=batch_size,
+            num_batches=args.benchmark_data,
+            num_workers=args.num_workers,
+            worker_timer=val_worker_timer,
+            name='Val data')
+        return
+
+    net = prepare_model(
+        model_name=args.model,
+        classes=num_classes,
+        use_pretrained=args.use_pretrained,
+        pretrained_model_file_path=args.resume.strip(),
+        dtype=args.dtype,
+        tune_layers="",
+        ctx=ctx)
+    if args.fuse_layers:
+        fuse_for_inference(net)
 
     assert (args.use_pretrained or args.resume.strip())
     test(
         net=net,
         val_data=val_data,
         batch_fn=batch_fn,
-        use_rec=args.use_rec,
+        use_rec=use_rec,
         dtype=args.dtype,
         ctx=ctx,
         # calc_weight_count=(not log_file_exist),
@@ -3,9 +3,11 @@ import time
 import logging
 
 from common.logger_utils import initialize_logging
+from common.data_benchmark import WorkerTimer, benchmark_data
 from pytorch.model_stats import measure_model
-from pytorch.utils import prepare_pt_context, prepare_model, get_data_loader, calc_net_weight_count, validate,\
-    AverageMeter
+from pytorch.model_fusion import fuse_for_inference
+from pytorch.utils import prepare_pt_context, prepare_model, get_data_loader, get_data_rec, get_val_cache_loader,\
+    get_synthetic_data, DataPrefetcher, calc_net_weight_count, validate, AverageMeter
 
 
 def parse_args():
@@ -16,6 +18,36 @@ def parse_args():
         type=str,
         default='../imgclsmob_data/imagenet',
         help='training and validation pictures to use.')
+    parser.add_argument(
+        '--rec-train',
+        type=str,
+        default='../imgclsmob_data/imagenet/rec/train.rec',
+        help='the training data')
+    parser.add_argument(
+        '--rec-train-idx',
+        type=str,
+        default='../imgclsmob_data/imagenet/rec/train.idx',
+        help='the index of training data')
+    parser.add_argument(
+        '--rec-val',
+        type=str,
+        default='../imgclsmob_data/imagenet/rec/val.rec',
+        help='the validation data')
+    parser.add_argument(
+        '--rec-val-idx',
+        type=str,
+        default='../imgclsmob_data/imagenet/rec/val.idx',
+        help='the index of validation data')
+    parser.add_argument(
+        '--use-rec',
+        action='store_true',
+        help='use image record files for data input. default is false.')
+    parser.add_argument(
+        '--val-cache',
+        type=str,
+        default='',
+        help='root directory of the pre-decoded validation caches (a cache is built on the first use for the '
+             'dataset, with the torchvision resizing and center cropping). default is disabled.')
 
     parser.add_argument(
         '--model',
@@ -36,6 +68,11 @@ def parse_args():
         dest='calc_flops',
         action='store_true',
         help='calculate FLOPs')
+    parser.add_argument(
+        '--fuse-bn',
+        action='store_true',
+        help='fold the BatchNorm layers, which directly follow convolutions, into them (and the CondenseNet '
+             'classifier gather and the foldable channel shuffles into the layer weights). default is false.')
 
     parser.add_argument(
         '--num-gpus',
@@ -49,6 +86,40 @@ def parse_args():
         default=4,
         type=int,
         help='number of preprocessing workers')
+    parser.add_argument(
+        '--uint8-transport',
+        action='store_true',
+        help='transfer batches from workers as uint8 and normalize them in batch on the trainer side.')
+    parser.add_argument(
+        '--jpeg-draft',
+        action='store_true',
+        help='decode JPEG images with the reduced resolution (PIL draft mode) before resizing/cropping.')
+    parser.add_argument(
+        '--image-backend',
+        type=str,
+        default='',
+        help='image decoding/augmentation backend (pil, opencv or tvio). default is the framework transforms.')
+    parser.add_argument(
+        '--prefetch-depth',
+        type=int,
+        default=0,
+        help='number of batches prepared (and copied to GPU) in a background thread. default is 0 to disable.')
+    parser.add_argument(
+        '--synthetic-data',
+        action='store_true',
+        help='use preallocated random batches instead of the dataset (to measure the pure model throughput). '
+             'default is false.')
+    parser.add_argument(
+        '--synthetic-batches',
+        type=int,
+        default=100,
+        help='number of synthetic batches per epoch.')
+    parser.add_argument(
+        '--benchmark-data',
+        type=int,
+        default=0,
+        help='number of batches to drain from the data loaders without the model (to measure the input pipeline '
+             'throughput). default is 0 to disable.')
 
     parser.add_argument(
         '--batch-size',
@@ -129,17 +200,67 @@ def main():
         batch_size=args.batch_size)
 
     classes = 1000
+    val_worker_timer = WorkerTimer() if args.benchmark_data > 0 else None
+    if args.synthetic_data:
+        _, val_data = get_synthetic_data(
+            batch_size=batch_size,
+            num_batches=args.synthetic_batches,
+            num_classes=classes,
+            use_cuda=use_cuda)
+    elif args.val_cache:
+        val_data = get_val_cache_loader(
+            data_dir=args.data_dir,
+            cache_dir=args.val_cache,
+            batch_size=batch_size,
+            num_workers=args.num_workers)
+    elif args.use_rec:
+        train_data, val_data = get_data_rec(
+            rec_train=args.rec_train,
+            rec_train_idx=args.rec_train_idx,
+            rec_val=args.rec_val,
+            rec_val_idx=args.rec_val_idx,
+            batch_size=batch_size,
+            num_workers=args.num_workers,
+            uint8_transport=args.uint8_transport,
+            jpeg_draft=args.jpeg_draft,
+            image_backend=args.image_backend,
+            use_cuda=use_cuda,
+            val_worker_timer=val_worker_timer)
+    else:
+        train_data, val_data = get_data_loader(
+            data_dir=args.data_dir,
+            batch_size=batch_size,
+            num_workers=args.num_workers,
+            uint8_transport=args.uint8_transport,
+            jpeg_draft=args.jpeg_draft,
+            image_backend=args.image_backend,
+            use_cuda=use_cuda,
+            val_worker_timer=val_worker_timer)
+
+    if (args.prefetch_depth > 0) and (not args.synthetic_data):
+        val_data = DataPrefetcher(
+            loader=val_data,
+            use_cuda=use_cuda,
+            depth=args.prefetch_depth)
+
+    if args.benchmark_data > 0:
+        benchmark_data(
+            data=val_data,
+            batch_size=batch_size,
+            num_batches=args.benchmark_data,
+            num_workers=args.num_workers,
+            worker_timer=val_worker_timer,
+            name='Val data')
+        return
+
     net = prepare_model(
         model_name=args.model,
         classes=classes,
         use_pretrained=args.use_pretrained,
         pretrained_model_file_path=args.resume.strip(),
         use_cuda=use_cuda)
-
-    train_data, val_data = get_data_loader(
-        data_dir=args.data_dir,
-        batch_size=batch_size,
-        num_workers=args.num_workers)
+    if args.fuse_bn:
+        fuse_for_inference(net)
 
     assert (args.use_pretrained or args.resume.strip())
     test(
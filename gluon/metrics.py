@@ -0,0 +1,86 @@
+import mxnet as mx
+
+
+class DeviceTopKAccuracy(mx.metric.EvalMetric):
+    """
+    Top-k accuracy with the counters of correct predictions kept on the devices (one NDArray per context). `update`
+    only enqueues asynchronous operations, so the engine is not blocked; the values are copied to the host only in
+    `get`.
+
+    Parameters:
+    ----------
+    top_k : int, default 1
+        Value of k.
+    name : str, default 'top_k_accuracy'
+        Name of the metric.
+    """
+    def __init__(self,
+                 top_k=1,
+                 name='top_k_accuracy',
+                 **kwargs):
+        self.top_k = top_k
+        super(DeviceTopKAccuracy, self).__init__(
+            name='{}_{}'.format(name, top_k) if top_k > 1 else name,
+            **kwargs)
+
+    def reset(self):
+        super(DeviceTopKAccuracy, self).reset()
+        self.correct = {}
+
+    def update(self, labels, preds):
+        for label, pred in zip(labels, preds):
+            label = label.astype('float32', copy=False).reshape((-1, 1))
+            if self.top_k == 1:
+                pred_inds = mx.nd.argmax(pred, axis=1).reshape((-1, 1))
+            else:
+                pred_inds = mx.nd.topk(pred, axis=1, k=self.top_k, ret_typ='indices')
+            hits = mx.nd.broadcast_equal(pred_inds.astype('float32', copy=False), label).sum()
+            if pred.context in self.correct:
+                self.correct[pred.context] += hits
+            else:
+                self.correct[pred.context] = hits
+            self.num_inst += label.shape[0]
+
+    def get(self):
+        if self.num_inst == 0:
+            return self.name, float('nan')
+        num_correct = sum([correct.asscalar() for correct in self.correct.values()])
+        return self.name, float(num_correct) / self.num_inst
+
+
+class DeviceMeanLoss(mx.metric.EvalMetric):
+    """
+    Mean of the loss values with the float32 sums kept on the devices (one NDArray per context). The values are copied
+    to the host only in `get`.
+
+    Parameters:
+    ----------
+    name : str, default 'loss'
+        Name of the metric.
+    """
+    def __init__(self,
+                 name='loss',
+                 **kwargs):
+        super(DeviceMeanLoss, self).__init__(
+            name=name,
+            **kwargs)
+
+    def reset(self):
+        super(DeviceMeanLoss, self).reset()
+        self.loss_sums = {}
+
+    def update(self, _, preds):
+        for loss in preds:
+            # Float16 losses are summed in float32, an epoch sum would overflow float16:
+            loss_sum = loss.astype('float32', copy=False).sum()
+            if loss.context in self.loss_sums:
+                self.loss_sums[loss.context] += loss_sum
+            else:
+                self.loss_sums[loss.context] = loss_sum
+            self.num_inst += loss.size
+
+    def get(self):
+        if self.num_inst == 0:
+            return self.name, float('nan')
+        loss_sum = sum([loss_sum.asscalar() for loss_sum in self.loss_sums.values()])
+        return self.name, float(loss_sum) / self.num_inst
@@ -0,0 +1,50 @@
+from mxnet.gluon import HybridBlock
+from mxnet.gluon.loss import Loss
+
+
+class MixUp(HybridBlock):
+    """
+    Mixup of a batch with the reversed one from 'mixup: Beyond Empirical Risk Minimization,'
+    https://arxiv.org/abs/1710.09412.
+    """
+    def __init__(self,
+                 **kwargs):
+        super(MixUp, self).__init__(**kwargs)
+
+    def hybrid_forward(self, F, x, lam):
+        # lam * x + (1 - lam) * x_rev = x_rev + lam * (x - x_rev):
+        x_rev = F.reverse(x, axis=0)
+        return x_rev + F.broadcast_mul(lam, x - x_rev)
+
+
+class MixUpSoftmaxCrossEntropyLoss(Loss):
+    """
+    Softmax cross-entropy loss for a batch mixed by `MixUp`. The loss is linear in the label, so the cross-entropy with
+    the soft label `lam * one_hot(y) + (1 - lam) * one_hot(y_rev)` is computed from the sparse labels without one-hot
+    matrices. For `lam` equal to 1 it is the usual sparse softmax cross-entropy.
+
+    Parameters:
+    ----------
+    axis : int, default -1
+        The axis to sum over when computing softmax and entropy.
+    weight : float or None
+        Global scalar weight for loss.
+    batch_axis : int, default 0
+        The axis that represents mini-batch.
+    """
+    def __init__(self,
+                 axis=-1,
+                 weight=None,
+                 batch_axis=0,
+                 **kwargs):
+        super(MixUpSoftmaxCrossEntropyLoss, self).__init__(weight, batch_axis, **kwargs)
+        self._axis = axis
+
+    def hybrid_forward(self, F, pred, label, lam):
+        pred = F.log_softmax(pred, axis=self._axis)
+        loss = -F.pick(pred, label, axis=self._axis)
+        loss_rev = -F.pick(pred, F.reverse(label, axis=0), axis=self._axis)
+        loss = loss_rev + F.broadcast_mul(lam, loss - loss_rev)
+        if self._weight is not None:
+            loss = loss * self._weight
+        return loss
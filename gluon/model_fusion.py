@@ -0,0 +1,139 @@
+"""
+    Inference-time fusion of model layers (folding of channel gathers and shuffles into weights).
+"""
+
+__all__ = ['Identity', 'fold_condense_dense', 'fold_channel_shuffle', 'fuse_for_inference']
+
+import logging
+import numpy as np
+import mxnet as mx
+from mxnet.gluon import nn, HybridBlock
+
+from .models.common import ChannelShuffle
+from .models.condensenet import CondenseDense
+from .models.menet import MEUnit
+from .models.shufflenet import ShuffleUnit
+
+
+class Identity(HybridBlock):
+    """
+    Identity layer (a replacement for the folded layers).
+    """
+    def __init__(self,
+                 **kwargs):
+        super(Identity, self).__init__(**kwargs)
+
+    def hybrid_forward(self, F, x):
+        return x
+
+
+def fold_condense_dense(block):
+    """
+    Fold the channel index of a CondenseNet dense block into the weights of a plain dense layer over all input units
+    (the gathered units, including the repeated ones, are accumulated into the weight columns).
+
+    Parameters:
+    ----------
+    block : CondenseDense
+        CondenseNet dense block.
+
+    Returns
+    -------
+    nn.Dense
+        Equivalent dense layer without the gather.
+    """
+    dense = block.dense
+    ctx = dense.weight.list_ctx()
+    dtype = dense.weight.dtype
+    index = block.index.data(ctx[0]).asnumpy().astype(np.int64)
+    weight = dense.weight.data(ctx[0]).asnumpy()
+    folded_weight = np.zeros((weight.shape[0], block.in_units), dtype=weight.dtype)
+    np.add.at(folded_weight.T, index, weight.T)
+
+    folded = nn.Dense(
+        units=weight.shape[0],
+        use_bias=(dense.bias is not None),
+        in_units=block.in_units,
+        prefix=block.prefix)
+    folded.initialize(ctx=ctx)
+    folded.cast(dtype)
+    folded.weight.set_data(mx.nd.array(folded_weight, dtype=dtype))
+    if dense.bias is not None:
+        folded.bias.set_data(dense.bias.data(ctx[0]))
+    return folded
+
+
+def fold_channel_shuffle(conv, bn, groups):
+    """
+    Fold a channel shuffle into the output channel order of the preceding non-grouped convolution and BatchNorm layer
+    (the shuffle is a fixed permutation, and the layers between them are channel-wise).
+
+    Parameters:
+    ----------
+    conv : nn.Conv2D
+        Convolution layer (without groups).
+    bn : nn.BatchNorm
+        BatchNorm layer.
+    groups : int
+        Number of groups in the channel shuffle.
+    """
+    assert (conv._kwargs['num_group'] == 1)
+    channels = conv._channels
+    index = np.arange(channels).reshape((groups, -1)).T.reshape(-1)
+    params = [conv.weight, conv.bias, bn.gamma, bn.beta, bn.running_mean, bn.running_var]
+    for param in params:
+        if param is None:
+            continue
+        data = param.data(param.list_ctx()[0])
+        param.set_data(mx.nd.take(data, mx.nd.array(index, ctx=data.context), axis=0))
+
+
+def _iter_blocks(block):
+    yield block
+    for child in list(block._children.values()):
+        for sub_block in _iter_blocks(child):
+            yield sub_block
+
+
+def _replace_child(block, name, new_child):
+    old_child = block._children[name]
+    block.register_child(new_child, name)
+    if getattr(block, name, None) is old_child:
+        # Block.__setattr__ forbids changing the type of a child attribute:
+        object.__setattr__(block, name, new_child)
+
+
+def fuse_for_inference(net):
+    """
+    Fold the channel index of the CondenseNet classifier into the dense weights, and the channel shuffles after
+    non-grouped convolutions (in the first ShuffleNet/MENet unit) into the convolution weights. The cached graphs of
+    the hybridized blocks are cleared, so the model is rebuilt on the next call.
+
+    Parameters:
+    ----------
+    net : HybridBlock
+        Model.
+
+    Returns
+    -------
+    tuple of 2 int
+        Numbers of the folded gathers and channel shuffles.
+    """
+    num_gathers = 0
+    num_shuffles = 0
+    for block in list(_iter_blocks(net)):
+        for name, child in list(block._children.items()):
+            if isinstance(child, CondenseDense):
+                _replace_child(block, name, fold_condense_dense(child))
+                num_gathers += 1
+        # A shuffle between two grouped convolutions mixes the groups, so it is folded only after a non-grouped one:
+        if isinstance(block, (ShuffleUnit, MEUnit)) and isinstance(block.c_shuffle, ChannelShuffle) and\
+                (block.compress_conv1._kwargs['num_group'] == 1):
+            fold_channel_shuffle(block.compress_conv1, block.compress_bn1, block.c_shuffle.groups)
+            _replace_child(block, 'c_shuffle', Identity(prefix=block.c_shuffle.prefix))
+            num_shuffles += 1
+    for block in _iter_blocks(net):
+        if isinstance(block, HybridBlock):
+            block._clear_cached_op()
+    logging.info('Folding: {} gathers, {} channel shuffles'.format(num_gathers, num_shuffles))
+    return num_gathers, num_shuffles
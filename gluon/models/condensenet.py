@@ -326,6 +326,7 @@ class CondenseDense(HybridBlock):
                  drop_rate=0.5,
                  **kwargs):
         super(CondenseDense, self).__init__(**kwargs)
+        self.in_units = in_units
         drop_in_units = int(in_units * drop_rate)
         with self.name_scope():
             self.dense = nn.Dense(
@@ -9,7 +9,7 @@ __all__ = ['ShuffleNetV2', 'shufflenetv2_wd2', 'shufflenetv2_w1', 'shufflenetv2_
 import os
 from mxnet import cpu
 from mxnet.gluon import nn, HybridBlock
-from .common import conv1x1, ChannelShuffle, SEBlock
+from .common import conv1x1, SEBlock
 
 
 class ShuffleConv(HybridBlock):
@@ -154,9 +154,6 @@ class ShuffleUnit(HybridBlock):
                 self.expand_bn5 = nn.BatchNorm(in_channels=mid_channels)
 
             self.activ = nn.Activation('relu')
-            self.c_shuffle = ChannelShuffle(
-                channels=mid_channels,
-                groups=2)
 
     def hybrid_forward(self, F, x):
         if self.downsample:
@@ -180,8 +177,9 @@ class ShuffleUnit(HybridBlock):
             y2 = self.se(y2)
         if self.use_residual and not self.downsample:
             y2 = y2 + x2
-        x = F.concat(y1, y2, dim=1)
-        x = self.c_shuffle(x)
+        # Concatenation with the channel shuffle for 2 groups (the paths are interleaved) as one copy:
+        x = F.stack(y1, y2, axis=2)
+        x = x.reshape((0, -3, -2))
         return x
 
 
@@ -6,8 +6,11 @@ import mxnet as mx
 from mxnet import gluon
 from mxnet.gluon.data.vision import transforms
 
-from gluoncv.data import imagenet
-
+from common.data_benchmark import TimedDataset
+from common.dataset_index import get_dataset_index
+from common.image_backends import ImageBackendDecoder, get_image_backend
+from common.image_decode import DraftResizeDecoder, DraftRandomResizedCropDecoder
+from common.val_cache import ValCache
 from .model_utils import get_model
 
 
@@ -82,9 +85,47 @@ def get_data_rec(rec_train,
     return train_data, val_data, batch_fn
 
 
+class IndexedImageFolderDataset(gluon.data.Dataset):
+    """
+    Dataset with the layout `root/class_x/xxx.jpg` (as gluoncv ImageNet), which reads the file list from the
+    persistent dataset index instead of walking the directory tree.
+
+    Parameters:
+    ----------
+    root : str
+        Dataset directory path.
+    flag : int, default 1
+        If 0, always convert loaded images to greyscale, 1 - to color.
+    loader : callable or None
+        Image decoder into PIL image or uint8 HWC array (instead of `mx.image.imread`).
+    """
+    def __init__(self,
+                 root,
+                 flag=1,
+                 loader=None):
+        self.index = get_dataset_index(root)
+        self.synsets = list(self.index.classes)
+        self._flag = flag
+        self._loader = loader
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, idx):
+        if self._loader is not None:
+            img = mx.nd.array(np.asarray(self._loader(self.index.get_path(idx))), dtype=np.uint8)
+        else:
+            img = mx.image.imread(self.index.get_path(idx), self._flag)
+        return img, self.index.get_class_id(idx)
+
+
 def get_data_loader(data_dir,
                     batch_size,
-                    num_workers):
+                    num_workers,
+                    jpeg_draft=False,
+                    image_backend='',
+                    train_worker_timer=None,
+                    val_worker_timer=None):
     normalize = transforms.Normalize(
         mean=(0.485, 0.456, 0.406),
         std=(0.229, 0.224, 0.225))
@@ -96,32 +137,66 @@ def get_data_loader(data_dir,
         label = gluon.utils.split_and_load(batch[1], ctx_list=ctx, batch_axis=0)
         return data, label
 
-    transform_train = transforms.Compose([
-        transforms.RandomResizedCrop(224),
-        transforms.RandomFlipLeftRight(),
-        transforms.RandomColorJitter(
-            brightness=jitter_param,
-            contrast=jitter_param,
-            saturation=jitter_param),
-        transforms.RandomLighting(lighting_param),
-        transforms.ToTensor(),
-        normalize
-    ])
-    transform_test = transforms.Compose([
-        transforms.Resize(256, keep_ratio=True),
-        transforms.CenterCrop(224),
-        transforms.ToTensor(),
-        normalize
-    ])
+    if image_backend:
+        if jpeg_draft:
+            raise ValueError('JPEG draft decoding is not supported with an image backend')
+        # Crop, flip, color jitter, resize are done by the image backend decoder:
+        backend = get_image_backend(image_backend)
+        train_decoder = ImageBackendDecoder(backend, train=True)
+        val_decoder = ImageBackendDecoder(backend, train=False)
+        transform_train = transforms.Compose([
+            transforms.RandomLighting(lighting_param),
+            transforms.ToTensor(),
+            normalize
+        ])
+        transform_test = transforms.Compose([
+            transforms.ToTensor(),
+            normalize
+        ])
+    else:
+        train_decoder = DraftRandomResizedCropDecoder(224) if jpeg_draft else None
+        val_decoder = DraftResizeDecoder(256) if jpeg_draft else None
+        # With the draft decoding the random resized crop is done by the decoder:
+        transform_train = transforms.Compose(([] if jpeg_draft else [transforms.RandomResizedCrop(224)]) + [
+            transforms.RandomFlipLeftRight(),
+            transforms.RandomColorJitter(
+                brightness=jitter_param,
+                contrast=jitter_param,
+                saturation=jitter_param),
+            transforms.RandomLighting(lighting_param),
+            transforms.ToTensor(),
+            normalize
+        ])
+        transform_test = transforms.Compose([
+            transforms.Resize(256, keep_ratio=True),
+            transforms.CenterCrop(224),
+            transforms.ToTensor(),
+            normalize
+        ])
+
+    train_dataset = IndexedImageFolderDataset(
+        root=os.path.join(data_dir, 'train'),
+        loader=train_decoder).transform_first(transform_train)
+    if train_worker_timer is not None:
+        train_dataset = TimedDataset(
+            dataset=train_dataset,
+            worker_timer=train_worker_timer)
+    val_dataset = IndexedImageFolderDataset(
+        root=os.path.join(data_dir, 'val'),
+        loader=val_decoder).transform_first(transform_test)
+    if val_worker_timer is not None:
+        val_dataset = TimedDataset(
+            dataset=val_dataset,
+            worker_timer=val_worker_timer)
 
     train_data = gluon.data.DataLoader(
-        imagenet.classification.ImageNet(data_dir, train=True).transform_first(transform_train),
+        train_dataset,
         batch_size=batch_size,
         shuffle=True,
         last_batch='discard',
         num_workers=num_workers)
     val_data = gluon.data.DataLoader(
-        imagenet.classification.ImageNet(data_dir, train=False).transform_first(transform_test),
+        val_dataset,
         batch_size=batch_size,
         shuffle=False,
         num_workers=num_workers)
@@ -129,6 +204,124 @@ def get_data_loader(data_dir,
     return train_data, val_data, batch_fn
 
 
+class ValCacheLoader(object):
+    """
+    Validation data loader over the memory-mapped cache of pre-decoded images.
+
+    Parameters:
+    ----------
+    val_cache : ValCache
+        Validation cache.
+    batch_size : int
+        Batch size.
+    mean : tuple of 3 float
+        Mean values for normalization.
+    std : tuple of 3 float
+        Standard deviation values for normalization.
+    """
+    def __init__(self,
+                 val_cache,
+                 batch_size,
+                 mean=(0.485, 0.456, 0.406),
+                 std=(0.229, 0.224, 0.225)):
+        self.val_cache = val_cache
+        self.batch_size = batch_size
+        self.mean = mx.nd.array(mean).reshape((1, 3, 1, 1)) * 255.0
+        self.std = mx.nd.array(std).reshape((1, 3, 1, 1)) * 255.0
+
+    def __len__(self):
+        return (len(self.val_cache) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        for images, labels in self.val_cache.iter_batches(self.batch_size):
+            data = mx.nd.array(images, dtype=np.float32)
+            data = mx.nd.broadcast_div(mx.nd.broadcast_sub(data, self.mean), self.std)
+            label = mx.nd.array(labels, dtype=np.float32)
+            yield data, label
+
+
+def get_val_cache_loader(data_dir,
+                         cache_dir,
+                         batch_size,
+                         num_workers):
+
+    def batch_fn(batch, ctx):
+        data = gluon.utils.split_and_load(batch[0], ctx_list=ctx, batch_axis=0)
+        label = gluon.utils.split_and_load(batch[1], ctx_list=ctx, batch_axis=0)
+        return data, label
+
+    val_cache = ValCache(
+        data_dir=data_dir,
+        cache_dir=cache_dir,
+        resize=256,
+        crop_size=224,
+        pipeline='mxnet',
+        num_workers=num_workers)
+    val_data = ValCacheLoader(
+        val_cache=val_cache,
+        batch_size=batch_size)
+    return val_data, batch_fn
+
+
+class SyntheticDataLoader(object):
+    """
+    Data loader, which yields the same preallocated random batch (for measuring the model throughput without the
+    data pipeline). The batch is allocated once and already split over the contexts, so nothing is allocated or copied
+    per batch.
+
+    Parameters:
+    ----------
+    batch_size : int
+        Batch size (for all contexts).
+    num_batches : int
+        Number of batches per epoch.
+    ctx : list of Context
+        MXNet contexts.
+    num_classes : int, default 1000
+        Number of classes.
+    in_shape : tuple of 3 int, default (3, 224, 224)
+        Shape of an input image.
+    """
+    def __init__(self,
+                 batch_size,
+                 num_batches,
+                 ctx,
+                 num_classes=1000,
+                 in_shape=(3, 224, 224)):
+        ctx_batch_size = batch_size // len(ctx)
+        self.num_batches = num_batches
+        self.data_list = [mx.nd.random.normal(shape=((ctx_batch_size,) + tuple(in_shape)), ctx=c) for c in ctx]
+        self.labels_list = [mx.nd.array(np.random.randint(0, num_classes, size=ctx_batch_size), ctx=c) for c in ctx]
+
+    def __len__(self):
+        return self.num_batches
+
+    def __iter__(self):
+        for _ in range(self.num_batches):
+            yield self.data_list, self.labels_list
+
+
+def get_synthetic_data(batch_size,
+                       num_batches,
+                       ctx,
+                       num_classes=1000):
+
+    def batch_fn(batch, ctx):
+        return batch
+
+    train_data = SyntheticDataLoader(
+        batch_size=batch_size,
+        num_batches=num_batches,
+        ctx=ctx,
+        num_classes=num_classes)
+    val_data = SyntheticDataLoader(
+        batch_size=batch_size,
+        num_batches=num_batches,
+        ctx=ctx,
+        num_classes=num_classes)
+    return train_data, val_data, batch_fn
+
+
 def prepare_model(model_name,
                   classes,
                   use_pretrained,
@@ -0,0 +1,271 @@
+"""
+    Inference-time fusion of model layers (folding of BatchNorm into convolutions and of channel gathers and shuffles
+    into weights).
+"""
+
+__all__ = ['Identity', 'fold_batch_norm', 'fold_condense_linear', 'fold_channel_shuffle', 'fuse_for_inference']
+
+import logging
+import torch
+import torch.nn as nn
+
+from .models.common import ChannelShuffle
+from .models.condensenet import CondenseLinear, CondenseUnit
+from .models.darknet import DarkConv
+from .models.densenet import DenseInitBlock, DenseUnit
+from .models.dpn import DPNInitBlock, DPNUnit
+from .models.menet import MEUnit, MEInitBlock
+from .models.mobilenet import ConvBlock
+from .models.mobilenetv2 import MobnetConv
+from .models.nasnet import NasConv, NasDwsConv, NasPathBlock, NASNetInitBlock
+from .models.preresnet import PreResInitBlock, PreResBlock, PreResBottleneck
+from .models.resnet import ResConv
+from .models.resnext import ResNeXtConv
+from .models.shufflenet import ShuffleUnit, ShuffleInitBlock
+from .models.shufflenetv2 import ShuffleConv, ShuffleUnit as ShuffleUnitV2
+from .models.squeezenext import SqnxtConv
+
+
+# Blocks with BatchNorm layers, which directly follow convolution(s) in the forward pass (up to channel concatenation,
+# spatial cropping or a channel shuffle): (convolution names, BatchNorm name[, channel shuffle name]) for each such
+# BatchNorm. These are the post-activation BatchNorm layers and the pre-activation ones inside residual/dense units
+# (BN-ReLU-Conv after the previous convolution of the unit). Pre-activation BatchNorm layers at the unit inputs follow
+# an addition or a concatenation with the identity path and stay unfolded. Missing layers (e.g. in the B-case DPN) are
+# skipped. The BatchNorm layers, which directly follow convolutions in plain nn.Sequential containers, are also folded.
+_FUSIBLE_BLOCKS = {
+    ResConv: ((('conv',), 'bn'),),
+    ResNeXtConv: ((('conv',), 'bn'),),
+    PreResInitBlock: ((('conv',), 'bn'),),
+    PreResBlock: ((('conv1.conv',), 'conv2.bn'),),
+    PreResBottleneck: (
+        (('conv1.conv',), 'conv2.bn'),
+        (('conv2.conv',), 'conv3.bn')),
+    DenseUnit: ((('conv1.conv',), 'conv2.bn'),),
+    DPNUnit: (
+        (('conv1.conv',), 'conv2.bn'),
+        (('conv2.conv',), 'conv3.bn'),
+        (('conv2.conv',), 'preactiv.bn')),
+    CondenseUnit: ((('conv1.conv',), 'conv2.bn', 'conv1.c_shuffle'),),
+    DenseInitBlock: ((('conv',), 'bn'),),
+    DPNInitBlock: ((('conv',), 'bn'),),
+    DarkConv: ((('conv',), 'bn'),),
+    ConvBlock: ((('conv',), 'bn'),),
+    MobnetConv: ((('conv',), 'bn'),),
+    SqnxtConv: ((('conv',), 'bn'),),
+    ShuffleConv: ((('conv',), 'bn'),),
+    ShuffleInitBlock: ((('conv',), 'bn'),),
+    MEInitBlock: ((('conv',), 'bn'),),
+    ShuffleUnit: (
+        (('compress_conv1',), 'compress_bn1'),
+        (('dw_conv2',), 'dw_bn2'),
+        (('expand_conv3',), 'expand_bn3')),
+    ShuffleUnitV2: (
+        (('compress_conv1',), 'compress_bn1'),
+        (('dw_conv2',), 'dw_bn2'),
+        (('expand_conv3',), 'expand_bn3'),
+        (('dw_conv4',), 'dw_bn4'),
+        (('expand_conv5',), 'expand_bn5')),
+    MEUnit: (
+        (('compress_conv1',), 'compress_bn1'),
+        (('dw_conv2',), 'dw_bn2'),
+        (('expand_conv3',), 'expand_bn3'),
+        (('s_merge_conv',), 's_merge_bn'),
+        (('s_conv',), 's_conv_bn'),
+        (('s_evolve_conv',), 's_evolve_bn')),
+    NasConv: ((('conv',), 'bn'),),
+    NasDwsConv: ((('conv.pw_conv',), 'bn'),),
+    NasPathBlock: ((('path1.conv', 'path2.conv'), 'bn'),),
+    NASNetInitBlock: ((('conv',), 'bn'),),
+}
+
+
+class Identity(nn.Module):
+    """
+    Identity layer (a replacement for the folded layers).
+    """
+    def __init__(self):
+        super(Identity, self).__init__()
+
+    def forward(self, x):
+        return x
+
+
+def get_sub_module(module, name):
+    for attr in name.split('.'):
+        module = getattr(module, attr, None)
+    return module
+
+
+def set_sub_module(module, name, sub_module):
+    parent_name, _, attr = name.rpartition('.')
+    if parent_name:
+        module = get_sub_module(module, parent_name)
+    setattr(module, attr, sub_module)
+
+
+def unshuffle_batch_norm(bn, groups):
+    """
+    Reorder the channels of a BatchNorm layer, which follows a channel shuffle, so that it can be applied before the
+    shuffle.
+
+    Parameters:
+    ----------
+    bn : nn.BatchNorm2d
+        BatchNorm layer.
+    groups : int
+        Number of groups in the channel shuffle.
+    """
+    channels = bn.num_features
+    index = torch.arange(channels, device=bn.running_mean.device).view(groups, -1).t().reshape(-1)
+    inv_index = torch.sort(index)[1]
+    with torch.no_grad():
+        for tensor in (bn.running_mean, bn.running_var, bn.weight, bn.bias):
+            if tensor is not None:
+                tensor.copy_(tensor[inv_index])
+
+
+def fold_batch_norm(convs, bn):
+    """
+    Fold an inference BatchNorm layer into the preceding convolution(s). For several convolutions the output channels
+    of them are concatenated before the BatchNorm.
+
+    Parameters:
+    ----------
+    convs : list of nn.Conv2d
+        Convolution layers.
+    bn : nn.BatchNorm2d
+        BatchNorm layer.
+    """
+    with torch.no_grad():
+        scale = 1.0 / torch.sqrt(bn.running_var + bn.eps)
+        shift = -bn.running_mean * scale
+        if bn.affine:
+            scale = scale * bn.weight
+            shift = shift * bn.weight + bn.bias
+        assert (sum([conv.out_channels for conv in convs]) == scale.size(0))
+
+        start = 0
+        for conv in convs:
+            end = start + conv.out_channels
+            conv_scale = scale[start:end]
+            conv_shift = shift[start:end]
+            if conv.bias is not None:
+                conv_shift = conv_shift + conv.bias * conv_scale
+            conv.weight.mul_(conv_scale.view(-1, 1, 1, 1))
+            conv.bias = nn.Parameter(conv_shift.clone())
+            start = end
+
+
+def fold_condense_linear(block):
+    """
+    Fold the channel index of a CondenseNet linear block into the weights of a plain linear layer over all input
+    features (the gathered features, including the repeated ones, are accumulated into the weight columns).
+
+    Parameters:
+    ----------
+    block : CondenseLinear
+        CondenseNet linear block.
+
+    Returns
+    -------
+    nn.Linear
+        Equivalent linear layer without the gather.
+    """
+    linear = block.linear
+    folded = nn.Linear(
+        in_features=block.in_features,
+        out_features=linear.out_features,
+        bias=(linear.bias is not None))
+    folded = folded.to(device=linear.weight.device, dtype=linear.weight.dtype)
+    with torch.no_grad():
+        folded.weight.zero_()
+        folded.weight.index_add_(1, block.index, linear.weight)
+        if linear.bias is not None:
+            folded.bias.copy_(linear.bias)
+    return folded
+
+
+def fold_channel_shuffle(conv, bn, groups):
+    """
+    Fold a channel shuffle into the output channel order of the preceding non-grouped convolution and BatchNorm layer
+    (the shuffle is a fixed permutation, and the layers between them are channel-wise).
+
+    Parameters:
+    ----------
+    conv : nn.Conv2d
+        Convolution layer (without groups).
+    bn : nn.BatchNorm2d or None
+        BatchNorm layer (None if it is already folded).
+    groups : int
+        Number of groups in the channel shuffle.
+    """
+    assert (conv.groups == 1)
+    channels = conv.out_channels
+    index = torch.arange(channels, device=conv.weight.device).view(groups, -1).t().reshape(-1)
+    with torch.no_grad():
+        conv.weight.copy_(conv.weight[index])
+        if conv.bias is not None:
+            conv.bias.copy_(conv.bias[index])
+        if bn is not None:
+            for tensor in (bn.running_mean, bn.running_var, bn.weight, bn.bias):
+                if tensor is not None:
+                    tensor.copy_(tensor[index])
+
+
+def fuse_for_inference(net):
+    """
+    Fold all BatchNorm layers of a model, which directly follow convolutions, into these convolutions (the model is
+    switched to the evaluation mode). The folded BatchNorm layers are replaced by identities. The channel index of the
+    CondenseNet classifier is folded into the linear weights, and the channel shuffles after non-grouped convolutions
+    (in the first ShuffleNet/MENet unit) into the convolution weights.
+
+    Parameters:
+    ----------
+    net : nn.Module
+        Model.
+
+    Returns
+    -------
+    tuple of 2 int
+        Numbers of the folded and the remaining BatchNorm layers.
+    """
+    net.eval()
+    num_folded = 0
+    for module in list(net.modules()):
+        for fusible_layers in _FUSIBLE_BLOCKS.get(type(module), ()):
+            conv_names, bn_name = fusible_layers[:2]
+            bn = get_sub_module(module, bn_name)
+            if not isinstance(bn, nn.BatchNorm2d):
+                continue
+            if len(fusible_layers) > 2:
+                unshuffle_batch_norm(bn, get_sub_module(module, fusible_layers[2]).groups)
+            convs = [get_sub_module(module, conv_name) for conv_name in conv_names]
+            fold_batch_norm(convs, bn)
+            set_sub_module(module, bn_name, Identity())
+            num_folded += 1
+    for module in list(net.modules()):
+        if not isinstance(module, nn.Sequential):
+            continue
+        children = list(module.named_children())
+        for (_, conv), (bn_name, bn) in zip(children[:-1], children[1:]):
+            if isinstance(conv, nn.Conv2d) and isinstance(bn, nn.BatchNorm2d):
+                fold_batch_norm([conv], bn)
+                setattr(module, bn_name, Identity())
+                num_folded += 1
+    for module in list(net.modules()):
+        for name, child in list(module.named_children()):
+            if isinstance(child, CondenseLinear):
+                setattr(module, name, fold_condense_linear(child))
+    # A shuffle between two grouped convolutions mixes the groups, so it is folded only after a non-grouped one:
+    num_shuffles = 0
+    for module in list(net.modules()):
+        if isinstance(module, (ShuffleUnit, MEUnit)) and isinstance(module.c_shuffle, ChannelShuffle) and\
+                (module.compress_conv1.groups == 1):
+            bn = module.compress_bn1 if isinstance(module.compress_bn1, nn.BatchNorm2d) else None
+            fold_channel_shuffle(module.compress_conv1, bn, module.c_shuffle.groups)
+            module.c_shuffle = Identity()
+            num_shuffles += 1
+    num_remaining = len([m for m in net.modules() if isinstance(m, nn.BatchNorm2d)])
+    logging.info('BatchNorm folding: {} layers folded, {} left, {} channel shuffles folded'.format(
+        num_folded, num_remaining, num_shuffles))
+    return num_folded, num_remaining
@@ -289,6 +289,7 @@ class CondenseLinear(nn.Module):
                  out_features,
                  drop_rate=0.5):
         super(CondenseLinear, self).__init__()
+        self.in_features = in_features
         drop_in_features = int(in_features * drop_rate)
         self.linear = nn.Linear(
             in_features=drop_in_features,
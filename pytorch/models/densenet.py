@@ -9,6 +9,16 @@ import os
 import torch
 import torch.nn as nn
 import torch.nn.init as init
+from torch.utils.checkpoint import checkpoint
+
+
+def reentrant_checkpoint(function, *args):
+    # The bottleneck recomputation relies on the reentrant checkpoint (the function runs without autograd in forward),
+    # old versions have only this one and no `use_reentrant` parameter:
+    try:
+        return checkpoint(function, *args, use_reentrant=True)
+    except TypeError:
+        return checkpoint(function, *args)
 
 
 class DenseConv(nn.Module):
@@ -114,6 +124,7 @@ class DenseUnit(nn.Module):
         bn_size = 4
         inc_channels = out_channels - in_channels
         mid_channels = inc_channels * bn_size
+        self.inc_channels = inc_channels
 
         self.conv1 = dense_conv1x1(
             in_channels=in_channels,
@@ -133,6 +144,47 @@ class DenseUnit(nn.Module):
         x = torch.cat((identity, x), dim=1)
         return x
 
+    def forward_buffer(self, x, features):
+        """
+        Memory-efficient forward pass, which returns only the new channels.
+
+        Parameters:
+        ----------
+        x : Tensor
+            View of the stage feature buffer with all the input channels.
+        features : list of Tensor
+            Stage input and outputs of the previous units (the same channels, used to recompute the bottleneck with
+            autograd). Can be empty if the gradients are not required.
+        """
+        if torch.is_grad_enabled() and features:
+            x = reentrant_checkpoint(self._bottleneck(x), *features)
+        else:
+            x = self.conv1(x)
+        x = self.conv2(x)
+        if self.use_dropout:
+            x = self.dropout(x)
+        return x
+
+    def _bottleneck(self, buffer):
+        def bottleneck(*features):
+            if not torch.is_grad_enabled():
+                # Forward pass of the checkpoint, the concatenation is already in the buffer:
+                return self.conv1(buffer)
+            # Recomputation during backward, the running statistics are not updated for the second time:
+            bn = self.conv1.bn
+            momentum = bn.momentum
+            num_batches_tracked = getattr(bn, 'num_batches_tracked', None)
+            if num_batches_tracked is not None:
+                num_batches_tracked = num_batches_tracked.clone()
+            bn.momentum = 0.0
+            try:
+                return self.conv1(torch.cat(features, dim=1))
+            finally:
+                bn.momentum = momentum
+                if num_batches_tracked is not None:
+                    bn.num_batches_tracked.copy_(num_batches_tracked)
+        return bottleneck
+
 
 class TransitionBlock(nn.Module):
     """
@@ -222,6 +274,51 @@ class PostActivation(nn.Module):
         return x
 
 
+class DenseStage(nn.Sequential):
+    """
+    DenseNet stage (an optional transition block followed by the units). In the memory-efficient mode the units write
+    their new channels into one preallocated feature buffer of the stage instead of concatenating all the features in
+    each unit, and the bottleneck BN-ReLU-conv1x1 blocks are recomputed during backward instead of being stored.
+
+    Parameters:
+    ----------
+    memory_efficient : bool, default False
+        Whether to use the memory-efficient mode.
+    """
+    def __init__(self,
+                 memory_efficient=False):
+        super(DenseStage, self).__init__()
+        self.memory_efficient = memory_efficient
+
+    def forward(self, x):
+        if not self.memory_efficient:
+            return super(DenseStage, self).forward(x)
+        units = []
+        for module in self._modules.values():
+            if isinstance(module, DenseUnit):
+                units.append(module)
+            else:
+                x = module(x)
+
+        in_channels = x.size(1)
+        out_channels = in_channels + sum([unit.inc_channels for unit in units])
+        buffer = x.new_empty((x.size(0), out_channels) + x.size()[2:])
+        with torch.no_grad():
+            buffer[:, :in_channels].copy_(x)
+        features = [x] if torch.is_grad_enabled() else []
+        for unit in units:
+            y = unit.forward_buffer(buffer[:, :in_channels], features)
+            with torch.no_grad():
+                buffer[:, in_channels:(in_channels + unit.inc_channels)].copy_(y)
+            in_channels += unit.inc_channels
+            if features:
+                features.append(y)
+        if features:
+            # The buffer is not a part of the autograd graph:
+            return torch.cat(features, dim=1)
+        return buffer
+
+
 class DenseNet(nn.Module):
     """
     DenseNet model from 'Densely Connected Convolutional Networks,' https://arxiv.org/abs/1608.06993.
@@ -234,6 +331,8 @@ class DenseNet(nn.Module):
         Number of output channels for the initial unit.
     dropout_rate : float, default 0.0
         Parameter of Dropout layer. Faction of the input units to drop.
+    memory_efficient : bool, default False
+        Whether to use the memory-efficient stages (shared feature buffers and recomputed bottlenecks).
     in_channels : int, default 3
         Number of input channels.
     num_classes : int, default 1000
@@ -243,6 +342,7 @@ class DenseNet(nn.Module):
                  channels,
                  init_block_channels,
                  dropout_rate=0.0,
+                 memory_efficient=False,
                  in_channels=3,
                  num_classes=1000):
         super(DenseNet, self).__init__()
@@ -253,7 +353,7 @@ class DenseNet(nn.Module):
             out_channels=init_block_channels))
         in_channels = init_block_channels
         for i, channels_per_stage in enumerate(channels):
-            stage = nn.Sequential()
+            stage = DenseStage(memory_efficient=memory_efficient)
             if i != 0:
                 stage.add_module("trans{}".format(i + 1), TransitionBlock(
                     in_channels=in_channels,
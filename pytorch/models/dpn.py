@@ -199,6 +199,7 @@ class DPNUnit(nn.Module):
                  b_case=False):
         super(DPNUnit, self).__init__()
         self.bw = bw
+        self.inc = inc
         self.has_proj = has_proj
         self.b_case = b_case
 
@@ -254,6 +255,48 @@ class DPNUnit(nn.Module):
         dense = torch.cat((x_s2, y2), dim=1)
         return residual, dense
 
+    def forward_buffer(self, x, in_channels, buffer_channels):
+        """
+        Memory-efficient forward pass (without autograd) over the stage buffer, which keeps the residual path in the
+        first `bw` channels and the dense path in the following ones. The input of the convolutions is a view of the
+        buffer, the residual path is updated in place and the new dense channels are written after the filled ones.
+
+        Parameters:
+        ----------
+        x : Tensor
+            Stage buffer (or the concatenated stage input for the projection unit).
+        in_channels : int
+            Number of the filled channels of `x`.
+        buffer_channels : int
+            Number of channels of the stage buffer (used by the projection unit to allocate it).
+
+        Returns
+        -------
+        tuple of Tensor and int
+            Stage buffer and the number of the filled channels.
+        """
+        x_in = x[:, :in_channels]
+        if self.has_proj:
+            x_s = self.conv_proj(x_in)
+            buffer = x_s.new_empty((x_s.size(0), buffer_channels) + x_s.size()[2:])
+            in_channels = x_s.size(1)
+            buffer[:, :in_channels] = x_s
+        else:
+            buffer = x
+        x_in = self.conv1(x_in)
+        x_in = self.conv2(x_in)
+        if self.b_case:
+            x_in = self.preactiv(x_in)
+            y1 = self.conv3a(x_in)
+            y2 = self.conv3b(x_in)
+        else:
+            x_in = self.conv3(x_in)
+            y1 = x_in[:, :self.bw, :, :]
+            y2 = x_in[:, self.bw:, :, :]
+        buffer[:, :self.bw] += y1
+        buffer[:, in_channels:(in_channels + self.inc)] = y2
+        return buffer, in_channels + self.inc
+
 
 class DPNInitBlock(nn.Module):
     """
@@ -313,12 +356,40 @@ class DPNFinalBlock(nn.Module):
         self.activ = PreActivation(channels=channels)
 
     def forward(self, x1, x2):
-        assert (x2 is not None)
-        x = torch.cat((x1, x2), dim=1)
+        x = torch.cat((x1, x2), dim=1) if x2 is not None else x1
         x = self.activ(x)
         return x, None
 
 
+class DPNStage(DualPathSequential):
+    """
+    DPN stage. In the memory-efficient mode (used only without autograd) the units keep the residual and dense paths in
+    one preallocated buffer of the stage, which is updated in place, instead of concatenating them in each unit. The
+    stage then returns the whole buffer (the concatenated paths) as the first output and None as the second one.
+
+    Parameters:
+    ----------
+    memory_efficient : bool, default False
+        Whether to use the memory-efficient mode.
+    """
+    def __init__(self,
+                 memory_efficient=False):
+        super(DPNStage, self).__init__()
+        self.memory_efficient = memory_efficient
+
+    def forward(self, x1, x2=None):
+        if not self.memory_efficient or torch.is_grad_enabled():
+            return super(DPNStage, self).forward(x1, x2)
+        units = list(self._modules.values())
+        assert units[0].has_proj
+        buffer_channels = units[0].bw + (len(units) + 2) * units[0].inc
+        x = torch.cat((x1, x2), dim=1) if x2 is not None else x1
+        in_channels = x.size(1)
+        for unit in units:
+            x, in_channels = unit.forward_buffer(x, in_channels, buffer_channels)
+        return x, None
+
+
 class DPN(nn.Module):
     """
     DPN model from 'Dual Path Networks,' https://arxiv.org/abs/1707.01629.
@@ -347,6 +418,8 @@ class DPN(nn.Module):
         Whether to use model for training.
     test_time_pool : bool
         Whether to use the avg-max pooling in the inference mode.
+    memory_efficient : bool, default False
+        Whether to keep the dual paths in preallocated stage buffers during inference.
     in_channels : int, default 3
         Number of input channels.
     num_classes : int, default 1000
@@ -364,6 +437,7 @@ class DPN(nn.Module):
                  b_case,
                  for_training,
                  test_time_pool,
+                 memory_efficient=False,
                  in_channels=3,
                  num_classes=1000):
         super(DPN, self).__init__()
@@ -379,7 +453,7 @@ class DPN(nn.Module):
             padding=init_block_padding))
         in_channels = init_block_channels
         for i, channels_per_stage in enumerate(channels):
-            stage = DualPathSequential()
+            stage = DPNStage(memory_efficient=memory_efficient)
             r = rs[i]
             bw = bws[i]
             inc = incs[i]
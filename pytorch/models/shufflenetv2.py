@@ -10,7 +10,7 @@ import os
 import torch
 import torch.nn as nn
 import torch.nn.init as init
-from .common import conv1x1, ChannelShuffle, SEBlock
+from .common import conv1x1, SEBlock
 
 
 class ShuffleConv(nn.Module):
@@ -152,9 +152,6 @@ class ShuffleUnit(nn.Module):
             self.expand_bn5 = nn.BatchNorm2d(num_features=mid_channels)
 
         self.activ = nn.ReLU(inplace=True)
-        self.c_shuffle = ChannelShuffle(
-            channels=out_channels,
-            groups=2)
 
     def forward(self, x):
         if self.downsample:
@@ -178,8 +175,9 @@ class ShuffleUnit(nn.Module):
             y2 = self.se(y2)
         if self.use_residual and not self.downsample:
             y2 = y2 + x2
-        x = torch.cat((y1, y2), dim=1)
-        x = self.c_shuffle(x)
+        # Concatenation with the channel shuffle for 2 groups (the paths are interleaved) as one copy:
+        x = torch.stack((y1, y2), dim=2)
+        x = x.view(x.size(0), -1, x.size(3), x.size(4))
         return x
 
 
@@ -1,11 +1,24 @@
+import io
 import logging
 import os
+import threading
 import numpy as np
+from PIL import Image
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 import torch.utils.data
 import torchvision.transforms as transforms
 import torchvision.datasets as datasets
 
+from common.data_benchmark import TimedDataset
+from common.dataset_index import get_dataset_index
+from common.image_backends import ImageBackendDecoder, get_image_backend
+from common.image_decode import DraftResizeDecoder, DraftRandomResizedCropDecoder
+from common.recordio import IndexedRecordReader, unpack_img_record
+from common.val_cache import ValCache
 from .model_utils import get_model
 
 
@@ -16,49 +29,529 @@ def prepare_pt_context(num_gpus,
     return use_cuda, batch_size
 
 
-def get_data_loader(data_dir,
-                    batch_size,
-                    num_workers):
-    normalize = transforms.Normalize(
-        mean=[0.485, 0.456, 0.406],
-        std=[0.229, 0.224, 0.225])
+def uint8_array(img):
+    """
+    Convert a PIL image into uint8 array with HWC layout (a lightweight replacement of `ToTensor` for uint8 batch
+    transport).
+
+    Parameters:
+    ----------
+    img : PIL.Image
+        Input image.
+
+    Returns
+    -------
+    np.array
+        Resulted array.
+    """
+    return np.asarray(img, dtype=np.uint8)
+
+
+def get_train_transform(uint8_transport=False,
+                        jpeg_draft=False,
+                        image_backend=''):
     jitter_param = 0.4
+    if image_backend:
+        # The whole augmentation pipeline is done by the image backend decoder:
+        transform_list = []
+    else:
+        # With the draft decoding the random resized crop is done by the decoder:
+        transform_list = [] if jpeg_draft else [transforms.RandomResizedCrop(224)]
+        transform_list += [
+            transforms.RandomHorizontalFlip(),
+            transforms.ColorJitter(
+                brightness=jitter_param,
+                contrast=jitter_param,
+                saturation=jitter_param),
+        ]
+    if uint8_transport:
+        transform_list.append(uint8_array)
+    else:
+        transform_list += [
+            transforms.ToTensor(),
+            transforms.Normalize(
+                mean=[0.485, 0.456, 0.406],
+                std=[0.229, 0.224, 0.225]),
+        ]
+    return transforms.Compose(transform_list)
+
+
+def get_val_transform(uint8_transport=False,
+                      image_backend=''):
+    transform_list = [] if image_backend else [
+        transforms.Resize(256),
+        transforms.CenterCrop(224),
+    ]
+    if uint8_transport:
+        transform_list.append(uint8_array)
+    else:
+        transform_list += [
+            transforms.ToTensor(),
+            transforms.Normalize(
+                mean=[0.485, 0.456, 0.406],
+                std=[0.229, 0.224, 0.225]),
+        ]
+    return transforms.Compose(transform_list)
+
+
+def get_train_decoder(jpeg_draft=False,
+                      image_backend=''):
+    if image_backend:
+        if jpeg_draft:
+            raise ValueError('JPEG draft decoding is not supported with an image backend')
+        return ImageBackendDecoder(get_image_backend(image_backend), train=True)
+    return DraftRandomResizedCropDecoder(224) if jpeg_draft else None
+
+
+def get_val_decoder(jpeg_draft=False,
+                    image_backend=''):
+    if image_backend:
+        if jpeg_draft:
+            raise ValueError('JPEG draft decoding is not supported with an image backend')
+        return ImageBackendDecoder(get_image_backend(image_backend), train=False)
+    return DraftResizeDecoder(256) if jpeg_draft else None
+
+
+def uint8_collate(batch):
+    """
+    Collate uint8 HWC images into one contiguous uint8 NHWC tensor.
+
+    Parameters:
+    ----------
+    batch : list of tuple of (np.array, int)
+        Samples.
+
+    Returns
+    -------
+    tuple of two Tensor
+        Images and targets.
+    """
+    img0 = batch[0][0]
+    data = torch.empty((len(batch),) + img0.shape, dtype=torch.uint8)
+    data_np = data.numpy()
+    for i, (img, _) in enumerate(batch):
+        data_np[i] = img
+    target = torch.tensor([t for _, t in batch], dtype=torch.int64)
+    return data, target
+
+
+class UInt8BatchLoader(object):
+    """
+    Wrapper over a data loader with uint8 NHWC batches, which converts each batch into normalized float NCHW by one
+    vectorized operation (on GPU, if it is used).
+
+    Parameters:
+    ----------
+    loader : DataLoader
+        Data loader with `uint8_collate`.
+    use_cuda : bool
+        Whether to convert batches on GPU.
+    mean : tuple of 3 float
+        Mean values for normalization.
+    std : tuple of 3 float
+        Standard deviation values for normalization.
+    """
+    def __init__(self,
+                 loader,
+                 use_cuda,
+                 mean=(0.485, 0.456, 0.406),
+                 std=(0.229, 0.224, 0.225)):
+        self.loader = loader
+        self.use_cuda = use_cuda
+        self.mean = torch.tensor(mean).mul_(255.0).view(1, 3, 1, 1)
+        self.std = torch.tensor(std).mul_(255.0).view(1, 3, 1, 1)
+        if use_cuda:
+            self.mean = self.mean.cuda()
+            self.std = self.std.cuda()
+
+    def __len__(self):
+        return len(self.loader)
+
+    def __iter__(self):
+        for data, target in self.loader:
+            if self.use_cuda:
+                data = data.cuda(non_blocking=True)
+                target = target.cuda(non_blocking=True)
+            data = data.permute(0, 3, 1, 2).float().sub_(self.mean).div_(self.std)
+            yield data, target
+
+
+class IndexedImageFolder(torch.utils.data.Dataset):
+    """
+    Dataset with the layout `root/class_x/xxx.jpg` (the same as ImageFolder), which reads the file list from the
+    persistent dataset index instead of walking the directory tree.
+
+    Parameters:
+    ----------
+    root : str
+        Dataset directory path.
+    transform : callable or None
+        Transformation for PIL images.
+    loader : callable or None
+        Image decoder (PIL loader by default).
+    """
+    def __init__(self,
+                 root,
+                 transform=None,
+                 loader=None):
+        self.index = get_dataset_index(root)
+        self.classes = list(self.index.classes)
+        self.transform = transform
+        self.loader = loader if loader is not None else datasets.folder.default_loader
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, index):
+        img = self.loader(self.index.get_path(index))
+        if self.transform is not None:
+            img = self.transform(img)
+        return img, self.index.get_class_id(index)
+
+
+def create_data_loader(dataset,
+                       batch_size,
+                       shuffle,
+                       num_workers,
+                       uint8_transport=False,
+                       use_cuda=False,
+                       worker_timer=None):
+    if worker_timer is not None:
+        dataset = TimedDataset(
+            dataset=dataset,
+            worker_timer=worker_timer)
+    loader_kwargs = {
+        'dataset': dataset,
+        'batch_size': batch_size,
+        'shuffle': shuffle,
+        'num_workers': num_workers,
+        'pin_memory': True,
+        'collate_fn': (uint8_collate if uint8_transport else torch.utils.data.dataloader.default_collate)}
+    if num_workers > 0:
+        # Keep the worker processes alive between epochs (and phases) instead of re-forking them for each pass:
+        loader_kwargs['persistent_workers'] = True
+    try:
+        loader = torch.utils.data.DataLoader(**loader_kwargs)
+    except TypeError:
+        logging.warning('Persistent data loader workers are not supported by this PyTorch version')
+        loader_kwargs.pop('persistent_workers', None)
+        loader = torch.utils.data.DataLoader(**loader_kwargs)
+    if uint8_transport:
+        loader = UInt8BatchLoader(
+            loader=loader,
+            use_cuda=use_cuda)
+    return loader
+
+
+class DataPrefetcher(object):
+    """
+    Wrapper over a data loader, which prepares the next batches in a background thread while the current step runs.
+    Batches are pinned and copied to GPU (with the loader-side conversion) on a separate CUDA stream.
+
+    Parameters:
+    ----------
+    loader : iterable
+        Data loader.
+    use_cuda : bool
+        Whether to copy batches to GPU.
+    depth : int, default 2
+        Number of batches to prepare in advance.
+    """
+    def __init__(self,
+                 loader,
+                 use_cuda,
+                 depth=2):
+        assert (depth > 0)
+        self.loader = loader
+        self.use_cuda = use_cuda
+        self.depth = depth
+
+    def __len__(self):
+        return len(self.loader)
+
+    @staticmethod
+    def _put(batch_queue, stop_event, item):
+        # The consumer can stop early with a full queue, so blocking puts would never return:
+        while not stop_event.is_set():
+            try:
+                batch_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _prefetch(self, batch_queue, stop_event):
+        stream = torch.cuda.Stream() if self.use_cuda else None
+        try:
+            with torch.cuda.stream(stream):
+                for data, target in self.loader:
+                    event = None
+                    if self.use_cuda:
+                        if not data.is_cuda:
+                            data = data.pin_memory().cuda(non_blocking=True)
+                        if not target.is_cuda:
+                            target = target.pin_memory().cuda(non_blocking=True)
+                        event = torch.cuda.Event()
+                        event.record(stream)
+                    if not self._put(batch_queue, stop_event, (data, target, event)):
+                        return
+        except Exception as e:
+            self._put(batch_queue, stop_event, e)
+            return
+        self._put(batch_queue, stop_event, None)
+
+    def __iter__(self):
+        batch_queue = queue.Queue(maxsize=self.depth)
+        stop_event = threading.Event()
+        thread = threading.Thread(
+            target=self._prefetch,
+            args=(batch_queue, stop_event))
+        thread.daemon = True
+        thread.start()
+        try:
+            while True:
+                item = batch_queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                data, target, event = item
+                if event is not None:
+                    current_stream = torch.cuda.current_stream()
+                    current_stream.wait_event(event)
+                    data.record_stream(current_stream)
+                    target.record_stream(current_stream)
+                yield data, target
+        finally:
+            stop_event.set()
+            thread.join()
 
-    train_loader = torch.utils.data.DataLoader(
-        dataset=datasets.ImageFolder(
+
+def get_data_loader(data_dir,
+                    batch_size,
+                    num_workers,
+                    uint8_transport=False,
+                    jpeg_draft=False,
+                    image_backend='',
+                    use_cuda=False,
+                    train_worker_timer=None,
+                    val_worker_timer=None):
+    train_loader = create_data_loader(
+        dataset=IndexedImageFolder(
             root=os.path.join(data_dir, 'train'),
-            transform=transforms.Compose([
-                transforms.RandomResizedCrop(224),
-                transforms.RandomHorizontalFlip(),
-                transforms.ColorJitter(
-                    brightness=jitter_param,
-                    contrast=jitter_param,
-                    saturation=jitter_param),
-                transforms.ToTensor(),
-                normalize,
-            ])),
+            transform=get_train_transform(uint8_transport, jpeg_draft, image_backend),
+            loader=get_train_decoder(jpeg_draft, image_backend)),
         batch_size=batch_size,
         shuffle=True,
         num_workers=num_workers,
-        pin_memory=True)
+        uint8_transport=uint8_transport,
+        use_cuda=use_cuda,
+        worker_timer=train_worker_timer)
 
-    val_loader = torch.utils.data.DataLoader(
-        dataset=datasets.ImageFolder(
+    val_loader = create_data_loader(
+        dataset=IndexedImageFolder(
             root=os.path.join(data_dir, 'val'),
-            transform=transforms.Compose([
-                transforms.Resize(256),
-                transforms.CenterCrop(224),
-                transforms.ToTensor(),
-                normalize,
-            ])),
+            transform=get_val_transform(uint8_transport, image_backend),
+            loader=get_val_decoder(jpeg_draft, image_backend)),
+        batch_size=batch_size,
+        shuffle=False,
+        num_workers=num_workers,
+        uint8_transport=uint8_transport,
+        use_cuda=use_cuda,
+        worker_timer=val_worker_timer)
+
+    return train_loader, val_loader
+
+
+class ImageRecordDataset(torch.utils.data.Dataset):
+    """
+    Dataset over an indexed MXNet record file (the same .rec/.idx files as for Gluon `ImageRecordIter`).
+
+    Parameters:
+    ----------
+    rec_path : str
+        Path to the .rec file.
+    idx_path : str
+        Path to the .idx file.
+    transform : callable or None
+        Transformation for PIL images.
+    loader : callable or None
+        Image decoder for file objects (PIL by default).
+    """
+    def __init__(self,
+                 rec_path,
+                 idx_path,
+                 transform=None,
+                 loader=None):
+        self.reader = IndexedRecordReader(
+            rec_path=rec_path,
+            idx_path=idx_path)
+        self.transform = transform
+        self.loader = loader
+
+    def __len__(self):
+        return len(self.reader)
+
+    def __getitem__(self, index):
+        label, img = unpack_img_record(self.reader.read_idx(index))
+        if self.loader is not None:
+            img = self.loader(io.BytesIO(img))
+        else:
+            img = Image.open(io.BytesIO(img)).convert('RGB')
+        if self.transform is not None:
+            img = self.transform(img)
+        if isinstance(label, np.ndarray):
+            label = label[0]
+        return img, int(label)
+
+
+def get_data_rec(rec_train,
+                 rec_train_idx,
+                 rec_val,
+                 rec_val_idx,
+                 batch_size,
+                 num_workers,
+                 uint8_transport=False,
+                 jpeg_draft=False,
+                 image_backend='',
+                 use_cuda=False,
+                 train_worker_timer=None,
+                 val_worker_timer=None):
+    train_loader = create_data_loader(
+        dataset=ImageRecordDataset(
+            rec_path=rec_train,
+            idx_path=rec_train_idx,
+            transform=get_train_transform(uint8_transport, jpeg_draft, image_backend),
+            loader=get_train_decoder(jpeg_draft, image_backend)),
+        batch_size=batch_size,
+        shuffle=True,
+        num_workers=num_workers,
+        uint8_transport=uint8_transport,
+        use_cuda=use_cuda,
+        worker_timer=train_worker_timer)
+
+    val_loader = create_data_loader(
+        dataset=ImageRecordDataset(
+            rec_path=rec_val,
+            idx_path=rec_val_idx,
+            transform=get_val_transform(uint8_transport, image_backend),
+            loader=get_val_decoder(jpeg_draft, image_backend)),
         batch_size=batch_size,
         shuffle=False,
         num_workers=num_workers,
-        pin_memory=True)
+        uint8_transport=uint8_transport,
+        use_cuda=use_cuda,
+        worker_timer=val_worker_timer)
 
     return train_loader, val_loader
 
 
+class ValCacheLoader(object):
+    """
+    Validation data loader over the memory-mapped cache of pre-decoded images.
+
+    Parameters:
+    ----------
+    val_cache : ValCache
+        Validation cache.
+    batch_size : int
+        Batch size.
+    mean : tuple of 3 float
+        Mean values for normalization.
+    std : tuple of 3 float
+        Standard deviation values for normalization.
+    """
+    def __init__(self,
+                 val_cache,
+                 batch_size,
+                 mean=(0.485, 0.456, 0.406),
+                 std=(0.229, 0.224, 0.225)):
+        self.val_cache = val_cache
+        self.batch_size = batch_size
+        self.mean = torch.tensor(mean).mul_(255.0).view(1, 3, 1, 1)
+        self.std = torch.tensor(std).mul_(255.0).view(1, 3, 1, 1)
+
+    def __len__(self):
+        return (len(self.val_cache) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        for images, labels in self.val_cache.iter_batches(self.batch_size):
+            data = torch.from_numpy(images.astype(np.float32))
+            data.sub_(self.mean).div_(self.std)
+            target = torch.from_numpy(labels)
+            yield data, target
+
+
+def get_val_cache_loader(data_dir,
+                         cache_dir,
+                         batch_size,
+                         num_workers):
+    val_cache = ValCache(
+        data_dir=data_dir,
+        cache_dir=cache_dir,
+        resize=256,
+        crop_size=224,
+        pipeline='torchvision',
+        num_workers=num_workers)
+    return ValCacheLoader(
+        val_cache=val_cache,
+        batch_size=batch_size)
+
+
+class SyntheticDataLoader(object):
+    """
+    Data loader, which yields the same preallocated random batch (for measuring the model throughput without the
+    data pipeline). Tensors are allocated once on the target device, so nothing is allocated or copied per batch.
+
+    Parameters:
+    ----------
+    batch_size : int
+        Batch size.
+    num_batches : int
+        Number of batches per epoch.
+    num_classes : int, default 1000
+        Number of classes.
+    in_shape : tuple of 3 int, default (3, 224, 224)
+        Shape of an input image.
+    use_cuda : bool, default False
+        Whether to allocate the batch on GPU.
+    """
+    def __init__(self,
+                 batch_size,
+                 num_batches,
+                 num_classes=1000,
+                 in_shape=(3, 224, 224),
+                 use_cuda=False):
+        device = torch.device('cuda' if use_cuda else 'cpu')
+        self.num_batches = num_batches
+        self.data = torch.randn((batch_size,) + tuple(in_shape), device=device)
+        self.target = torch.randint(0, num_classes, (batch_size,), dtype=torch.int64, device=device)
+
+    def __len__(self):
+        return self.num_batches
+
+    def __iter__(self):
+        for _ in range(self.num_batches):
+            yield self.data, self.target
+
+
+def get_synthetic_data(batch_size,
+                       num_batches,
+                       num_classes=1000,
+                       use_cuda=False):
+    train_loader = SyntheticDataLoader(
+        batch_size=batch_size,
+        num_batches=num_batches,
+        num_classes=num_classes,
+        use_cuda=use_cuda)
+    val_loader = SyntheticDataLoader(
+        batch_size=batch_size,
+        num_batches=num_batches,
+        num_classes=num_classes,
+        use_cuda=use_cuda)
+    return train_loader, val_loader
+
+
 def prepare_model(model_name,
                   classes,
                   use_pretrained,
@@ -99,37 +592,37 @@ def calc_net_weight_count(net):
 
 
 class AverageMeter(object):
-    """Computes and stores the average and current value"""
+    """Computes and stores the average value. Tensor values are summed on their device without synchronization, the
+    sum is copied to the host only when the average is read."""
     def __init__(self):
         self.reset()
 
     def reset(self):
-        self.val = 0
-        self.avg = 0
-        self.sum = 0
+        self.sum = 0.0
         self.count = 0
 
     def update(self, val, n=1):
-        self.val = val
-        self.sum += val * n
+        self.sum = self.sum + val * n
         self.count += n
-        self.avg = self.sum / self.count
+
+    @property
+    def avg(self):
+        return float(self.sum) / max(self.count, 1)
 
 
 def accuracy(output, target, topk=(1,)):
-    """Computes the precision@k for the specified values of k"""
+    """Computes the precision@k for the specified values of k from a single topk call"""
     with torch.no_grad():
         maxk = max(topk)
         batch_size = target.size(0)
 
         _, pred = output.topk(maxk, 1, True, True)
-        pred = pred.t()
-        correct = pred.eq(target.view(1, -1).expand_as(pred))
+        # Each row has at most one hit, so the hits in the first k columns are the correct top-k predictions:
+        correct = pred.eq(target.unsqueeze(1))
 
         res = []
         for k in topk:
-            correct_k = correct[:k].view(-1).float().sum(0, keepdim=True)
-            res.append(correct_k.mul_(1.0 / batch_size))
+            res.append(correct[:, :k].sum().float() / batch_size)
         return res
 
 
@@ -147,8 +640,8 @@ def validate(acc_top1,
                 target = target.cuda(non_blocking=True)
             output = net(data)
             prec1, prec5 = accuracy(output, target, topk=(1, 5))
-            acc_top1.update(prec1[0], data.size(0))
-            acc_top5.update(prec5[0], data.size(0))
-    top1 = acc_top1.avg.item()
-    top5 = acc_top5.avg.item()
+            acc_top1.update(prec1, data.size(0))
+            acc_top5.update(prec5, data.size(0))
+    top1 = acc_top1.avg
+    top5 = acc_top5.avg
     return 1.0 - top1, 1.0 - top5
@@ -1,8 +1,11 @@
 import argparse
+import logging
 import numpy as np
 
 import chainer
+import chainer.links as L
 from chainer import training
+from chainer.dataset import convert
 from chainer.training import extensions
 
 from chainer.serializers import save_npz
@@ -12,7 +15,10 @@ from chainer import cuda
 # from chainercv.utils import ProgressHook
 
 from common.logger_utils import initialize_logging
-from chainer_.utils import get_data_iterators, prepare_model
+from common.data_benchmark import WorkerTimer, benchmark_data
+from chainer_.ideep_utils import enable_ideep, check_ideep_coverage
+from chainer_.utils import get_data_iterators, get_data_rec_iterators, get_synthetic_data_iterators,\
+    synthetic_converter, prepare_model
 
 
 def parse_args():
@@ -23,6 +29,57 @@ def parse_args():
         type=str,
         default='../imgclsmob_data/imagenet',
         help='training and validation pictures to use.')
+    parser.add_argument(
+        '--rec-train',
+        type=str,
+        default='../imgclsmob_data/imagenet/rec/train.rec',
+        help='the training data')
+    parser.add_argument(
+        '--rec-train-idx',
+        type=str,
+        default='../imgclsmob_data/imagenet/rec/train.idx',
+        help='the index of training data')
+    parser.add_argument(
+        '--rec-val',
+        type=str,
+        default='../imgclsmob_data/imagenet/rec/val.rec',
+        help='the validation data')
+    parser.add_argument(
+        '--rec-val-idx',
+        type=str,
+        default='../imgclsmob_data/imagenet/rec/val.idx',
+        help='the index of validation data')
+    parser.add_argument(
+        '--use-rec',
+        action='store_true',
+        help='use image record files for data input. default is false.')
+    parser.add_argument(
+        '--jpeg-draft',
+        action='store_true',
+        help='decode JPEG images with the reduced resolution (PIL draft mode) before resizing/cropping.')
+    parser.add_argument(
+        '--image-backend',
+        type=str,
+        default='',
+        help='image decoding/augmentation backend (pil, opencv or tvio). Backends reproduce the torchvision '
+             'pipelines, which resize differently from chainercv, so the accuracy is not comparable to the default '
+             'one. default is the framework transforms.')
+    parser.add_argument(
+        '--synthetic-data',
+        action='store_true',
+        help='use preallocated random batches instead of the dataset (to measure the pure model throughput). '
+             'default is false.')
+    parser.add_argument(
+        '--synthetic-batches',
+        type=int,
+        default=100,
+        help='number of synthetic batches per epoch.')
+    parser.add_argument(
+        '--benchmark-data',
+        type=int,
+        default=0,
+        help='number of batches to drain from the data loaders without the model (to measure the input pipeline '
+             'throughput). default is 0 to disable.')
 
     parser.add_argument(
         '--model',
@@ -49,6 +106,15 @@ def parse_args():
         type=int,
         default=0,
         help='number of gpus to use.')
+    parser.add_argument(
+        '--use-ideep',
+        action='store_true',
+        help='use iDeep (MKL-DNN) functions and parameters for CPU computations. default is false.')
+    parser.add_argument(
+        '--chainermn',
+        action='store_true',
+        help='use ChainerMN data-parallel training with one process per worker (run with `mpiexec -n <workers>`, the '
+             'naive communicator is used on CPU). default is false.')
     parser.add_argument(
         '-j',
         '--num-data-workers',
@@ -178,21 +244,33 @@ def prepare_trainer(net,
                     train_iter,
                     val_iter,
                     logging_dir_path,
-                    num_gpus=0):
+                    num_gpus=0,
+                    converter=convert.concat_examples,
+                    comm=None):
     if optimizer_name == "sgd":
         optimizer = chainer.optimizers.MomentumSGD(lr=lr, momentum=momentum)
     elif optimizer_name == "nag":
         optimizer = chainer.optimizers.NesterovAG(lr=lr, momentum=momentum)
     else:
         raise Exception('Unsupported optimizer: {}'.format(optimizer_name))
-    optimizer.setup(net)
+    if comm is not None:
+        import chainermn
+        # Gradients are all-reduced over the processes before each update:
+        optimizer = chainermn.create_multi_node_optimizer(optimizer, comm)
+    # The updater and the evaluator need a loss (and accuracy for the reports):
+    model = L.Classifier(net)
+    optimizer.setup(model)
 
     # devices = tuple(range(num_gpus)) if num_gpus > 0 else (-1, )
-    devices = (0,) if num_gpus > 0 else (-1,)
+    if num_gpus > 0:
+        devices = (comm.intra_rank,) if comm is not None else (0,)
+    else:
+        devices = (-1,)
 
     updater = training.updaters.StandardUpdater(
         iterator=train_iter,
         optimizer=optimizer,
+        converter=converter,
         device=devices[0])
     trainer = training.Trainer(
         updater=updater,
@@ -202,12 +280,19 @@ def prepare_trainer(net,
     val_interval = 100000, 'iteration'
     log_interval = 1000, 'iteration'
 
+    evaluator = extensions.Evaluator(
+        val_iter,
+        model,
+        converter=converter,
+        device=devices[0])
+    if comm is not None:
+        evaluator = chainermn.create_multi_node_evaluator(evaluator, comm)
     trainer.extend(
-        extension=extensions.Evaluator(
-            val_iter,
-            net,
-            device=devices[0]),
+        extension=evaluator,
         trigger=val_interval)
+    if (comm is not None) and (comm.rank != 0):
+        return trainer
+
     trainer.extend(extensions.dump_graph('main/loss'))
     trainer.extend(extensions.snapshot(), trigger=val_interval)
     trainer.extend(
@@ -242,31 +327,85 @@ def main():
     args = parse_args()
     args.seed = init_rand(seed=args.seed)
 
+    comm = None
+    if args.chainermn:
+        import chainermn
+        comm = chainermn.create_communicator('naive' if args.num_gpus == 0 else 'hierarchical')
+    is_root = (comm is None) or (comm.rank == 0)
+
     _, log_file_exist = initialize_logging(
-        logging_dir_path=args.save_dir,
+        logging_dir_path=(args.save_dir if is_root else ''),
         logging_file_name=args.logging_file_name,
         script_args=args,
         log_packages=args.log_packages,
         log_pip_packages=args.log_pip_packages)
 
     num_gpus = args.num_gpus
+    device_id = -1
     if num_gpus > 0:
-        cuda.get_device(0).use()
+        device_id = comm.intra_rank if comm is not None else 0
+        cuda.get_device(device_id).use()
     batch_size = args.batch_size
 
     num_classes = 1000
+    train_worker_timer = WorkerTimer() if args.benchmark_data > 0 else None
+    val_worker_timer = WorkerTimer() if args.benchmark_data > 0 else None
+    if args.synthetic_data:
+        train_iter, val_iter = get_synthetic_data_iterators(
+            batch_size=batch_size,
+            num_batches=args.synthetic_batches,
+            num_classes=num_classes,
+            device=device_id)
+    elif args.use_rec:
+        train_iter, val_iter = get_data_rec_iterators(
+            rec_train=args.rec_train,
+            rec_train_idx=args.rec_train_idx,
+            rec_val=args.rec_val,
+            rec_val_idx=args.rec_val_idx,
+            batch_size=batch_size,
+            num_workers=args.num_workers,
+            train_worker_timer=train_worker_timer,
+            val_worker_timer=val_worker_timer,
+            comm=comm)
+    else:
+        train_iter, val_iter = get_data_iterators(
+            data_dir=args.data_dir,
+            batch_size=batch_size,
+            num_workers=args.num_workers,
+            num_classes=num_classes,
+            jpeg_draft=args.jpeg_draft,
+            image_backend=args.image_backend,
+            train_worker_timer=train_worker_timer,
+            val_worker_timer=val_worker_timer,
+            comm=comm)
+
+    if args.benchmark_data > 0:
+        benchmark_data(
+            data=train_iter,
+            batch_size=batch_size,
+            num_batches=args.benchmark_data,
+            num_workers=args.num_workers,
+            worker_timer=train_worker_timer,
+            name='Train data')
+        benchmark_data(
+            data=val_iter,
+            batch_size=batch_size,
+            num_batches=args.benchmark_data,
+            num_workers=args.num_workers,
+            worker_timer=val_worker_timer,
+            name='Val data')
+        train_iter.finalize()
+        val_iter.finalize()
+        return
+
     net = prepare_model(
         model_name=args.model,
         classes=num_classes,
         use_pretrained=args.use_pretrained,
         pretrained_model_file_path=args.resume.strip(),
         num_gpus=num_gpus)
-
-    train_iter, val_iter = get_data_iterators(
-        data_dir=args.data_dir,
-        batch_size=batch_size,
-        num_workers=args.num_workers,
-        num_classes=num_classes)
+    if args.use_ideep and (num_gpus == 0) and enable_ideep(net):
+        check_ideep_coverage(net)
 
     trainer = prepare_trainer(
         net=net,
@@ -277,7 +416,9 @@ def main():
         train_iter=train_iter,
         val_iter=val_iter,
         logging_dir_path=args.save_dir,
-        num_gpus=num_gpus)
+        num_gpus=num_gpus,
+        converter=(synthetic_converter if args.synthetic_data else convert.concat_examples),
+        comm=comm)
 
     # if args.save_dir and args.save_interval:
     #     lp_saver = TrainLogParamSaver(
@@ -304,6 +445,11 @@ def main():
 
     trainer.run()
 
+    if is_root:
+        num_processes = comm.size if comm is not None else 1
+        logging.info('Training throughput: {:.2f} samples/sec ({} processes)'.format(
+            trainer.updater.iteration * batch_size * num_processes / trainer.elapsed_time, num_processes))
+
 
 if __name__ == '__main__':
     main()
@@ -11,9 +11,13 @@ from mxnet import autograd as ag
 from gluoncv import utils as gutils
 
 from common.logger_utils import initialize_logging
+from common.data_benchmark import WorkerTimer, benchmark_data
 from common.train_log_param_saver import TrainLogParamSaver
 from gluon.lr_scheduler import LRScheduler
-from gluon.utils import prepare_mx_context, prepare_model, get_data_rec, get_data_loader, validate
+from gluon.metrics import DeviceTopKAccuracy, DeviceMeanLoss
+from gluon.mixup import MixUp, MixUpSoftmaxCrossEntropyLoss
+from gluon.utils import prepare_mx_context, prepare_model, get_data_rec, get_data_loader, get_synthetic_data,\
+    validate
 
 
 def parse_args():
@@ -48,6 +52,33 @@ def parse_args():
         '--use-rec',
         action='store_true',
         help='use image record iter for data input. default is false.')
+    parser.add_argument(
+        '--jpeg-draft',
+        action='store_true',
+        help='decode JPEG images with the reduced resolution (PIL draft mode) before resizing/cropping.')
+    parser.add_argument(
+        '--image-backend',
+        type=str,
+        default='',
+        help='image decoding/augmentation backend (pil, opencv or tvio). Backends reproduce the torchvision '
+             'pipelines, which resize differently from mx.image, so the accuracy is not comparable to the default '
+             'one. default is the framework transforms.')
+    parser.add_argument(
+        '--synthetic-data',
+        action='store_true',
+        help='use preallocated random batches instead of the dataset (to measure the pure model throughput). '
+             'default is false.')
+    parser.add_argument(
+        '--synthetic-batches',
+        type=int,
+        default=100,
+        help='number of synthetic batches per epoch.')
+    parser.add_argument(
+        '--benchmark-data',
+        type=int,
+        default=0,
+        help='number of batches to drain from the data loaders without the model (to measure the input pipeline '
+             'throughput). default is 0 to disable.')
 
     parser.add_argument(
         '--model',
@@ -119,6 +150,14 @@ def parse_args():
         type=str,
         default='nag',
         help='optimizer name')
+    parser.add_argument(
+        '--aggregate-num',
+        type=int,
+        default=0,
+        help='number of parameter arrays updated by one fused multi-tensor kernel (it is set through the '
+             'MXNET_OPTIMIZER_AGGREGATION_SIZE environment variable, which SGD of MXNet 1.x reads). It works only with '
+             '--optimizer-name=sgd, with the default nag optimizer it is ignored (with a warning). default is 0 to keep '
+             'the MXNet default (4 for SGD, if the environment variable is not set).')
     parser.add_argument(
         '--lr',
         type=float,
@@ -261,6 +300,7 @@ def prepare_trainer(net,
                     num_epochs,
                     num_training_samples,
                     dtype,
+                    aggregate_num=0,
                     state_file_path=None):
 
     if lr_decay_period > 0:
@@ -287,11 +327,22 @@ def prepare_trainer(net,
                         'lr_scheduler': lr_scheduler}
     if dtype != 'float32':
         optimizer_params['multi_precision'] = True
-
+    if aggregate_num > 0:
+        if optimizer_name.lower() == 'sgd':
+            # The SGD constructor has no such parameter, it reads the environment variable. Updates are grouped per
+            # context and dtype into the multi_sgd(_mom/_mp) kernels:
+            os.environ['MXNET_OPTIMIZER_AGGREGATION_SIZE'] = str(aggregate_num)
+        else:
+            logging.warning('Aggregated updates are supported only for SGD, {} updates each parameter '
+                            'separately'.format(optimizer_name))
+            aggregate_num = 0
+
+    # The KVStore updates parameters one by one, so the aggregated updates are done by the local updaters:
     trainer = gluon.Trainer(
         params=net.collect_params(),
         optimizer=optimizer_name,
-        optimizer_params=optimizer_params)
+        optimizer_params=optimizer_params,
+        update_on_kvstore=(False if aggregate_num > 0 else None))
 
     if (state_file_path is not None) and state_file_path and os.path.exists(state_file_path):
         logging.info('Loading trainer states: {}'.format(state_file_path))
@@ -301,6 +352,9 @@ def prepare_trainer(net,
             logging.info('Reset the weight decay: {}'.format(wd))
         # lr_scheduler = trainer._optimizer.lr_scheduler
         trainer._optimizer.lr_scheduler = lr_scheduler
+        if aggregate_num > 0:
+            # The loaded optimizer keeps the aggregation size of the saved run:
+            trainer._optimizer.aggregate_num = aggregate_num
 
     return trainer, lr_scheduler
 
@@ -315,6 +369,7 @@ def save_params(file_stem,
 def train_epoch(epoch,
                 net,
                 acc_top1_train,
+                loss_train,
                 train_data,
                 batch_fn,
                 use_rec,
@@ -326,33 +381,35 @@ def train_epoch(epoch,
                 batch_size,
                 log_interval,
                 mixup,
+                mixup_func,
                 mixup_epoch_tail,
-                num_classes,
                 num_epochs):
 
-    labels_list_inds = None
     tic = time.time()
     if use_rec:
         train_data.reset()
     acc_top1_train.reset()
-    train_loss = 0.0
+    loss_train.reset()
 
     btic = time.time()
     for i, batch in enumerate(train_data):
         data_list, labels_list = batch_fn(batch, ctx)
 
         if mixup:
-            labels_list_inds = labels_list
-            labels_list = [mx.nd.one_hot(Y, depth=num_classes) for Y in labels_list]
-            if epoch < num_epochs - mixup_epoch_tail:
-                alpha = 1
-                lam = np.random.beta(alpha, alpha)
-                data_list = [lam * X + (1 - lam) * X[::-1] for X in data_list]
-                labels_list = [lam * Y + (1 - lam) * Y[::-1] for Y in labels_list]
+            # The labels stay sparse, the loss mixes the cross-entropies of the direct and reversed labels (with lam=1
+            # for the last epochs without mixup):
+            lam = np.random.beta(1, 1) if epoch < num_epochs - mixup_epoch_tail else 1.0
+            lam_list = [mx.nd.full((1,), lam, ctx=X.context) for X in data_list]
+            if lam < 1.0:
+                data_list = [mixup_func(X, lam_x) for X, lam_x in zip(data_list, lam_list)]
 
         with ag.record():
             outputs_list = [net(X.astype(dtype, copy=False)) for X in data_list]
-            loss_list = [loss_func(yhat, y) for yhat, y in zip(outputs_list, labels_list)]
+            if mixup:
+                loss_list = [loss_func(yhat, y, lam_x.astype(dtype, copy=False))
+                             for yhat, y, lam_x in zip(outputs_list, labels_list, lam_list)]
+            else:
+                loss_list = [loss_func(yhat, y) for yhat, y in zip(outputs_list, labels_list)]
         for loss in loss_list:
             loss.backward()
         lr_scheduler.update(i, epoch)
@@ -361,27 +418,28 @@ def train_epoch(epoch,
         # if epoch == 0 and i == 0:
         #     weight_count = calc_net_weight_count(net)
         #     logging.info('Model: {} trainable parameters'.format(weight_count))
-        train_loss += sum([loss.mean().asscalar() for loss in loss_list]) / len(loss_list)
-
+        # The metrics are accumulated on the devices, the engine is synchronized only at the logging:
+        loss_train.update(None, loss_list)
         acc_top1_train.update(
-            labels=(labels_list if not mixup else labels_list_inds),
+            labels=labels_list,
             preds=outputs_list)
 
         if log_interval and not (i + 1) % log_interval:
-            speed = batch_size * log_interval / (time.time() - btic)
-            btic = time.time()
             _, top1 = acc_top1_train.get()
             err_top1_train = 1.0 - top1
+            speed = batch_size * log_interval / (time.time() - btic)
+            btic = time.time()
             logging.info('Epoch[{}] Batch [{}]\tSpeed: {:.2f} samples/sec\ttop1-err={:.4f}\tlr={:.5f}'.format(
                 epoch + 1, i, speed, err_top1_train, trainer.learning_rate))
 
+    _, train_loss = loss_train.get()
+    _, top1 = acc_top1_train.get()
+    err_top1_train = 1.0 - top1
+
     throughput = int(batch_size * (i + 1) / (time.time() - tic))
     logging.info('[Epoch {}] speed: {:.2f} samples/sec\ttime cost: {:.2f} sec'.format(
         epoch + 1, throughput, time.time() - tic))
 
-    train_loss /= (i + 1)
-    _, top1 = acc_top1_train.get()
-    err_top1_train = 1.0 - top1
     logging.info('[Epoch {}] training: err-top1={:.4f}\tloss={:.4f}'.format(
         epoch + 1, err_top1_train, train_loss))
 
@@ -403,17 +461,24 @@ def train_net(batch_size,
               log_interval,
               mixup,
               mixup_epoch_tail,
-              num_classes,
               ctx):
 
     if isinstance(ctx, mx.Context):
         ctx = [ctx]
 
-    acc_top1_val = mx.metric.Accuracy()
-    acc_top5_val = mx.metric.TopKAccuracy(5)
-    acc_top1_train = mx.metric.Accuracy()
+    acc_top1_val = DeviceTopKAccuracy(top_k=1)
+    acc_top5_val = DeviceTopKAccuracy(top_k=5)
+    acc_top1_train = DeviceTopKAccuracy(top_k=1)
+    loss_train = DeviceMeanLoss()
 
-    loss_func = gluon.loss.SoftmaxCrossEntropyLoss(sparse_label=(not mixup))
+    if mixup:
+        loss_func = MixUpSoftmaxCrossEntropyLoss()
+        mixup_func = MixUp()
+        mixup_func.hybridize()
+    else:
+        loss_func = gluon.loss.SoftmaxCrossEntropyLoss()
+        mixup_func = None
+    loss_func.hybridize()
 
     assert (type(start_epoch1) == int)
     assert (start_epoch1 >= 1)
@@ -437,6 +502,7 @@ def train_net(batch_size,
             epoch=epoch,
             net=net,
             acc_top1_train=acc_top1_train,
+            loss_train=loss_train,
             train_data=train_data,
             batch_fn=batch_fn,
             use_rec=use_rec,
@@ -448,8 +514,8 @@ def train_net(batch_size,
             batch_size=batch_size,
             log_interval=log_interval,
             mixup=mixup,
+            mixup_func=mixup_func,
             mixup_epoch_tail=mixup_epoch_tail,
-            num_classes=num_classes,
             num_epochs=num_epochs)
 
         err_top1_val, err_top5_val = validate(
@@ -497,16 +563,17 @@ def main():
     #     batch_size = 1
 
     num_classes = 1000
-    net = prepare_model(
-        model_name=args.model,
-        classes=num_classes,
-        use_pretrained=args.use_pretrained,
-        pretrained_model_file_path=args.resume.strip(),
-        dtype=args.dtype,
-        tune_layers=args.tune_layers,
-        ctx=ctx)
-
-    if args.use_rec:
+    train_worker_timer = WorkerTimer() if args.benchmark_data > 0 else None
+    val_worker_timer = WorkerTimer() if args.benchmark_data > 0 else None
+    use_rec = args.use_rec
+    if args.synthetic_data:
+        use_rec = False
+        train_data, val_data, batch_fn = get_synthetic_data(
+            batch_size=batch_size,
+            num_batches=args.synthetic_batches,
+            ctx=ctx,
+            num_classes=num_classes)
+    elif args.use_rec:
         train_data, val_data, batch_fn = get_data_rec(
             rec_train=args.rec_train,
             rec_train_idx=args.rec_train_idx,
@@ -518,7 +585,37 @@ def main():
         train_data, val_data, batch_fn = get_data_loader(
             data_dir=args.data_dir,
             batch_size=batch_size,
-            num_workers=args.num_workers)
+            num_workers=args.num_workers,
+            jpeg_draft=args.jpeg_draft,
+            image_backend=args.image_backend,
+            train_worker_timer=train_worker_timer,
+            val_worker_timer=val_worker_timer)
+
+    if args.benchmark_data > 0:
+        benchmark_data(
+            data=train_data,
+            batch_size=batch_size,
+            num_batches=args.benchmark_data,
+            num_workers=args.num_workers,
+            worker_timer=train_worker_timer,
+            name='Train data')
+        benchmark_data(
+            data=val_data,
+            batch_size=batch_size,
+            num_batches=args.benchmark_data,
+            num_workers=args.num_workers,
+            worker_timer=val_worker_timer,
+            name='Val data')
+        return
+
+    net = prepare_model(
+        model_name=args.model,
+        classes=num_classes,
+        use_pretrained=args.use_pretrained,
+        pretrained_model_file_path=args.resume.strip(),
+        dtype=args.dtype,
+        tune_layers=args.tune_layers,
+        ctx=ctx)
 
     # if args.convert_to_mxnet:
     #     assert args.save_dir and os.path.exists(args.save_dir)
@@ -530,6 +627,8 @@ def main():
     #     logging.info('Convert model to MXNet format: {}'.format(export_checkpoint_file_path_prefix))
 
     num_training_samples = 1281167
+    if args.synthetic_data:
+        num_training_samples = batch_size * args.synthetic_batches
     trainer, lr_scheduler = prepare_trainer(
         net=net,
         optimizer_name=args.optimizer_name,
@@ -549,6 +648,7 @@ def main():
         num_epochs=args.num_epochs,
         num_training_samples=num_training_samples,
         dtype=args.dtype,
+        aggregate_num=args.aggregate_num,
         state_file_path=args.resume_state)
 
     if args.save_dir and args.save_interval:
@@ -581,7 +681,7 @@ def main():
         train_data=train_data,
         val_data=val_data,
         batch_fn=batch_fn,
-        use_rec=args.use_rec,
+        use_rec=use_rec,
         dtype=args.dtype,
         net=net,
         trainer=trainer,
@@ -590,7 +690,6 @@ def main():
         log_interval=args.log_interval,
         mixup=args.mixup,
         mixup_epoch_tail=args.mixup_epoch_tail,
-        num_classes=num_classes,
         ctx=ctx)
 
 
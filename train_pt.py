@@ -11,8 +11,10 @@ import torch.backends.cudnn as cudnn
 import torch.utils.data
 
 from common.logger_utils import initialize_logging
+from common.data_benchmark import WorkerTimer, benchmark_data
 from common.train_log_param_saver import TrainLogParamSaver
-from pytorch.utils import prepare_pt_context, prepare_model, get_data_loader, validate, accuracy, AverageMeter
+from pytorch.utils import prepare_pt_context, prepare_model, get_data_loader, get_data_rec, DataPrefetcher,\
+    get_synthetic_data, validate, accuracy, AverageMeter
 
 
 def parse_args():
@@ -23,6 +25,30 @@ def parse_args():
         type=str,
         default='../imgclsmob_data/imagenet',
         help='training and validation pictures to use.')
+    parser.add_argument(
+        '--rec-train',
+        type=str,
+        default='../imgclsmob_data/imagenet/rec/train.rec',
+        help='the training data')
+    parser.add_argument(
+        '--rec-train-idx',
+        type=str,
+        default='../imgclsmob_data/imagenet/rec/train.idx',
+        help='the index of training data')
+    parser.add_argument(
+        '--rec-val',
+        type=str,
+        default='../imgclsmob_data/imagenet/rec/val.rec',
+        help='the validation data')
+    parser.add_argument(
+        '--rec-val-idx',
+        type=str,
+        default='../imgclsmob_data/imagenet/rec/val.idx',
+        help='the index of validation data')
+    parser.add_argument(
+        '--use-rec',
+        action='store_true',
+        help='use image record files for data input. default is false.')
 
     parser.add_argument(
         '--model',
@@ -56,6 +82,40 @@ def parse_args():
         default=4,
         type=int,
         help='number of preprocessing workers')
+    parser.add_argument(
+        '--uint8-transport',
+        action='store_true',
+        help='transfer batches from workers as uint8 and normalize them in batch on the trainer side.')
+    parser.add_argument(
+        '--jpeg-draft',
+        action='store_true',
+        help='decode JPEG images with the reduced resolution (PIL draft mode) before resizing/cropping.')
+    parser.add_argument(
+        '--image-backend',
+        type=str,
+        default='',
+        help='image decoding/augmentation backend (pil, opencv or tvio). default is the framework transforms.')
+    parser.add_argument(
+        '--prefetch-depth',
+        type=int,
+        default=0,
+        help='number of batches prepared (and copied to GPU) in a background thread. default is 0 to disable.')
+    parser.add_argument(
+        '--synthetic-data',
+        action='store_true',
+        help='use preallocated random batches instead of the dataset (to measure the pure model throughput). '
+             'default is false.')
+    parser.add_argument(
+        '--synthetic-batches',
+        type=int,
+        default=100,
+        help='number of synthetic batches per epoch.')
+    parser.add_argument(
+        '--benchmark-data',
+        type=int,
+        default=0,
+        help='number of batches to drain from the data loaders without the model (to measure the input pipeline '
+             'throughput). default is 0 to disable.')
 
     parser.add_argument(
         '--batch-size',
@@ -275,7 +335,7 @@ def train_epoch(epoch,
     tic = time.time()
     net.train()
     acc_top1.reset()
-    train_loss = 0.0
+    loss_meter = AverageMeter()
 
     btic = time.time()
     for i, (data, target) in enumerate(train_data):
@@ -288,21 +348,22 @@ def train_epoch(epoch,
         loss.backward()
         optimizer.step()
 
-        train_loss += loss.item()
-        prec1 = accuracy(output, target, topk=(1, ))
-        acc_top1.update(prec1[0], data.size(0))
+        # The sums stay on the device, they are read back (with a synchronization) only at the logging:
+        loss_meter.update(loss.detach(), data.size(0))
+        prec1, = accuracy(output, target, topk=(1, ))
+        acc_top1.update(prec1, data.size(0))
 
         if log_interval and not (i + 1) % log_interval:
-            top1 = acc_top1.avg.item()
+            top1 = acc_top1.avg
             err_top1_train = 1.0 - top1
             speed = batch_size * log_interval / (time.time() - btic)
             logging.info('Epoch[{}] Batch [{}]\tSpeed: {:.2f} samples/sec\ttop1-err={:.4f}\tlr={:.4f}'.format(
                 epoch + 1, i, speed, err_top1_train, optimizer.param_groups[0]['lr']))
             btic = time.time()
 
-    top1 = acc_top1.avg.item()
+    top1 = acc_top1.avg
     err_top1_train = 1.0 - top1
-    train_loss /= (i + 1)
+    train_loss = loss_meter.avg
     throughput = int(batch_size * (i + 1) / (time.time() - tic))
 
     logging.info('[Epoch {}] training: err-top1={:.4f}\tloss={:.4f}'.format(
@@ -407,6 +468,67 @@ def main():
         batch_size=args.batch_size)
 
     classes = 1000
+    train_worker_timer = WorkerTimer() if args.benchmark_data > 0 else None
+    val_worker_timer = WorkerTimer() if args.benchmark_data > 0 else None
+    if args.synthetic_data:
+        train_data, val_data = get_synthetic_data(
+            batch_size=batch_size,
+            num_batches=args.synthetic_batches,
+            num_classes=classes,
+            use_cuda=use_cuda)
+    elif args.use_rec:
+        train_data, val_data = get_data_rec(
+            rec_train=args.rec_train,
+            rec_train_idx=args.rec_train_idx,
+            rec_val=args.rec_val,
+            rec_val_idx=args.rec_val_idx,
+            batch_size=batch_size,
+            num_workers=args.num_workers,
+            uint8_transport=args.uint8_transport,
+            jpeg_draft=args.jpeg_draft,
+            image_backend=args.image_backend,
+            use_cuda=use_cuda,
+            train_worker_timer=train_worker_timer,
+            val_worker_timer=val_worker_timer)
+    else:
+        train_data, val_data = get_data_loader(
+            data_dir=args.data_dir,
+            batch_size=batch_size,
+            num_workers=args.num_workers,
+            uint8_transport=args.uint8_transport,
+            jpeg_draft=args.jpeg_draft,
+            image_backend=args.image_backend,
+            use_cuda=use_cuda,
+            train_worker_timer=train_worker_timer,
+            val_worker_timer=val_worker_timer)
+
+    if (args.prefetch_depth > 0) and (not args.synthetic_data):
+        train_data = DataPrefetcher(
+            loader=train_data,
+            use_cuda=use_cuda,
+            depth=args.prefetch_depth)
+        val_data = DataPrefetcher(
+            loader=val_data,
+            use_cuda=use_cuda,
+            depth=args.prefetch_depth)
+
+    if args.benchmark_data > 0:
+        benchmark_data(
+            data=train_data,
+            batch_size=batch_size,
+            num_batches=args.benchmark_data,
+            num_workers=args.num_workers,
+            worker_timer=train_worker_timer,
+            name='Train data')
+        benchmark_data(
+            data=val_data,
+            batch_size=batch_size,
+            num_batches=args.benchmark_data,
+            num_workers=args.num_workers,
+            worker_timer=val_worker_timer,
+            name='Val data')
+        return
+
     net = prepare_model(
         model_name=args.model,
         classes=classes,
@@ -414,11 +536,6 @@ def main():
         pretrained_model_file_path=args.resume.strip(),
         use_cuda=use_cuda)
 
-    train_data, val_data = get_data_loader(
-        data_dir=args.data_dir,
-        batch_size=batch_size,
-        num_workers=args.num_workers)
-
     # num_training_samples = 1281167
     optimizer, lr_scheduler, start_epoch = prepare_trainer(
         net=net,